@@ -0,0 +1,213 @@
+"""
+Таблица лидеров.
+
+Рейтинг хранится в памяти процесса как отсортированный список ключей
+(-уровень, -опыт, id игрока), поэтому место игрока и его соседи находятся
+бинарным поиском за O(log n). Источник правды - колонки level/experience
+профиля с индексом (-level, -experience).
+
+Целиком рейтинг читается одним запросом по индексу при первом обращении и
+раз в reload_interval секунд (чтобы убрать удаленные профили). Изменения из
+других процессов подхватываются раз в sync_interval секунд запросом по
+индексу updated_at: читаются только профили, измененные после прошлой
+сверки (с запасом sync_overlap секунд на долгие транзакции и расхождение
+часов). Изменения в текущем процессе применяются к рейтингу сразу после
+коммита. Запросы к базе выполняются вне блокировки: читатели в это время
+работают с прежним рейтингом, блокировка берется только для подмены.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.utils import timezone
+
+# Если изменилось больше профилей, рейтинг пересобирается сортировкой, а не вставками по одному
+RESORT_THRESHOLD = 1000
+
+
+class Leaderboard:
+    """Отсортированный рейтинг игроков по уровню и опыту"""
+
+    def __init__(self, sync_interval=5, reload_interval=3600, sync_overlap=30):
+        self.sync_interval = sync_interval
+        self.reload_interval = reload_interval
+        self.sync_overlap = sync_overlap
+        self._lock = threading.RLock()
+        # Загрузкой из базы занимается один поток, остальные не ждут ее
+        self._load_lock = threading.Lock()
+        self._keys = []
+        self._by_player = {}
+        self._player_by_telegram = {}
+        self._loaded_at = None
+        self._synced_at = None
+        self._watermark = None
+
+    @staticmethod
+    def _key(player_id, level, experience):
+        return (-level, -experience, player_id)
+
+    @staticmethod
+    def _rows(queryset):
+        return queryset.values_list('player_id', 'player__telegram_id', 'level', 'experience')
+
+    def _ensure_loaded(self):
+        """Вызывается без self._lock: загрузка и сверка не блокируют читателей"""
+        loaded_at, synced_at = self._loaded_at, self._synced_at
+        now = time.monotonic()
+        if loaded_at is not None and now - loaded_at <= self.reload_interval and now - synced_at <= self.sync_interval:
+            return
+        # Пока рейтинга нет, ждем загрузки; иначе, если уже загружает другой поток, отдаем прежний
+        if not self._load_lock.acquire(blocking=loaded_at is None):
+            return
+        try:
+            now = time.monotonic()
+            if self._loaded_at is None or now - self._loaded_at > self.reload_interval:
+                self._reload()
+            elif now - self._synced_at > self.sync_interval:
+                self._sync()
+        finally:
+            self._load_lock.release()
+
+    def reload(self):
+        """Перечитать рейтинг из базы одним запросом"""
+        with self._load_lock:
+            self._reload()
+
+    def _reload(self):
+        from .models import PlayerProfile
+
+        watermark = timezone.now() - timedelta(seconds=self.sync_overlap)
+        rows = self._rows(PlayerProfile.objects.order_by('-level', '-experience', 'player_id'))
+        keys = []
+        by_player = {}
+        player_by_telegram = {}
+        for player_id, telegram_id, level, experience in rows.iterator(chunk_size=10000):
+            key = self._key(player_id, level, experience)
+            keys.append(key)
+            by_player[player_id] = key
+            player_by_telegram[telegram_id] = player_id
+
+        with self._lock:
+            # Изменения, примененные за время чтения, не теряются: их строки изменены после watermark
+            self._keys = keys
+            self._by_player = by_player
+            self._player_by_telegram = player_by_telegram
+            self._watermark = watermark
+            self._loaded_at = self._synced_at = time.monotonic()
+
+    def sync(self):
+        """Применить изменения профилей после прошлой сверки (из всех процессов)"""
+        with self._load_lock:
+            if self._loaded_at is None:
+                self._reload()
+            else:
+                self._sync()
+
+    def _sync(self):
+        from .models import PlayerProfile
+
+        watermark = timezone.now() - timedelta(seconds=self.sync_overlap)
+        rows = list(self._rows(PlayerProfile.objects.filter(updated_at__gte=self._watermark)))
+        with self._lock:
+            if len(rows) > RESORT_THRESHOLD:
+                for player_id, telegram_id, level, experience in rows:
+                    self._by_player[player_id] = self._key(player_id, level, experience)
+                    self._player_by_telegram[telegram_id] = player_id
+                self._keys = sorted(self._by_player.values())
+            else:
+                for player_id, telegram_id, level, experience in rows:
+                    self._set(player_id, level, experience, telegram_id)
+            self._watermark = watermark
+            self._synced_at = time.monotonic()
+
+    def invalidate(self):
+        """Сбросить рейтинг: он будет перечитан при следующем обращении"""
+        with self._lock:
+            self._loaded_at = None
+
+    def update(self, player_id, level, experience, telegram_id=None):
+        """Обновить позицию игрока после изменения уровня или опыта"""
+        with self._lock:
+            if self._loaded_at is None:
+                # Рейтинг еще не загружен - изменение попадет в него при загрузке
+                return
+            self._set(player_id, level, experience, telegram_id)
+
+    def _set(self, player_id, level, experience, telegram_id=None):
+        key = self._key(player_id, level, experience)
+        if self._by_player.get(player_id) == key:
+            return
+        self._remove(player_id)
+        insort(self._keys, key)
+        self._by_player[player_id] = key
+        if telegram_id is not None:
+            self._player_by_telegram[telegram_id] = player_id
+
+    def update_many(self, rows):
+        """Обновить позиции нескольких игроков: rows - (player_id, level, experience)"""
+        with self._lock:
+            for player_id, level, experience in rows:
+                self.update(player_id, level, experience)
+
+    def remove(self, player_id):
+        with self._lock:
+            self._remove(player_id)
+
+    def _remove(self, player_id):
+        key = self._by_player.pop(player_id, None)
+        if key is not None:
+            index = bisect_left(self._keys, key)
+            if index < len(self._keys) and self._keys[index] == key:
+                del self._keys[index]
+
+    def __len__(self):
+        self._ensure_loaded()
+        with self._lock:
+            return len(self._keys)
+
+    def player_id_for(self, telegram_id):
+        """id игрока по telegram_id (None - игрок не в рейтинге)"""
+        self._ensure_loaded()
+        with self._lock:
+            return self._player_by_telegram.get(int(telegram_id))
+
+    def rank(self, player_id):
+        """Место игрока (с 1) или None, если игрока нет в рейтинге"""
+        self._ensure_loaded()
+        with self._lock:
+            key = self._by_player.get(player_id)
+            if key is None:
+                return None
+            return bisect_left(self._keys, key) + 1
+
+    def around(self, player_id, radius=2):
+        """
+        Игрок и его соседи по рейтингу:
+        список словарей {rank, player_id, level, experience}
+        """
+        self._ensure_loaded()
+        with self._lock:
+            key = self._by_player.get(player_id)
+            if key is None:
+                return []
+            index = bisect_left(self._keys, key)
+            start = max(index - radius, 0)
+            return self._entries(start, index + radius + 1)
+
+    def top(self, limit=10):
+        """Первые limit игроков рейтинга"""
+        self._ensure_loaded()
+        with self._lock:
+            return self._entries(0, limit)
+
+    def _entries(self, start, stop):
+        return [
+            {'rank': start + offset + 1, 'player_id': player_id, 'level': -level, 'experience': -experience}
+            for offset, (level, experience, player_id) in enumerate(self._keys[start:stop])
+        ]
+
+
+# Рейтинг процесса
+leaderboard = Leaderboard()
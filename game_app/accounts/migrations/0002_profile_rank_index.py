@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='playerprofile',
+            index=models.Index(fields=['-level', '-experience'], name='profile_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_profile_rank_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='player',
+            name='twitch_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True, verbose_name='Twitch ID'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_player_twitch_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='playerprofile',
+            index=models.Index(fields=['updated_at'], name='profile_updated_idx'),
+        ),
+    ]
@@ -1,6 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
+from .leaderboard import leaderboard
+
+# Простая система уровней: каждые 100 опыта = 1 уровень
+EXPERIENCE_PER_LEVEL = 100
+
 
 class Player(models.Model):
     """Модель игрока"""
@@ -11,7 +16,7 @@ class Player(models.Model):
 
     # Twitch интеграция
     twitch_username = models.CharField(max_length=255, blank=True, null=True, verbose_name="Twitch username")
-    twitch_id = models.CharField(max_length=255, blank=True, null=True, verbose_name="Twitch ID")
+    twitch_id = models.CharField(max_length=255, blank=True, null=True, db_index=True, verbose_name="Twitch ID")
     twitch_access_token = models.TextField(blank=True, null=True, verbose_name="Twitch access token")
     twitch_refresh_token = models.TextField(blank=True, null=True, verbose_name="Twitch refresh token")
     twitch_connected = models.BooleanField(default=False, verbose_name="Twitch подключен")
@@ -53,10 +58,22 @@ class PlayerProfile(models.Model):
         verbose_name = "Профиль игрока"
         verbose_name_plural = "Профили игроков"
         ordering = ['-level', '-experience']
+        indexes = [
+            # Рейтинг игроков (accounts.leaderboard) читается по этому индексу
+            models.Index(fields=['-level', '-experience'], name='profile_rank_idx'),
+            # Изменения после прошлой сверки рейтинга (Leaderboard.sync)
+            models.Index(fields=['updated_at'], name='profile_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Профиль {self.player} - Уровень {self.level}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Точечно обновляем рейтинг после фиксации транзакции
+        player_id, level, experience = self.player_id, self.level, self.experience
+        transaction.on_commit(lambda: leaderboard.update(player_id, level, experience))
+
     @property
     def win_rate(self):
         """Процент побед"""
@@ -67,8 +84,7 @@ class PlayerProfile(models.Model):
     def add_experience(self, amount):
         """Добавить опыт и проверить повышение уровня"""
         self.experience += amount
-        # Простая система уровней: каждые 100 опыта = 1 уровень
-        new_level = (self.experience // 100) + 1
+        new_level = (self.experience // EXPERIENCE_PER_LEVEL) + 1
         if new_level > self.level:
             old_level = self.level
             self.level = new_level
@@ -1,6 +1,15 @@
-from .models import Player, PlayerProfile
+from collections import defaultdict
+
+from .leaderboard import leaderboard
+from .models import EXPERIENCE_PER_LEVEL, Player, PlayerProfile
+from .session import issue_token, validate_init_data
 from characters.models import Character, Equipment
+from items.catalog import item_catalog
 from items.models import Inventory
+from telegram_bot.services import OutboxService
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
 
@@ -25,11 +34,43 @@ class PlayerService:
 
         return player, created
 
+    @staticmethod
+    def start_session(init_data):
+        """
+        Проверить initData Mini App, получить или создать игрока и выдать токен сессии.
+        Возвращает (токен, есть ли персонаж).
+        """
+        user = validate_init_data(init_data)['user']
+        player, created = PlayerService.get_or_create_player(
+            telegram_id=user['id'],
+            username=user.get('username'),
+            first_name=user.get('first_name'),
+            last_name=user.get('last_name'),
+        )
+        character_id = None if created else (
+            Character.objects.filter(player=player).values_list('pk', flat=True).first()
+        )
+        return issue_token(player.pk, player.telegram_id, character_id), character_id is not None
+
+    @staticmethod
+    def get_session_player(session):
+        """Игрок сессии"""
+        return Player.objects.get(pk=session.player_id)
+
+    @staticmethod
+    def get_session_character(session):
+        """Персонаж игрока сессии вместе с игроком и профилем - одним запросом"""
+        return (
+            Character.objects.select_related('player__profile')
+            .filter(player_id=session.player_id)
+            .first()
+        )
+
     @staticmethod
     def get_character(telegram_id):
-        """Получить персонажа игрока по telegram_id"""
+        """Получить персонажа игрока (вместе с игроком и профилем) по telegram_id"""
         try:
-            return Character.objects.select_related('player').get(player__telegram_id=telegram_id)
+            return Character.objects.select_related('player__profile').get(player__telegram_id=telegram_id)
         except Character.DoesNotExist:
             return None
 
@@ -70,36 +111,48 @@ class PlayerService:
             return None
 
     @staticmethod
-    def get_player_inventory(player):
-        """Получить инвентарь игрока"""
-        return Inventory.objects.filter(player=player).select_related('item')
-
-    @staticmethod
-    def get_character_equipment(character):
-        """Получить экипировку персонажа"""
-        from django.apps import apps
-        Equipment = apps.get_model('characters', 'Equipment')
+    def get_leaderboard(telegram_id=None, limit=10, radius=2):
+        """
+        Таблица лидеров: первые limit игроков и, если указан telegram_id,
+        место игрока с соседями. Имена игроков подгружаются одним запросом.
+        """
+        result = {'total': len(leaderboard), 'top': leaderboard.top(limit), 'me': None, 'around': []}
 
-        equipment_queryset = Equipment.objects.filter(character=character)
+        if telegram_id is not None:
+            player_id = leaderboard.player_id_for(telegram_id)
+            if player_id is None:
+                # Игрок мог появиться после загрузки рейтинга
+                player_id = Player.objects.filter(telegram_id=telegram_id).values_list('pk', flat=True).first()
+            if player_id is not None:
+                result['around'] = leaderboard.around(player_id, radius)
+                result['me'] = next((entry for entry in result['around'] if entry['player_id'] == player_id), None)
 
-        if not equipment_queryset.exists():
-            # Создаем пустую экипировку, если ее нет
-            return Equipment.objects.create(character=character)
+        entries = result['top'] + result['around']
+        players = Player.objects.in_bulk({entry['player_id'] for entry in entries})
+        for entry in entries:
+            player = players.get(entry['player_id'])
+            entry['telegram_id'] = player.telegram_id if player else None
+            entry['name'] = (player.username or player.first_name or 'User') if player else None
+        return result
 
-        # Если есть несколько записей, оставляем только первую и удаляем остальные
-        equipment = equipment_queryset.first()
+    @staticmethod
+    def get_player_rank(telegram_id):
+        """Место игрока в рейтинге (None - игрока нет в рейтинге)"""
+        player_id = leaderboard.player_id_for(telegram_id)
+        if player_id is None:
+            player_id = Player.objects.filter(telegram_id=telegram_id).values_list('pk', flat=True).first()
+        return leaderboard.rank(player_id) if player_id is not None else None
 
-        if equipment_queryset.count() > 1:
-            from core.models import GameLog
-            GameLog.objects.create(
-                level='warning',
-                message=f'Found {equipment_queryset.count()} equipment records for character {character}',
-                source='PlayerService.get_character_equipment'
-            )
-            # Удаляем дубликаты, оставляя только первый
-            equipment_queryset.exclude(pk=equipment.pk).delete()
+    @staticmethod
+    def get_player_inventory(player):
+        """Получить инвентарь игрока (предметы - из каталога, без JOIN)"""
+        return item_catalog.attach(Inventory.objects.filter(player=player))
 
-        return equipment
+    @staticmethod
+    def get_character_equipment(character):
+        """Получить экипировку персонажа (все слоты) одним запросом"""
+        from characters.services import LoadoutService
+        return LoadoutService.get_loadout(character)
 
     @staticmethod
     def get_skill_info():
@@ -121,3 +174,94 @@ class PlayerService:
                 'icon': '❤️'
             }
         }
+
+
+class RewardService:
+    """Сервис массовой выдачи наград (опыт и золото)"""
+
+    # Размер пачки игроков в одном запросе
+    CHUNK_SIZE = 5000
+
+    @staticmethod
+    def grant_bulk(rewards, by='telegram_id'):
+        """
+        Выдать награды пачкой игроков.
+
+        rewards - кортежи (telegram_id или twitch_id, опыт, золото), by - поле
+        игрока, по которому они указаны. Награды одного игрока суммируются.
+        Профили блокируются и читаются одним запросом на пачку, затем
+        обновляются F()-выражениями: по одному UPDATE на каждую пару (опыт, золото),
+        уровень пересчитывается в SQL. Игрокам с новым уровнем в той же
+        транзакции ставится уведомление в outbox бота. Возвращает отчет: сколько
+        профилей обновлено, неизвестные идентификаторы и список повышений уровня.
+        """
+        if by not in ('telegram_id', 'twitch_id'):
+            raise ValueError(f"Неизвестное поле игрока: {by}")
+
+        totals = defaultdict(lambda: [0, 0])
+        for identifier, experience, gold in rewards:
+            identifier = str(identifier) if by == 'twitch_id' else int(identifier)
+            totals[identifier][0] += experience
+            totals[identifier][1] += gold
+
+        report = {'granted': 0, 'unknown': [], 'level_ups': []}
+        identifiers = list(totals)
+        for start in range(0, len(identifiers), RewardService.CHUNK_SIZE):
+            chunk = identifiers[start:start + RewardService.CHUNK_SIZE]
+            RewardService._grant_chunk(chunk, totals, by, report)
+        return report
+
+    @staticmethod
+    def _grant_chunk(identifiers, totals, by, report):
+        now = timezone.now()
+        with transaction.atomic():
+            rows = (
+                PlayerProfile.objects.select_for_update(of=('self',))
+                .filter(**{f'player__{by}__in': identifiers})
+                .values_list('player_id', f'player__{by}', 'player__telegram_id', 'level', 'experience')
+            )
+
+            groups = defaultdict(list)
+            ranked = []
+            found = set()
+            level_ups_before = len(report['level_ups'])
+            for player_id, identifier, telegram_id, level, experience in rows:
+                found.add(identifier)
+                gained_experience, gold = totals[identifier]
+                groups[(gained_experience, gold)].append(player_id)
+
+                new_experience = experience + gained_experience
+                new_level = max(level, new_experience // EXPERIENCE_PER_LEVEL + 1)
+                ranked.append((player_id, new_level, new_experience))
+                if new_level > level:
+                    report['level_ups'].append({
+                        'player_id': player_id,
+                        'telegram_id': telegram_id,
+                        'old_level': level,
+                        'new_level': new_level,
+                    })
+
+            for (gained_experience, gold), player_ids in groups.items():
+                report['granted'] += PlayerProfile.objects.filter(player_id__in=player_ids).update(
+                    experience=F('experience') + gained_experience,
+                    gold=F('gold') + gold,
+                    level=Greatest(
+                        F('level'),
+                        (F('experience') + gained_experience) / EXPERIENCE_PER_LEVEL + 1,
+                    ),
+                    # По updated_at рейтинг других процессов находит изменившиеся профили
+                    updated_at=now,
+                )
+
+            # Уведомления о новом уровне уйдут, только если начисление зафиксируется
+            chunk_level_ups = report['level_ups'][level_ups_before:]
+            if chunk_level_ups:
+                OutboxService.enqueue_many(
+                    [(level_up['telegram_id'], f"🎉 Новый уровень: {level_up['new_level']}!")
+                     for level_up in chunk_level_ups],
+                    kind='level_up',
+                )
+
+            transaction.on_commit(lambda: leaderboard.update_many(ranked))
+
+        report['unknown'].extend(identifier for identifier in identifiers if identifier not in found)
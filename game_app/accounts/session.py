@@ -0,0 +1,128 @@
+"""
+Сессия Mini App.
+
+При открытии игры Telegram передает странице initData, подписанную токеном
+бота. Она проверяется один раз (validate_init_data), после чего выдается
+короткоживущий подписанный токен с id игрока и персонажа (issue_token).
+Дальнейшие запросы - страница игры, экипировка, API - определяют игрока по
+токену (get_session): это проверка подписи без запросов к базе.
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import parse_qsl
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+
+TOKEN_SALT = 'twgame.session'
+TOKEN_HEADER = 'HTTP_X_SESSION_TOKEN'
+TOKEN_PARAM = 'session'
+
+
+class GameSession:
+    """Игрок (и персонаж, если создан) из токена сессии"""
+
+    __slots__ = ('player_id', 'telegram_id', 'character_id')
+
+    def __init__(self, player_id, telegram_id, character_id=None):
+        self.player_id = player_id
+        self.telegram_id = telegram_id
+        self.character_id = character_id
+
+    @property
+    def has_character(self):
+        return self.character_id is not None
+
+
+def get_bot_token(bot_token=None):
+    """
+    Токен бота, которым подписана initData. Без токена проверить подпись нечем,
+    поэтому сессии не выдаются вовсе: ImproperlyConfigured, а не вход без проверки.
+    """
+    bot_token = bot_token or settings.TELEGRAM_BOT_TOKEN
+    if not bot_token:
+        raise ImproperlyConfigured('TELEGRAM_BOT_TOKEN не задан, вход в Mini App невозможен')
+    return bot_token
+
+
+def validate_init_data(init_data, bot_token=None, max_age=None):
+    """
+    Проверить initData Telegram WebApp и вернуть ее поля (user - уже словарь).
+    Подпись: HMAC-SHA256 отсортированных полей ключом HMAC-SHA256("WebAppData", токен бота).
+    Неверная или устаревшая initData - ValueError, не задан токен бота - ImproperlyConfigured.
+    """
+    bot_token = get_bot_token(bot_token)
+    max_age = max_age if max_age is not None else settings.TELEGRAM_INIT_DATA_MAX_AGE
+
+    try:
+        data = dict(parse_qsl(init_data or '', keep_blank_values=True, strict_parsing=True))
+    except ValueError:
+        raise ValueError('Неверный формат данных Telegram')
+
+    received_hash = data.pop('hash', '')
+    check_string = '\n'.join(f'{key}={value}' for key, value in sorted(data.items()))
+    secret_key = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    expected_hash = hmac.new(secret_key, check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        raise ValueError('Неверная подпись данных Telegram')
+
+    try:
+        auth_date = int(data.get('auth_date', 0))
+        data['user'] = json.loads(data['user'])
+    except (KeyError, ValueError):
+        raise ValueError('Неверные данные пользователя Telegram')
+    if max_age and time.time() - auth_date > max_age:
+        raise ValueError('Данные Telegram устарели, откройте игру заново')
+    if not data['user'].get('id'):
+        raise ValueError('Неверные данные пользователя Telegram')
+    return data
+
+
+def issue_token(player_id, telegram_id, character_id=None):
+    """
+    Подписанный токен сессии (с меткой времени, срок - SESSION_TOKEN_MAX_AGE).
+    Как и validate_init_data, без TELEGRAM_BOT_TOKEN - ImproperlyConfigured.
+    """
+    get_bot_token()
+    return signing.dumps([player_id, telegram_id, character_id], salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token, max_age=None):
+    """Сессия из токена; неверный или истекший токен - ValueError"""
+    max_age = max_age if max_age is not None else settings.SESSION_TOKEN_MAX_AGE
+    try:
+        player_id, telegram_id, character_id = signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+    except signing.SignatureExpired:
+        raise ValueError('Сессия истекла, откройте игру заново')
+    except (signing.BadSignature, TypeError, ValueError):
+        raise ValueError('Неверный токен сессии')
+    return GameSession(player_id, telegram_id, character_id)
+
+
+def get_session(request):
+    """
+    Сессия запроса: токен из заголовка X-Session-Token или параметра ?session=.
+    Нет токена - None, неверный токен - ValueError. Результат запоминается в запросе.
+    """
+    if hasattr(request, '_game_session'):
+        return request._game_session
+    token = request.META.get(TOKEN_HEADER) or request.GET.get(TOKEN_PARAM)
+    session = read_token(token) if token else None
+    request._game_session = session
+    return session
+
+
+def get_request_telegram_id(request, telegram_id=None):
+    """
+    Telegram ID игрока для действий: из токена сессии. Без токена переданный в запросе
+    telegram_id принимается, только если включен TELEGRAM_LEGACY_AUTH, иначе - None.
+    Неверный токен - ValueError.
+    """
+    session = get_session(request)
+    if session is not None:
+        return session.telegram_id
+    return telegram_id if settings.TELEGRAM_LEGACY_AUTH else None
@@ -1,3 +1,174 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import time
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core.testing import TEST_BOT_TOKEN
+from telegram_bot.models import OutboxMessage
+from .leaderboard import Leaderboard, leaderboard
+from .models import EXPERIENCE_PER_LEVEL, Player, PlayerProfile
+from .services import RewardService
+from .session import TOKEN_SALT, issue_token, read_token, validate_init_data
+
+def sign_init_data(fields, bot_token=TEST_BOT_TOKEN):
+    """initData, подписанная так же, как ее подписывает Telegram"""
+    check_string = '\n'.join(f'{key}={value}' for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    signature = hmac.new(secret_key, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode({**fields, 'hash': signature})
+
+
+@override_settings(TELEGRAM_BOT_TOKEN=TEST_BOT_TOKEN, TELEGRAM_INIT_DATA_MAX_AGE=3600, SESSION_TOKEN_MAX_AGE=600)
+class SessionTests(SimpleTestCase):
+
+    def init_fields(self, auth_date=None, **user):
+        return {
+            'auth_date': str(int(auth_date if auth_date is not None else time.time())),
+            'query_id': 'AAE1',
+            'user': json.dumps({'id': 42, 'first_name': 'Игрок', **user}, ensure_ascii=False),
+        }
+
+    def test_valid_init_data(self):
+        data = validate_init_data(sign_init_data(self.init_fields(username='hero')))
+        self.assertEqual(data['user']['id'], 42)
+        self.assertEqual(data['user']['username'], 'hero')
+        self.assertNotIn('hash', data)
+
+    def test_tampered_init_data(self):
+        init_data = sign_init_data(self.init_fields())
+        tampered = init_data.replace('%22id%22%3A+42', '%22id%22%3A+43')
+        self.assertNotEqual(tampered, init_data)
+        with self.assertRaises(ValueError):
+            validate_init_data(tampered)
+        with self.assertRaises(ValueError):
+            validate_init_data(sign_init_data(self.init_fields(), bot_token='654321:other-bot'))
+
+    def test_missing_hash(self):
+        with self.assertRaises(ValueError):
+            validate_init_data(urlencode(self.init_fields()))
+        with self.assertRaises(ValueError):
+            validate_init_data('')
+
+    def test_expired_auth_date(self):
+        with self.assertRaises(ValueError):
+            validate_init_data(sign_init_data(self.init_fields(auth_date=time.time() - 7200)))
+
+    @override_settings(TELEGRAM_BOT_TOKEN='')
+    def test_missing_bot_token(self):
+        # Без токена бота подпись не проверить: ни проверки initData, ни токенов сессии
+        init_data = sign_init_data(self.init_fields(), bot_token='')
+        with self.assertRaises(ImproperlyConfigured):
+            validate_init_data(init_data)
+        with self.assertRaises(ImproperlyConfigured):
+            issue_token(1, 42)
+
+    def test_token_round_trip(self):
+        session = read_token(issue_token(1, 42, 7))
+        self.assertEqual((session.player_id, session.telegram_id, session.character_id), (1, 42, 7))
+        self.assertTrue(session.has_character)
+        self.assertFalse(read_token(issue_token(1, 42)).has_character)
+
+    def test_forged_token(self):
+        forged = signing.dumps([1, 43, None], key='not-the-secret-key', salt=TOKEN_SALT, compress=True)
+        for token in (forged, issue_token(1, 42) + 'x', 'garbage'):
+            with self.assertRaises(ValueError):
+                read_token(token)
+
+    def test_expired_token(self):
+        with mock.patch('time.time', return_value=time.time() - 1200):
+            token = issue_token(1, 42)
+        with self.assertRaises(ValueError):
+            read_token(token)
+
+
+class LeaderboardSyncTests(TestCase):
+
+    def setUp(self):
+        self.players = [Player.objects.create(telegram_id=800 + index, first_name=f'Игрок {index}') for index in range(3)]
+        for index, player in enumerate(self.players):
+            PlayerProfile.objects.create(player=player, level=3 - index)
+        self.board = Leaderboard()
+        self.board.reload()
+
+    def test_sync_applies_changes_from_other_processes(self):
+        last = self.players[2]
+        self.assertEqual(self.board.rank(last.id), 3)
+
+        # Изменение из другого процесса: UPDATE без обновления рейтинга этого процесса
+        PlayerProfile.objects.filter(player=last).update(level=10, updated_at=timezone.now())
+        newcomer = Player.objects.create(telegram_id=900, first_name='Новичок')
+        PlayerProfile.objects.create(player=newcomer, level=5)
+        self.assertEqual(self.board.rank(last.id), 3)
+
+        self.board.sync()
+        self.assertEqual(self.board.rank(last.id), 1)
+        self.assertEqual(self.board.rank(newcomer.id), 2)
+        self.assertEqual(self.board.player_id_for(900), newcomer.id)
+        self.assertEqual([entry['player_id'] for entry in self.board.top(5)][2:], [self.players[0].id, self.players[1].id])
+
+
+class RewardServiceTests(TestCase):
+
+    def setUp(self):
+        self.players = [
+            Player.objects.create(telegram_id=1000 + index, twitch_id=f'tw{index}', first_name=f'Игрок {index}')
+            for index in range(5)
+        ]
+        for player in self.players:
+            PlayerProfile.objects.create(player=player, level=1, experience=50, gold=0)
+        leaderboard.reload()
+
+    def profile(self, player):
+        return PlayerProfile.objects.get(player=player)
+
+    def test_multi_level_up(self):
+        player = self.players[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            report = RewardService.grant_bulk([(player.telegram_id, EXPERIENCE_PER_LEVEL * 3 + 10, 7)])
+
+        profile = self.profile(player)
+        self.assertEqual((profile.level, profile.experience, profile.gold), (4, 360, 7))
+        self.assertEqual(report['granted'], 1)
+        self.assertEqual(report['level_ups'], [
+            {'player_id': player.id, 'telegram_id': player.telegram_id, 'old_level': 1, 'new_level': 4},
+        ])
+        # Одно уведомление о новом уровне, даже если уровней несколько
+        self.assertEqual(list(OutboxMessage.objects.values_list('chat_id', 'kind')), [(player.telegram_id, 'level_up')])
+        self.assertEqual(leaderboard.rank(player.id), 1)
+
+    def test_chunk_boundaries(self):
+        rewards = [(player.telegram_id, 30, 1) for player in self.players]
+        # Повтор игрока из другой пачки суммируется до разбиения
+        rewards.append((self.players[0].telegram_id, 30, 1))
+        with mock.patch.object(RewardService, 'CHUNK_SIZE', 2), self.captureOnCommitCallbacks(execute=True):
+            report = RewardService.grant_bulk(rewards)
+
+        self.assertEqual(report['granted'], 5)
+        self.assertEqual(report['unknown'], [])
+        self.assertEqual(self.profile(self.players[0]).experience, 110)
+        self.assertEqual(self.profile(self.players[0]).gold, 2)
+        for player in self.players[1:]:
+            self.assertEqual((self.profile(player).level, self.profile(player).experience), (1, 80))
+        self.assertEqual([level_up['player_id'] for level_up in report['level_ups']], [self.players[0].id])
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertEqual(leaderboard.rank(self.players[0].id), 1)
+
+    def test_unknown_identifiers(self):
+        with mock.patch.object(RewardService, 'CHUNK_SIZE', 2):
+            report = RewardService.grant_bulk([(999_999, 500, 5), (self.players[1].telegram_id, 10, 5), (999_998, 1, 1)])
+        self.assertEqual(report['granted'], 1)
+        self.assertEqual(sorted(report['unknown']), [999_998, 999_999])
+        self.assertEqual(self.profile(self.players[1]).experience, 60)
+
+        report = RewardService.grant_bulk([('tw2', 100, 0), ('nobody', 100, 0)], by='twitch_id')
+        self.assertEqual(report['unknown'], ['nobody'])
+        self.assertEqual(self.profile(self.players[2]).level, 2)
+        with self.assertRaises(ValueError):
+            RewardService.grant_bulk([], by='username')
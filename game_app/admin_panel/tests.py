@@ -1,3 +1,50 @@
 from django.test import TestCase
 
-# Create your tests here.
+from characters.models import Equipment
+from characters.services import LoadoutService
+from core.testing import QueryBudgetMixin, seed_world
+
+
+class AdminPanelQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Бюджет запросов страниц db-admin: страница списка - счетчик и выборка без N+1"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.world = seed_world()
+        cls.player = cls.world.player
+        cls.character = cls.world.character
+
+    def assertPageBudget(self, url, max_queries):
+        with self.assertQueryBudget(max_queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_dashboard(self):
+        self.assertPageBudget('/db-admin/', 4)
+
+    def test_players(self):
+        self.assertPageBudget('/db-admin/players/', 2)
+        self.assertPageBudget(f'/db-admin/players/{self.player.id}/', 4)
+
+    def test_characters(self):
+        self.assertPageBudget('/db-admin/characters/', 2)
+        self.assertPageBudget(f'/db-admin/characters/{self.character.id}/', 3)
+
+    def test_items(self):
+        self.assertPageBudget('/db-admin/items/', 2)
+        self.assertPageBudget(f'/db-admin/items/{self.world.items[0].id}/', 1)
+        self.assertPageBudget('/db-admin/items/create/', 0)
+
+    def test_inventory(self):
+        self.assertPageBudget('/db-admin/inventory/', 2)
+
+    def test_equipment(self):
+        head = next(item for item in self.world.items if item.equipment_slot == 'head')
+        # Последний игрок - на первой странице списка
+        LoadoutService.equip_item(self.world.players[-1].telegram_id, head.id)
+        response = self.assertPageBudget('/db-admin/equipment/', 3)
+        # Выводятся все слоты, а не только оружие и торс
+        for _, name in Equipment.SLOTS:
+            self.assertContains(response, f'<div class="slot-title">{name}</div>')
+        self.assertContains(response, f'<div class="slot-name">{head.name}</div>', html=False)
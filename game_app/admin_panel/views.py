@@ -9,6 +9,7 @@ from characters.models import Character, Equipment
 from items.models import Item, Inventory
 
 from accounts.services import PlayerService
+from characters.services import LoadoutService
 
 # Admin Panel Views
 
@@ -266,17 +267,19 @@ def admin_equipment(request):
         search_query = request.GET.get('search', '')
         page = request.GET.get('page', 1)
 
-        equipment = Equipment.objects.select_related('character', 'character__player', 'weapon', 'torso').all()
+        characters = Character.objects.select_related('player').all()
 
         if search_query:
-            equipment = equipment.filter(
-                Q(character__name__icontains=search_query) |
-                Q(character__player__first_name__icontains=search_query) |
-                Q(character__player__username__icontains=search_query)
+            characters = characters.filter(
+                Q(name__icontains=search_query) |
+                Q(player__first_name__icontains=search_query) |
+                Q(player__username__icontains=search_query)
             )
 
-        paginator = Paginator(equipment.order_by('-id'), 20)
+        paginator = Paginator(characters.order_by('-id'), 20)
         equipment_page = paginator.get_page(page)
+        # Экипировка всех персонажей страницы одним запросом
+        equipment_page.object_list = LoadoutService.get_loadouts(equipment_page.object_list)
 
         return render(request, 'admin_panel/equipment.html', {
             'equipment': equipment_page,
@@ -66,3 +66,50 @@ class EquipmentSerializer(serializers.ModelSerializer):
         model = Equipment
         fields = ['id', 'character', 'character_name', 'slot', 'item', 'equipped_at']
         read_only_fields = ['id', 'equipped_at']
+
+
+class LoadoutSlotSerializer(serializers.Serializer):
+    code = serializers.CharField()
+    name = serializers.CharField()
+    item = ItemSerializer(allow_null=True)
+
+
+class LoadoutSerializer(serializers.Serializer):
+    character = serializers.IntegerField(source='character.id')
+    character_name = serializers.CharField(source='character.name')
+    slots = LoadoutSlotSerializer(many=True)
+
+
+class LeaderboardEntrySerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
+    telegram_id = serializers.IntegerField(allow_null=True)
+    name = serializers.CharField(allow_null=True)
+    level = serializers.IntegerField()
+    experience = serializers.IntegerField()
+
+
+class LeaderboardSerializer(serializers.Serializer):
+    total = serializers.IntegerField()
+    top = LeaderboardEntrySerializer(many=True)
+    me = LeaderboardEntrySerializer(allow_null=True)
+    around = LeaderboardEntrySerializer(many=True)
+
+
+class CombatStatsSerializer(serializers.Serializer):
+    character_id = serializers.IntegerField()
+    max_health = serializers.IntegerField()
+    min_attack = serializers.IntegerField()
+    max_attack = serializers.IntegerField()
+    defense = serializers.IntegerField()
+    crit_chance = serializers.FloatField()
+    dodge_chance = serializers.FloatField()
+
+
+class FightResultSerializer(serializers.Serializer):
+    attacker = CombatStatsSerializer()
+    defender = CombatStatsSerializer()
+    winner_id = serializers.IntegerField()
+    loser_id = serializers.IntegerField()
+    rounds = serializers.IntegerField()
+    seed = serializers.IntegerField()
+    health_left = serializers.IntegerField()
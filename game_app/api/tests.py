@@ -1,3 +1,106 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from accounts.leaderboard import leaderboard
+from accounts.session import issue_token
+from core.testing import TEST_BOT_TOKEN, QueryBudgetMixin, seed_world
+
+
+@override_settings(TELEGRAM_BOT_TOKEN=TEST_BOT_TOKEN)
+class ApiQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Бюджет запросов API: списки и детали не зависят от количества строк"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.world = seed_world()
+        cls.player = cls.world.player
+        cls.character = cls.world.character
+        cls.token = issue_token(cls.player.id, cls.player.telegram_id, cls.character.id)
+
+    def setUp(self):
+        super().setUp()
+        # Рейтинг в памяти загружен, как на работающем сервере
+        leaderboard.reload()
+
+    def assertGetBudget(self, url, max_queries, **params):
+        with self.assertQueryBudget(max_queries):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_players(self):
+        data = self.assertGetBudget('/api/players/', 1)
+        self.assertEqual(len(data), len(self.world.players))
+        self.assertGetBudget(f'/api/players/{self.player.id}/', 1)
+
+    def test_characters(self):
+        self.assertGetBudget('/api/characters/', 1)
+        self.assertGetBudget(f'/api/characters/{self.character.id}/', 1)
+
+    def test_items(self):
+        self.assertGetBudget('/api/items/', 1)
+        self.assertGetBudget(f'/api/items/{self.world.items[0].id}/', 1)
+
+    def test_inventory(self):
+        self.assertGetBudget('/api/inventory/', 1)
+        self.assertGetBudget(f'/api/inventory/{self.player.inventory.first().id}/', 1)
+
+    def test_equipment(self):
+        self.assertGetBudget('/api/equipment/', 1)
+        self.assertGetBudget(f'/api/equipment/{self.character.equipment.first().id}/', 1)
+
+    def test_loadout(self):
+        data = self.assertGetBudget('/api/equipment/loadout/', 2, character=self.character.id)
+        self.assertEqual(data['character'], self.character.id)
+        data = self.assertGetBudget('/api/equipment/loadout/', 2, session=self.token)
+        self.assertEqual(data['character'], self.character.id)
+
+    def test_leaderboard(self):
+        data = self.assertGetBudget('/api/leaderboard/', 1, session=self.token)
+        self.assertEqual(data['me']['telegram_id'], self.player.telegram_id)
+
+    def test_legacy_telegram_id(self):
+        # Без токена сессии telegram_id из запроса принимается только при TELEGRAM_LEGACY_AUTH
+        response = self.client.get('/api/equipment/loadout/', {'telegram_id': self.player.telegram_id})
+        self.assertEqual(response.status_code, 400)
+        data = self.client.get('/api/leaderboard/', {'telegram_id': self.player.telegram_id}).json()
+        self.assertIsNone(data['me'])
+
+        with self.settings(TELEGRAM_LEGACY_AUTH=True):
+            data = self.client.get('/api/equipment/loadout/', {'telegram_id': self.player.telegram_id}).json()
+            self.assertEqual(data['character'], self.character.id)
+            data = self.client.get('/api/leaderboard/', {'telegram_id': self.player.telegram_id}).json()
+            self.assertEqual(data['me']['telegram_id'], self.player.telegram_id)
+
+    def test_game_actions(self):
+        headers = {'HTTP_X_SESSION_TOKEN': self.token}
+        with self.assertQueryBudget(6):
+            response = self.client.post(
+                '/api/game/equip_item/', json.dumps({'item_id': self.world.items[2].id}),
+                content_type='application/json', **headers,
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+
+        with self.assertQueryBudget(6):
+            response = self.client.post(
+                '/api/game/unequip_item/', json.dumps({'slot': 'head'}),
+                content_type='application/json', **headers,
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_game_action_errors(self):
+        headers = {'HTTP_X_SESSION_TOKEN': self.token}
+        response = self.client.post(
+            '/api/game/equip_item/', json.dumps({'item_id': 10**9}), content_type='application/json', **headers,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Предмет не найден в инвентаре'})
+
+        # Ошибки кода не превращаются в 400
+        with mock.patch('api.views.LoadoutService.unequip_item', side_effect=RuntimeError('bug')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(
+                    '/api/game/unequip_item/', json.dumps({'slot': 'head'}), content_type='application/json', **headers,
+                )
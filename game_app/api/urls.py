@@ -10,6 +10,7 @@ router.register(r'items', views.ItemViewSet)
 router.register(r'inventory', views.InventoryViewSet)
 router.register(r'equipment', views.EquipmentViewSet)
 router.register(r'game', views.GameViewSet, basename='game')
+router.register(r'leaderboard', views.LeaderboardViewSet, basename='leaderboard')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -10,12 +10,27 @@ from items.models import Item, Inventory
 from .serializers import (
     PlayerSerializer, PlayerProfileSerializer,
     CharacterSerializer, EquipmentSerializer,
-    ItemSerializer, InventorySerializer
+    ItemSerializer, InventorySerializer, LoadoutSerializer,
+    LeaderboardSerializer, FightResultSerializer
 )
+from accounts.services import PlayerService
+from accounts.session import get_request_telegram_id
+from characters.services import LoadoutService
+from game.combat import CombatService
+from items.catalog import item_catalog
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
 
+class CatalogItemsMixin:
+    """Предметы строк (поле item) подставляются из каталога вместо JOIN с items_item"""
+
+    def get_serializer(self, instance=None, *args, **kwargs):
+        if instance is not None:
+            instance = item_catalog.attach(instance)
+        return super().get_serializer(instance, *args, **kwargs)
+
+
 @api_view(['GET'])
 def api_status(request):
     """API статус"""
@@ -83,13 +98,13 @@ class ItemViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
-class InventoryViewSet(viewsets.ReadOnlyModelViewSet):
+class InventoryViewSet(CatalogItemsMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet для инвентаря"""
-    queryset = Inventory.objects.select_related('player', 'item').all()
+    queryset = Inventory.objects.select_related('player').all()
     serializer_class = InventorySerializer
 
     def get_queryset(self):
-        queryset = Inventory.objects.select_related('player', 'item').all()
+        queryset = Inventory.objects.select_related('player').all()
         search = self.request.query_params.get('search', None)
         if search:
             queryset = queryset.filter(
@@ -100,13 +115,13 @@ class InventoryViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
-class EquipmentViewSet(viewsets.ReadOnlyModelViewSet):
+class EquipmentViewSet(CatalogItemsMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet для экипировки"""
-    queryset = Equipment.objects.select_related('character__player', 'item').all()
+    queryset = Equipment.objects.select_related('character__player').all()
     serializer_class = EquipmentSerializer
 
     def get_queryset(self):
-        queryset = Equipment.objects.select_related('character__player', 'item').all()
+        queryset = Equipment.objects.select_related('character__player').all()
         search = self.request.query_params.get('search', None)
         if search:
             queryset = queryset.filter(
@@ -116,6 +131,46 @@ class EquipmentViewSet(viewsets.ReadOnlyModelViewSet):
             )
         return queryset
 
+    @action(detail=False, methods=['get'])
+    def loadout(self, request):
+        """Полная экипировка персонажа (все слоты) по character, telegram_id или токену сессии"""
+        character_id = request.query_params.get('character')
+        try:
+            telegram_id = get_request_telegram_id(request, request.query_params.get('telegram_id'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if character_id:
+            character = get_object_or_404(Character, pk=character_id)
+        elif telegram_id:
+            character = get_object_or_404(Character, player__telegram_id=telegram_id)
+        else:
+            return Response({'error': 'Укажите character или telegram_id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        loadout = LoadoutService.get_loadout(character)
+        return Response(LoadoutSerializer(loadout).data)
+
+
+class LeaderboardViewSet(viewsets.ViewSet):
+    """ViewSet для таблицы лидеров"""
+
+    def list(self, request):
+        """Первые игроки рейтинга и, если указан telegram_id, место игрока с соседями"""
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 100)
+            radius = min(int(request.query_params.get('radius', 2)), 50)
+            telegram_id = request.query_params.get('telegram_id')
+            telegram_id = int(telegram_id) if telegram_id else None
+        except ValueError:
+            return Response({'error': 'limit, radius и telegram_id должны быть числами'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            telegram_id = get_request_telegram_id(request, telegram_id)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        data = PlayerService.get_leaderboard(telegram_id, limit=limit, radius=radius)
+        return Response(LeaderboardSerializer(data).data)
+
 
 # API для игровых действий
 class GameViewSet(viewsets.ViewSet):
@@ -125,80 +180,53 @@ class GameViewSet(viewsets.ViewSet):
     def equip_item(self, request):
         """Экипировка предмета"""
         try:
-            telegram_id = request.data.get('telegram_id')
+            telegram_id = get_request_telegram_id(request, request.data.get('telegram_id'))
             item_id = request.data.get('item_id')
             slot = request.data.get('slot')
 
-            if not all([telegram_id, item_id, slot]):
+            if not all([telegram_id, item_id]):
                 return Response({'error': 'Отсутствуют необходимые данные'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Получаем персонажа
-            character = get_object_or_404(Character, player__telegram_id=telegram_id)
-
-            # Получаем предмет из инвентаря
-            inventory_item = get_object_or_404(Inventory, player__telegram_id=telegram_id, item_id=item_id)
-
-            # Получаем или создаем слот экипировки
-            equipment, created = Equipment.objects.get_or_create(
-                character=character,
-                slot=slot,
-                defaults={'item': inventory_item.item}
-            )
-
-            if not created:
-                equipment.item = inventory_item.item
-                equipment.save()
-
-            # Уменьшаем количество предметов в инвентаре
-            inventory_item.quantity -= 1
-            if inventory_item.quantity <= 0:
-                inventory_item.delete()
-            else:
-                inventory_item.save()
-
-            # Пересчитываем характеристики персонажа
-            character.save()
+            # Снятие старого предмета, списание из инвентаря и пересчет - одной транзакцией
+            LoadoutService.equip_item(telegram_id, item_id, slot)
 
             return Response({'success': True})
 
-        except Exception as e:
+        except ValueError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['post'])
     def unequip_item(self, request):
         """Снятие предмета с экипировки"""
         try:
-            telegram_id = request.data.get('telegram_id')
+            telegram_id = get_request_telegram_id(request, request.data.get('telegram_id'))
             slot = request.data.get('slot')
 
             if not all([telegram_id, slot]):
                 return Response({'error': 'Отсутствуют необходимые данные'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Получаем персонажа
-            character = get_object_or_404(Character, player__telegram_id=telegram_id)
+            # Предмет возвращается в инвентарь, характеристики пересчитываются
+            LoadoutService.unequip_item(telegram_id, slot)
 
-            # Получаем экипировку
-            equipment = get_object_or_404(Equipment, character=character, slot=slot)
+            return Response({'success': True})
 
-            if equipment.item:
-                # Добавляем предмет обратно в инвентарь
-                inventory, created = Inventory.objects.get_or_create(
-                    player=character.player,
-                    item=equipment.item,
-                    defaults={'quantity': 1}
-                )
-                if not created:
-                    inventory.quantity += 1
-                    inventory.save()
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-                # Снимаем предмет
-                equipment.item = None
-                equipment.save()
+    @action(detail=False, methods=['post'])
+    def fight(self, request):
+        """Бой персонажа игрока с другим персонажем (opponent - id персонажа)"""
+        try:
+            telegram_id = get_request_telegram_id(request, request.data.get('telegram_id'))
+            opponent_id = request.data.get('opponent')
 
-                # Пересчитываем характеристики персонажа
-                character.save()
+            if not all([telegram_id, opponent_id]):
+                return Response({'error': 'Отсутствуют необходимые данные'}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response({'success': True})
+            # Победа и поражение записываются в профили обоих игроков
+            result = CombatService.fight(telegram_id, opponent_id)
+
+            return Response(FightResultSerializer(result).data)
 
-        except Exception as e:
+        except ValueError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
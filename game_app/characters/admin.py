@@ -7,7 +7,12 @@ class CharacterAdmin(admin.ModelAdmin):
     list_display = ['name', 'player', 'level', 'strength', 'agility', 'vitality', 'max_health', 'created_at']
     list_filter = ['level', 'created_at']
     search_fields = ['name', 'player__username', 'player__first_name', 'player__telegram_id']
-    readonly_fields = ['created_at', 'updated_at', 'max_health', 'min_attack', 'max_attack', 'defense', 'crit_chance', 'dodge_chance']
+    readonly_fields = [
+        'created_at', 'updated_at', 'max_health', 'min_attack', 'max_attack', 'defense', 'crit_chance', 'dodge_chance',
+        'equipment_strength_bonus', 'equipment_agility_bonus', 'equipment_vitality_bonus',
+        'equipment_attack_bonus', 'equipment_defense_bonus', 'equipment_health_bonus',
+        'equipment_crit_chance_bonus', 'equipment_dodge_chance_bonus',
+    ]
     ordering = ['-level', '-created_at']
 
     fieldsets = (
@@ -24,6 +29,14 @@ class CharacterAdmin(admin.ModelAdmin):
             'fields': ('min_attack', 'max_attack', 'defense', 'crit_chance', 'dodge_chance'),
             'classes': ('collapse',)
         }),
+        ('Бонусы экипировки', {
+            'fields': (
+                ('equipment_strength_bonus', 'equipment_agility_bonus', 'equipment_vitality_bonus'),
+                ('equipment_attack_bonus', 'equipment_defense_bonus', 'equipment_health_bonus'),
+                ('equipment_crit_chance_bonus', 'equipment_dodge_chance_bonus'),
+            ),
+            'classes': ('collapse',)
+        }),
         ('Системная информация', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
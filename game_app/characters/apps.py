@@ -4,3 +4,33 @@ from django.apps import AppConfig
 class CharactersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'characters'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save, pre_delete
+
+        from items.models import Item
+        from .models import Character, Equipment
+        from .stats import ITEM_BONUS_FIELDS, StatsRecomputeEngine
+
+        # Суммы бонусов экипировки на персонаже накоплены из бонусов предметов на момент
+        # экипировки - при изменении или удалении надетого предмета их нужно пересчитать
+
+        def recompute_item_wearers(sender, instance, created=False, update_fields=None, **kwargs):
+            if created or (update_fields is not None and not set(update_fields) & set(ITEM_BONUS_FIELDS)):
+                return
+            StatsRecomputeEngine().run_for_items([instance.pk])
+
+        def remember_item_wearers(sender, instance, **kwargs):
+            # После удаления слот уже пуст (SET_NULL), поэтому персонажей запоминаем заранее
+            instance._wearer_ids = list(
+                Equipment.objects.filter(item=instance).values_list('character_id', flat=True).distinct()
+            )
+
+        def recompute_former_wearers(sender, instance, **kwargs):
+            wearer_ids = getattr(instance, '_wearer_ids', None)
+            if wearer_ids:
+                StatsRecomputeEngine().run(Character.objects.filter(pk__in=wearer_ids))
+
+        post_save.connect(recompute_item_wearers, sender=Item, weak=False, dispatch_uid='characters.item_wearers')
+        pre_delete.connect(remember_item_wearers, sender=Item, weak=False, dispatch_uid='characters.item_wearers')
+        post_delete.connect(recompute_former_wearers, sender=Item, weak=False, dispatch_uid='characters.item_wearers')
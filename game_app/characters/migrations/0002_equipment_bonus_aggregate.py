@@ -0,0 +1,79 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:36
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+ITEM_BONUS_FIELDS = [
+    'strength_bonus', 'agility_bonus', 'vitality_bonus',
+    'attack_bonus', 'defense_bonus', 'health_bonus',
+    'crit_chance_bonus', 'dodge_chance_bonus',
+]
+
+
+def fill_equipment_bonuses(apps, schema_editor):
+    """Заполняем суммарные бонусы экипировки для существующих персонажей"""
+    Character = apps.get_model('characters', 'Character')
+    Equipment = apps.get_model('characters', 'Equipment')
+
+    totals = (
+        Equipment.objects.filter(item__isnull=False)
+        .values('character_id')
+        .annotate(**{field: Sum(f'item__{field}') for field in ITEM_BONUS_FIELDS})
+        .order_by()
+    )
+    for row in totals:
+        Character.objects.filter(pk=row['character_id']).update(
+            **{f'equipment_{field}': row[field] or 0 for field in ITEM_BONUS_FIELDS}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='equipment_agility_bonus',
+            field=models.IntegerField(default=0, verbose_name='Бонус экипировки к ловкости'),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='equipment_attack_bonus',
+            field=models.IntegerField(default=0, verbose_name='Бонус экипировки к атаке'),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='equipment_crit_chance_bonus',
+            field=models.FloatField(default=0.0, verbose_name='Бонус экипировки к шансу крита (%)'),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='equipment_defense_bonus',
+            field=models.IntegerField(default=0, verbose_name='Бонус экипировки к защите'),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='equipment_dodge_chance_bonus',
+            field=models.FloatField(default=0.0, verbose_name='Бонус экипировки к шансу уворота (%)'),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='equipment_health_bonus',
+            field=models.IntegerField(default=0, verbose_name='Бонус экипировки к здоровью'),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='equipment_strength_bonus',
+            field=models.IntegerField(default=0, verbose_name='Бонус экипировки к силе'),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='equipment_vitality_bonus',
+            field=models.IntegerField(default=0, verbose_name='Бонус экипировки к живучести'),
+        ),
+        migrations.RunPython(fill_equipment_bonuses, migrations.RunPython.noop),
+    ]
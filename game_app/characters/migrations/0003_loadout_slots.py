@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('characters', '0002_equipment_bonus_aggregate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='equipment',
+            name='slot',
+            field=models.CharField(choices=[('weapon', 'Оружие'), ('torso', 'Торс'), ('head', 'Голова'), ('hands', 'Руки'), ('legs', 'Ноги'), ('feet', 'Ступни'), ('accessory', 'Аксессуар')], max_length=20, verbose_name='Слот'),
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
+from django.db.models import Case, F, When
 from django.utils import timezone
 
+from items.models import Item
+from .stats import EQUIPMENT_BONUS_FIELDS, ITEM_BONUS_FIELDS, STAT_FIELDS, compute_stats, item_bonuses
+
 
 class Character(models.Model):
     """Модель персонажа игрока"""
@@ -30,10 +34,23 @@ class Character(models.Model):
     crit_chance = models.FloatField(default=5.0, verbose_name="Шанс крита (%)")
     dodge_chance = models.FloatField(default=5.0, verbose_name="Шанс уворота (%)")
 
+    # Суммарные бонусы экипированных предметов (обновляются при экипировке/снятии)
+    equipment_strength_bonus = models.IntegerField(default=0, verbose_name="Бонус экипировки к силе")
+    equipment_agility_bonus = models.IntegerField(default=0, verbose_name="Бонус экипировки к ловкости")
+    equipment_vitality_bonus = models.IntegerField(default=0, verbose_name="Бонус экипировки к живучести")
+    equipment_attack_bonus = models.IntegerField(default=0, verbose_name="Бонус экипировки к атаке")
+    equipment_defense_bonus = models.IntegerField(default=0, verbose_name="Бонус экипировки к защите")
+    equipment_health_bonus = models.IntegerField(default=0, verbose_name="Бонус экипировки к здоровью")
+    equipment_crit_chance_bonus = models.FloatField(default=0.0, verbose_name="Бонус экипировки к шансу крита (%)")
+    equipment_dodge_chance_bonus = models.FloatField(default=0.0, verbose_name="Бонус экипировки к шансу уворота (%)")
+
     # Дата создания и обновления
     created_at = models.DateTimeField(default=timezone.now, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
 
+    # Поля, от которых зависят вычисляемые характеристики
+    STAT_INPUT_FIELDS = ['strength', 'agility', 'vitality'] + EQUIPMENT_BONUS_FIELDS
+
     class Meta:
         verbose_name = "Персонаж"
         verbose_name_plural = "Персонажи"
@@ -41,97 +58,133 @@ class Character(models.Model):
     def __str__(self):
         return f"{self.name} - {self.player}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем значения из базы, чтобы при сохранении знать, что изменилось
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_values(fields)
+
+    def _remember_values(self, fields=None):
+        """Считать текущие значения полей (по умолчанию - всех загруженных) сохраненными"""
+        loaded = getattr(self, '_loaded_values', None)
+        if fields is None or loaded is None:
+            self._loaded_values = {
+                field.attname: self.__dict__[field.attname]
+                for field in self._meta.concrete_fields
+                if field.attname in self.__dict__
+            }
+            return
+        for name in fields:
+            attname = self._meta.get_field(name).attname
+            loaded[attname] = getattr(self, attname)
+
+    def get_changed_fields(self):
+        """Поля, измененные с момента загрузки из базы (None, если это неизвестно)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return {attname for attname, value in loaded.items() if getattr(self, attname) != value}
+
+    def get_equipment_bonuses(self):
+        """Суммарные бонусы экипировки по ITEM_BONUS_FIELDS"""
+        return {field: getattr(self, f'equipment_{field}') for field in ITEM_BONUS_FIELDS}
+
     def calculate_stats(self):
-        """Расчет характеристик на основе навыков и экипировки"""
-        from django.apps import apps
-        Equipment = apps.get_model('characters', 'Equipment')
-
-        # Базовые значения
-        base_health = 100
-        base_min_attack = 10
-        base_max_attack = 15
-        base_defense = 5
-
-        # Применяем бонусы экипировки к первичным характеристикам
-        effective_strength = self.strength
-        effective_agility = self.agility
-        effective_vitality = self.vitality
-
-        # Бонусы от экипировки к первичным характеристикам
-        equipment_strength_bonus = 0
-        equipment_agility_bonus = 0
-        equipment_vitality_bonus = 0
-
-        # Бонусы от экипировки к вторичным характеристикам
-        equipment_health_bonus = 0
-        equipment_min_attack_bonus = 0
-        equipment_max_attack_bonus = 0
-        equipment_defense_bonus = 0
-        equipment_crit_bonus = 0.0
-        equipment_dodge_bonus = 0.0
-
-        # Получаем бонусы от экипированных предметов
-        try:
-            for equip in Equipment.objects.filter(character=self):
-                if equip.item:
-                    # Бонусы к первичным характеристикам
-                    equipment_strength_bonus += getattr(equip.item, 'strength_bonus', 0)
-                    equipment_agility_bonus += getattr(equip.item, 'agility_bonus', 0)
-                    equipment_vitality_bonus += getattr(equip.item, 'vitality_bonus', 0)
-
-                    # Бонусы к вторичным характеристикам
-                    equipment_health_bonus += getattr(equip.item, 'health_bonus', 0)
-                    equipment_min_attack_bonus += getattr(equip.item, 'attack_bonus', 0)
-                    equipment_max_attack_bonus += getattr(equip.item, 'attack_bonus', 0)
-                    equipment_defense_bonus += getattr(equip.item, 'defense_bonus', 0)
-                    equipment_crit_bonus += getattr(equip.item, 'crit_chance_bonus', 0)
-                    equipment_dodge_bonus += getattr(equip.item, 'dodge_chance_bonus', 0)
-        except Exception:
-            # Если модель еще не доступна, пропускаем расчет
-            pass
-
-        # Применяем бонусы экипировки к первичным характеристикам
-        effective_strength += equipment_strength_bonus
-        effective_agility += equipment_agility_bonus
-        effective_vitality += equipment_vitality_bonus
-
-        # Модификаторы от навыков (используем эффективные значения)
-        skill_health_bonus = (effective_vitality - 5) * 15  # +15 HP за каждый уровень живучести выше 5
-        skill_min_attack_bonus = (effective_agility - 5) * 2  # +2 к мин атаке за ловкость
-        skill_max_attack_bonus = (effective_strength - 5) * 3  # +3 к макс атаке за силу
-        skill_defense_bonus = (effective_vitality - 5) * 2      # +2 к защите за живучесть
-        skill_crit_bonus = (effective_strength - 5) * 1.5         # +1.5% крита за силу
-        skill_dodge_bonus = (effective_agility - 5) * 1.0         # +1% уворота за ловкость
+        """Расчет характеристик на основе навыков и суммарных бонусов экипировки"""
+        was_full_health = self.current_health >= self.max_health
 
         # Итоговые характеристики
-        self.max_health = base_health + skill_health_bonus + equipment_health_bonus
-        self.min_attack = base_min_attack + skill_min_attack_bonus + equipment_min_attack_bonus
-        self.max_attack = base_max_attack + skill_max_attack_bonus + equipment_max_attack_bonus
-        self.defense = base_defense + skill_defense_bonus + equipment_defense_bonus
-        self.crit_chance = 5.0 + skill_crit_bonus + equipment_crit_bonus
-        self.dodge_chance = 5.0 + skill_dodge_bonus + equipment_dodge_bonus
+        for field, value in compute_stats(self.strength, self.agility, self.vitality, self.get_equipment_bonuses()).items():
+            setattr(self, field, value)
+
+        # Полное здоровье остается полным, иначе только ограничиваем новым максимумом
+        if was_full_health:
+            self.current_health = self.max_health
+        else:
+            self.current_health = min(self.current_health, self.max_health)
+
+    def apply_equipment_delta(self, old_item=None, new_item=None):
+        """
+        Применить разницу бонусов между снятым (old_item) и надетым (new_item) предметом.
+
+        Бонусы и характеристики обновляются одним UPDATE относительно текущих
+        значений строки, без перебора экипировки.
+        """
+        old_bonuses = item_bonuses(old_item)
+        new_bonuses = item_bonuses(new_item)
+        delta = {field: new_bonuses[field] - old_bonuses[field] for field in ITEM_BONUS_FIELDS}
+        if not any(delta.values()):
+            return
+
+        # Обновляем объект в памяти
+        for field, value in delta.items():
+            setattr(self, f'equipment_{field}', getattr(self, f'equipment_{field}') + value)
+        self.calculate_stats()
 
-        # Устанавливаем текущие значения равными максимальным
-        self.current_health = self.max_health
+        # Обновляем строку в базе атомарно, относительно ее текущих значений
+        bonuses = {field: F(f'equipment_{field}') + value for field, value in delta.items()}
+        values = {f'equipment_{field}': expression for field, expression in bonuses.items()}
+        values.update(compute_stats(F('strength'), F('agility'), F('vitality'), bonuses))
+        values['current_health'] = Case(
+            When(current_health__gte=F('max_health'), then=values['max_health']),
+            When(current_health__gt=values['max_health'], then=values['max_health']),
+            default=F('current_health'),
+        )
+        Character.objects.filter(pk=self.pk).update(updated_at=timezone.now(), **values)
+        self._remember_values(EQUIPMENT_BONUS_FIELDS + STAT_FIELDS + ['current_health'])
 
     def save(self, *args, **kwargs):
-        """Переопределяем save для расчета характеристик"""
-        # Всегда пересчитываем характеристики при сохранении
-        self.calculate_stats()
+        """
+        Сохранение с учетом измененных полей.
+
+        Характеристики пересчитываются, только если изменились навыки или бонусы
+        экипировки, а UPDATE существующего персонажа ограничивается измененными полями.
+        """
+        changed = None
+        if not self._state.adding and not kwargs.get('force_insert'):
+            changed = self.get_changed_fields()
+
+        if changed is None:
+            # Новый персонаж или объект не из базы - полный пересчет и запись
+            self.calculate_stats()
+            super().save(*args, **kwargs)
+            self._remember_values()
+            return
+
+        update_fields = kwargs.get('update_fields')
+        inputs_changed = changed & set(self.STAT_INPUT_FIELDS)
+        if update_fields is not None:
+            inputs_changed &= set(update_fields)
+
+        if inputs_changed:
+            self.calculate_stats()
+            changed = self.get_changed_fields()
+
+        if update_fields is None:
+            if not changed:
+                # Ничего не изменилось - как и save(update_fields=[]), обходимся без запроса
+                return
+            kwargs['update_fields'] = changed | {'updated_at'}
+        elif inputs_changed:
+            kwargs['update_fields'] = set(update_fields) | (changed & set(STAT_FIELDS + ['current_health']))
+
         super().save(*args, **kwargs)
+        self._remember_values(kwargs['update_fields'])
 
 
 class Equipment(models.Model):
     """Экипировка персонажа"""
 
-    # Слоты экипировки
-    SLOTS = [
-        ('weapon', 'Оружие'),
-        ('torso', 'Торс'),
-    ]
+    # Слоты экипировки - все экипируемые слоты предметов
+    SLOTS = [slot for slot in Item.EQUIPMENT_SLOTS if slot[0] != 'none']
 
     character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name='equipment', verbose_name="Персонаж")
-    slot = models.CharField(max_length=20, choices=SLOTS, unique=True, verbose_name="Слот")
+    slot = models.CharField(max_length=20, choices=SLOTS, verbose_name="Слот")
     item = models.ForeignKey('items.Item', on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Предмет")
 
     # Дата экипировки
@@ -146,12 +199,34 @@ class Equipment(models.Model):
         item_name = self.item.name if self.item else "Пусто"
         return f"{self.character.name} - {self.get_slot_display()}: {item_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем предмет из базы, чтобы при сохранении применить только разницу бонусов
+        instance._loaded_item_id = instance.__dict__.get('item_id')
+        return instance
+
+    def _loaded_item(self):
+        """Предмет, который был в слоте на момент загрузки из базы"""
+        loaded_item_id = getattr(self, '_loaded_item_id', None)
+        if not loaded_item_id:
+            return None
+        return Item.objects.filter(pk=loaded_item_id).first()
+
     def save(self, *args, **kwargs):
-        """При экипировке пересчитываем характеристики персонажа"""
+        """При экипировке применяем к персонажу разницу бонусов старого и нового предмета"""
+        item_changed = self.item_id != getattr(self, '_loaded_item_id', None)
+        old_item = self._loaded_item() if item_changed else None
         super().save(*args, **kwargs)
-        self.character.save()  # Пересчет характеристик
+
+        if item_changed:
+            self.character.apply_equipment_delta(old_item=old_item, new_item=self.item)
+        self._loaded_item_id = self.item_id
 
     def delete(self, *args, **kwargs):
-        """При снятии экипировки пересчитываем характеристики"""
-        super().delete(*args, **kwargs)
-        self.character.save()  # Пересчет характеристик
+        """При снятии экипировки вычитаем бонусы предмета"""
+        old_item = self._loaded_item()
+        result = super().delete(*args, **kwargs)
+        if old_item:
+            self.character.apply_equipment_delta(old_item=old_item)
+        return result
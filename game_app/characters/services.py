@@ -0,0 +1,227 @@
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from items.catalog import item_catalog
+from items.models import Inventory
+from items.services import InventoryService
+from .models import Character, Equipment
+
+
+class Loadout:
+    """
+    Полная экипировка персонажа: все слоты, включая пустые.
+
+    В шаблонах доступна как equipment.weapon / equipment.torso и т.д.,
+    а equipment.slots перечисляет все слоты по порядку.
+    """
+
+    def __init__(self, character, equipment=()):
+        self.character = character
+        self.items = {code: None for code, _ in Equipment.SLOTS}
+        for equip in equipment:
+            if equip.slot in self.items:
+                self.items[equip.slot] = equip.item
+
+    def __getitem__(self, slot):
+        return self.items[slot]
+
+    def __bool__(self):
+        return True
+
+    @property
+    def id(self):
+        return self.character.pk
+
+    @property
+    def slots(self):
+        """Слоты по порядку: словари с кодом, названием и предметом"""
+        return [
+            {'code': code, 'name': name, 'item': self.items[code]}
+            for code, name in Equipment.SLOTS
+        ]
+
+    @property
+    def equipped_items(self):
+        return [item for item in self.items.values() if item]
+
+
+class LoadoutService:
+    """Сервис для работы с экипировкой персонажа"""
+
+    @staticmethod
+    def get_loadout(character):
+        """Экипировка персонажа одним запросом по индексу (character, slot), предметы - из каталога"""
+        equipment = item_catalog.attach(Equipment.objects.filter(character=character))
+        return Loadout(character, equipment)
+
+    @staticmethod
+    def get_loadouts(characters):
+        """Экипировка для списка персонажей одним запросом"""
+        characters = list(characters)
+        by_character = {character.pk: [] for character in characters}
+        equipment = item_catalog.attach(Equipment.objects.filter(character_id__in=by_character.keys()))
+        for equip in equipment:
+            by_character[equip.character_id].append(equip)
+        return [Loadout(character, by_character[character.pk]) for character in characters]
+
+    @staticmethod
+    def _lock_character(telegram_id, slot, item_id=None):
+        """
+        Одним запросом: персонаж игрока с блокировкой строки до конца транзакции,
+        id предмета в слоте (slot_item_id) и количество item_id в инвентаре (owned).
+        """
+        slot_equipment = Equipment.objects.filter(character=OuterRef('pk'), slot=slot)
+        annotations = {'slot_item_id': Subquery(slot_equipment.values('item_id')[:1])}
+        if item_id is not None:
+            owned = Inventory.objects.filter(player_id=OuterRef('player_id'), item_id=item_id)
+            annotations['owned'] = Subquery(owned.values('quantity')[:1])
+        try:
+            return (
+                Character.objects.select_for_update(of=('self',))
+                .annotate(**annotations)
+                .get(player__telegram_id=telegram_id)
+            )
+        except Character.DoesNotExist:
+            raise ValueError('Персонаж не найден')
+
+    @staticmethod
+    def _catalog_item(item_id):
+        """Предмет из каталога или None"""
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+        return item_catalog.get_many([item_id]).get(item_id)
+
+    @staticmethod
+    def _has_writable_cte():
+        """INSERT/UPDATE/DELETE внутри WITH: PostgreSQL да, SQLite нет"""
+        return connection.vendor == 'postgresql'
+
+    @staticmethod
+    def _equip_statement(character, new_item, old_item):
+        """
+        PostgreSQL: списание предмета из инвентаря, upsert слота и возврат снятого
+        предмета в инвентарь одним запросом (WITH ... INSERT ... ON CONFLICT).
+        Слот и возврат выполняются, только если списание нашло строку инвентаря.
+        """
+        inventory = connection.ops.quote_name(Inventory._meta.db_table)
+        equipment = connection.ops.quote_name(Equipment._meta.db_table)
+        now = timezone.now()
+        player = [character.player_id, new_item.pk]
+
+        # Как InventoryService.take_item: последняя стопка удаляется, иначе количество уменьшается
+        if character.owned == 1:
+            take = f'DELETE FROM {inventory} WHERE player_id = %s AND item_id = %s AND quantity = 1 RETURNING 1'
+        else:
+            take = (
+                f'UPDATE {inventory} SET quantity = quantity - 1 '
+                f'WHERE player_id = %s AND item_id = %s AND quantity >= 1 RETURNING 1'
+            )
+        sql = (
+            f'WITH taken AS ({take}), '
+            f'equipped AS (INSERT INTO {equipment} (character_id, slot, item_id, equipped_at) '
+            f'SELECT %s, %s, %s, %s FROM taken ON CONFLICT (character_id, slot) '
+            f'DO UPDATE SET item_id = excluded.item_id, equipped_at = excluded.equipped_at)'
+        )
+        params = player + [character.pk, new_item.equipment_slot, new_item.pk, now]
+        if old_item:
+            sql += (
+                f', returned AS (INSERT INTO {inventory} (player_id, item_id, quantity, obtained_at) '
+                f'SELECT %s, %s, 1, %s FROM taken ON CONFLICT (player_id, item_id) '
+                f'DO UPDATE SET quantity = {inventory}.quantity + excluded.quantity)'
+            )
+            params += [character.player_id, old_item.pk, now]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql + ' SELECT count(*) FROM taken', params)
+            if not cursor.fetchone()[0]:
+                raise ValueError('Предмет не найден в инвентаре')
+
+    @staticmethod
+    def _unequip_statement(character, slot, old_item):
+        """PostgreSQL: удаление слота и возврат предмета в инвентарь одним запросом"""
+        inventory = connection.ops.quote_name(Inventory._meta.db_table)
+        equipment = connection.ops.quote_name(Equipment._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH removed AS (DELETE FROM {equipment} WHERE character_id = %s AND slot = %s RETURNING item_id) '
+                f'INSERT INTO {inventory} (player_id, item_id, quantity, obtained_at) '
+                f'SELECT %s, item_id, 1, %s FROM removed WHERE item_id = %s ON CONFLICT (player_id, item_id) '
+                f'DO UPDATE SET quantity = {inventory}.quantity + excluded.quantity',
+                [character.pk, slot, character.player_id, timezone.now(), old_item.pk],
+            )
+
+    @staticmethod
+    def equip_item(telegram_id, item_id, slot=None):
+        """
+        Экипировать предмет из инвентаря одной транзакцией.
+
+        Предметы берутся из каталога (без запросов). Запросы: блокировка персонажа
+        вместе с предметом в слоте и количеством в инвентаре; списание из инвентаря,
+        upsert слота и возврат снятого предмета; обновление характеристик.
+        На PostgreSQL средний шаг - один запрос с изменяющими CTE, итого 3 запроса.
+        В SQLite таких CTE нет, там это отдельные запросы: 4 в пустой слот, 5 при замене.
+        Блокировка персонажа не дает двум одновременным нажатиям задублировать
+        или потерять предмет. Возвращает (персонаж, снятый предмет).
+        """
+        new_item = LoadoutService._catalog_item(item_id)
+        if new_item is None:
+            raise ValueError('Предмет не найден в инвентаре')
+
+        with transaction.atomic():
+            character = LoadoutService._lock_character(telegram_id, new_item.equipment_slot, new_item.pk)
+
+            if not character.owned:
+                raise ValueError('Предмет не найден в инвентаре')
+            if not new_item.is_equippable:
+                raise ValueError('Этот предмет нельзя экипировать')
+            if slot and slot != new_item.equipment_slot:
+                raise ValueError('Неверный слот')
+            if character.slot_item_id == new_item.pk:
+                # Предмет уже надет
+                return character, None
+            old_item = LoadoutService._catalog_item(character.slot_item_id)
+
+            if LoadoutService._has_writable_cte():
+                LoadoutService._equip_statement(character, new_item, old_item)
+            else:
+                InventoryService.take_item(character.player_id, new_item.pk, current_quantity=character.owned)
+                Equipment.objects.bulk_create(
+                    [Equipment(character=character, slot=new_item.equipment_slot, item_id=new_item.pk)],
+                    update_conflicts=True,
+                    unique_fields=['character', 'slot'],
+                    update_fields=['item', 'equipped_at'],
+                )
+                if old_item:
+                    InventoryService.add_item(character.player_id, old_item.pk, enforce_stack=False)
+            character.apply_equipment_delta(old_item=old_item, new_item=new_item)
+
+        return character, old_item
+
+    @staticmethod
+    def unequip_item(telegram_id, slot):
+        """
+        Снять предмет из слота и вернуть его в инвентарь одной транзакцией: блокировка
+        персонажа вместе с предметом в слоте, удаление слота и возврат в инвентарь,
+        обновление характеристик. На PostgreSQL удаление и возврат - один запрос
+        (итого 3), в SQLite - два (итого 4). Возвращает (персонаж, снятый предмет).
+        """
+        if slot not in dict(Equipment.SLOTS):
+            raise ValueError('Неверный слот')
+
+        with transaction.atomic():
+            character = LoadoutService._lock_character(telegram_id, slot)
+            old_item = LoadoutService._catalog_item(character.slot_item_id)
+            if old_item is None:
+                return character, None
+
+            if LoadoutService._has_writable_cte():
+                LoadoutService._unequip_statement(character, slot, old_item)
+            else:
+                Equipment.objects.filter(character=character, slot=slot).delete()
+                InventoryService.add_item(character.player_id, old_item.pk, enforce_stack=False)
+            character.apply_equipment_delta(old_item=old_item)
+
+        return character, old_item
@@ -0,0 +1,229 @@
+"""
+Формулы характеристик персонажа и массовый пересчет.
+
+Формула одна и та же для одиночного пересчета (Character.calculate_stats)
+и для массового движка: функция compute_stats работает как с числами,
+так и с массивами NumPy.
+"""
+
+import logging
+import time
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Базовые значения
+BASE_HEALTH = 100
+BASE_MIN_ATTACK = 10
+BASE_MAX_ATTACK = 15
+BASE_DEFENSE = 5
+BASE_CRIT_CHANCE = 5.0
+BASE_DODGE_CHANCE = 5.0
+
+# Уровень навыка, с которого начинаются бонусы
+BASE_SKILL = 5
+
+# Коэффициенты навыков
+HEALTH_PER_VITALITY = 15     # +15 HP за каждый уровень живучести выше 5
+MIN_ATTACK_PER_AGILITY = 2   # +2 к мин атаке за ловкость
+MAX_ATTACK_PER_STRENGTH = 3  # +3 к макс атаке за силу
+DEFENSE_PER_VITALITY = 2     # +2 к защите за живучесть
+CRIT_PER_STRENGTH = 1.5      # +1.5% крита за силу
+DODGE_PER_AGILITY = 1.0      # +1% уворота за ловкость
+
+# Бонусы предметов, которые учитываются в характеристиках
+ITEM_BONUS_FIELDS = [
+    'strength_bonus', 'agility_bonus', 'vitality_bonus',
+    'attack_bonus', 'defense_bonus', 'health_bonus',
+    'crit_chance_bonus', 'dodge_chance_bonus',
+]
+
+# Суммарные бонусы экипировки, хранимые на персонаже
+EQUIPMENT_BONUS_FIELDS = [f'equipment_{field}' for field in ITEM_BONUS_FIELDS]
+
+# Вычисляемые характеристики персонажа
+STAT_FIELDS = ['max_health', 'min_attack', 'max_attack', 'defense', 'crit_chance', 'dodge_chance']
+FLOAT_FIELDS = ['crit_chance', 'dodge_chance'] + [field for field in EQUIPMENT_BONUS_FIELDS if field.endswith('chance_bonus')]
+
+
+def compute_stats(strength, agility, vitality, bonuses):
+    """
+    Расчет характеристик по навыкам и суммарным бонусам экипировки.
+
+    Аргументы могут быть числами или массивами NumPy одинаковой длины,
+    bonuses - словарь {поле бонуса: значение} по ITEM_BONUS_FIELDS.
+    Возвращает словарь {характеристика: значение} по STAT_FIELDS.
+    """
+    # Применяем бонусы экипировки к первичным характеристикам
+    effective_strength = strength + bonuses['strength_bonus']
+    effective_agility = agility + bonuses['agility_bonus']
+    effective_vitality = vitality + bonuses['vitality_bonus']
+
+    return {
+        'max_health': BASE_HEALTH + (effective_vitality - BASE_SKILL) * HEALTH_PER_VITALITY + bonuses['health_bonus'],
+        'min_attack': BASE_MIN_ATTACK + (effective_agility - BASE_SKILL) * MIN_ATTACK_PER_AGILITY + bonuses['attack_bonus'],
+        'max_attack': BASE_MAX_ATTACK + (effective_strength - BASE_SKILL) * MAX_ATTACK_PER_STRENGTH + bonuses['attack_bonus'],
+        'defense': BASE_DEFENSE + (effective_vitality - BASE_SKILL) * DEFENSE_PER_VITALITY + bonuses['defense_bonus'],
+        'crit_chance': BASE_CRIT_CHANCE + (effective_strength - BASE_SKILL) * CRIT_PER_STRENGTH + bonuses['crit_chance_bonus'],
+        'dodge_chance': BASE_DODGE_CHANCE + (effective_agility - BASE_SKILL) * DODGE_PER_AGILITY + bonuses['dodge_chance_bonus'],
+    }
+
+
+def item_bonuses(item):
+    """Бонусы предмета по ITEM_BONUS_FIELDS (нули, если предмета нет)"""
+    return {field: getattr(item, field, 0) if item else 0 for field in ITEM_BONUS_FIELDS}
+
+
+class StatsRecomputeEngine:
+    """
+    Массовый пересчет характеристик всех персонажей.
+
+    Персонажи читаются пачками по первичному ключу, бонусы экипировки
+    суммируются одним агрегирующим запросом на пачку, характеристики
+    считаются векторно, а изменившиеся строки записываются групповыми UPDATE
+    и bulk_update. Заодно сверяются хранимые на персонаже суммы бонусов
+    экипировки, так что движок подходит и для их восстановления.
+    """
+
+    # Поля персонажа, которые пересчитывает движок
+    WRITE_FIELDS = EQUIPMENT_BONUS_FIELDS + STAT_FIELDS + ['current_health']
+
+    def __init__(self, chunk_size=5000, dry_run=False):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+
+    def run(self, queryset=None, on_chunk=None):
+        """
+        Пересчитать характеристики персонажей из queryset (по умолчанию - всех).
+        on_chunk(report) вызывается после каждой пачки.
+        Возвращает итоговый отчет (словарь).
+        """
+        from .models import Character
+
+        if queryset is None:
+            queryset = Character.objects.all()
+
+        report = {'processed': 0, 'updated': 0, 'chunks': 0, 'elapsed': 0.0, 'rows_per_second': 0.0}
+        started = time.perf_counter()
+        last_pk = 0
+
+        while True:
+            rows = list(
+                queryset.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'strength', 'agility', 'vitality', *self.WRITE_FIELDS)[:self.chunk_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+
+            updated = self._process_chunk(rows)
+
+            report['chunks'] += 1
+            report['processed'] += len(rows)
+            report['updated'] += updated
+            report['elapsed'] = time.perf_counter() - started
+            report['rows_per_second'] = report['processed'] / report['elapsed'] if report['elapsed'] else 0.0
+            if on_chunk:
+                on_chunk(dict(report))
+
+        report['elapsed'] = time.perf_counter() - started
+        report['rows_per_second'] = report['processed'] / report['elapsed'] if report['elapsed'] else 0.0
+        logger.info(
+            f"Stats recompute finished: {report['processed']} processed, {report['updated']} updated, "
+            f"{report['rows_per_second']:.0f} rows/s"
+        )
+        return report
+
+    def run_for_items(self, items, on_chunk=None):
+        """
+        Пересчитать персонажей, на которых надеты предметы items (queryset или список id).
+        Нужен после изменения бонусов надетых предметов: суммы на персонаже
+        накоплены из прежних бонусов, и снятие предмета вычло бы уже новые.
+        """
+        from .models import Character, Equipment
+
+        wearers = Equipment.objects.filter(item__in=items).values('character_id')
+        return self.run(Character.objects.filter(pk__in=wearers), on_chunk=on_chunk)
+
+    def load_bonuses(self, ids):
+        """Суммарные бонусы экипировки для отсортированного массива id персонажей"""
+        from .models import Equipment
+
+        bonuses = {
+            field: np.zeros(len(ids), dtype=np.float64 if field.endswith('chance_bonus') else np.int64)
+            for field in ITEM_BONUS_FIELDS
+        }
+        rows = (
+            Equipment.objects.filter(character_id__in=ids.tolist(), item__isnull=False)
+            .values('character_id')
+            .annotate(**{field: Sum(f'item__{field}') for field in ITEM_BONUS_FIELDS})
+            .order_by()
+        )
+        rows = list(rows)
+        if rows:
+            positions = np.searchsorted(ids, [row['character_id'] for row in rows])
+            for field in ITEM_BONUS_FIELDS:
+                bonuses[field][positions] = [row[field] or 0 for row in rows]
+        return bonuses
+
+    def _process_chunk(self, rows):
+        from .models import Character
+
+        columns = np.array(rows, dtype=np.float64).T
+        ids = columns[0].astype(np.int64)
+        strength, agility, vitality = columns[1:4]
+        current = dict(zip(self.WRITE_FIELDS, columns[4:]))
+        current_health = current['current_health']
+
+        bonuses = self.load_bonuses(ids)
+        computed = {f'equipment_{field}': value for field, value in bonuses.items()}
+        computed.update(compute_stats(strength, agility, vitality, bonuses))
+        # Полное здоровье остается полным, иначе только ограничиваем новым максимумом
+        computed['current_health'] = np.where(
+            current_health >= current['max_health'],
+            computed['max_health'],
+            np.minimum(current_health, computed['max_health']),
+        )
+
+        # Записываем только персонажей, у которых что-то изменилось
+        changed = np.zeros(len(ids), dtype=bool)
+        for field in self.WRITE_FIELDS:
+            changed |= ~np.isclose(computed[field], current[field])
+        if not changed.any() or self.dry_run:
+            return int(changed.sum())
+
+        # Строки с одинаковым набором значений (одинаковые навыки и экипировка)
+        # обновляются одним UPDATE ... WHERE id IN (...), остальные - через bulk_update
+        matrix = np.column_stack([
+            computed[field][changed] if field in FLOAT_FIELDS else np.rint(computed[field][changed])
+            for field in self.WRITE_FIELDS
+        ])
+        groups, inverse, counts = np.unique(matrix, axis=0, return_inverse=True, return_counts=True)
+        changed_ids = ids[changed]
+        # id каждой группы - один срез после сортировки по номеру группы
+        grouped_ids = np.split(changed_ids[np.argsort(inverse.reshape(-1), kind='stable')], np.cumsum(counts)[:-1])
+
+        # update() и bulk_update не проставляют auto_now, поэтому updated_at пишем сами
+        now = timezone.now()
+        singles = []
+        with transaction.atomic():
+            for row, group_ids in zip(groups, grouped_ids):
+                values = self._row_values(row)
+                if len(group_ids) > 1:
+                    Character.objects.filter(pk__in=group_ids.tolist()).update(updated_at=now, **values)
+                else:
+                    singles.append(Character(pk=int(group_ids[0]), updated_at=now, **values))
+            if singles:
+                Character.objects.bulk_update(singles, self.WRITE_FIELDS + ['updated_at'], batch_size=250)
+        return len(changed_ids)
+
+    def _row_values(self, row):
+        return {
+            field: float(value) if field in FLOAT_FIELDS else int(value)
+            for field, value in zip(self.WRITE_FIELDS, row.tolist())
+        }
@@ -1,3 +1,244 @@
+import random
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db.models.signals import post_save
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import Player
+from core.testing import QueryBudgetMixin
+from items.models import Inventory, Item
+from items.services import InventoryService
+from .models import Character, Equipment
+from .services import LoadoutService
+from .stats import EQUIPMENT_BONUS_FIELDS, STAT_FIELDS, StatsRecomputeEngine
+
+
+class EquipmentBonusesTests(TestCase):
+    """Суммы бонусов экипировки на персонаже после изменения и удаления надетого предмета"""
+
+    def setUp(self):
+        self.player = Player.objects.create(telegram_id=500, first_name='Игрок')
+        self.character = Character.objects.create(player=self.player, name='Герой', strength=10)
+        self.base_stats = self.stats()
+        self.sword = Item.objects.create(
+            name='Меч', item_type='weapon', equipment_slot='weapon', rarity='blue', attack_bonus=5,
+        )
+        InventoryService.add_item(self.player.id, self.sword.id)
+        LoadoutService.equip_item(self.player.telegram_id, self.sword.id)
+
+    def stats(self):
+        character = Character.objects.get(pk=self.character.pk)
+        return character.equipment_attack_bonus, character.min_attack, character.max_attack
+
+    def test_edited_item_updates_wearer(self):
+        self.assertEqual(self.stats(), (5, self.base_stats[1] + 5, self.base_stats[2] + 5))
+        self.sword.attack_bonus = 50
+        self.sword.save()
+        self.assertEqual(self.stats(), (50, self.base_stats[1] + 50, self.base_stats[2] + 50))
+
+    def test_unequip_after_item_edit(self):
+        self.sword.attack_bonus = 50
+        self.sword.save()
+        LoadoutService.unequip_item(self.player.telegram_id, 'weapon')
+        self.assertEqual(self.stats(), self.base_stats)
+
+    def test_deleted_item_removes_bonuses(self):
+        self.sword.delete()
+        self.assertIsNone(Equipment.objects.get(character=self.character, slot='weapon').item_id)
+        self.assertEqual(self.stats(), self.base_stats)
+
+
+class CharacterSaveTests(TestCase):
+    """Сохранение персонажа записывает только измененные поля"""
+
+    def setUp(self):
+        self.player = Player.objects.create(telegram_id=520, first_name='Игрок')
+        Character.objects.create(player=self.player, name='Герой')
+        self.character = Character.objects.get(player=self.player)
+        self.saved = []
+        post_save.connect(self.on_save, sender=Character)
+        self.addCleanup(post_save.disconnect, self.on_save, sender=Character)
+
+    def on_save(self, sender, update_fields, **kwargs):
+        self.saved.append(set(update_fields) if update_fields is not None else None)
+
+    def test_single_field(self):
+        self.character.name = 'Новое имя'
+        with self.assertNumQueries(1):
+            self.character.save()
+        self.assertEqual(self.saved, [{'name', 'updated_at'}])
+
+    def test_skill_change_adds_stats(self):
+        self.character.strength += 1
+        self.character.save()
+        self.assertEqual(self.saved, [{'strength', 'max_attack', 'crit_chance', 'updated_at'}])
+
+    def test_noop_save(self):
+        updated_at = self.character.updated_at
+        with self.assertNumQueries(0):
+            self.character.save()
+        self.assertEqual(self.saved, [])
+        self.assertEqual(Character.objects.get(pk=self.character.pk).updated_at, updated_at)
+
+    def test_health_after_recalculation(self):
+        # Полное здоровье растет вместе с максимумом
+        self.character.vitality += 2
+        self.character.save()
+        self.assertEqual(self.character.current_health, self.character.max_health)
+
+        # Раненый персонаж сохраняет текущее здоровье
+        self.character.current_health = 40
+        self.character.vitality += 2
+        self.character.save()
+        character = Character.objects.get(pk=self.character.pk)
+        self.assertEqual(character.current_health, 40)
+        self.assertGreater(character.max_health, 40)
+
+        # Текущее здоровье не может превышать новый максимум
+        character.current_health = character.max_health - 1
+        character.vitality = 1
+        character.save()
+        self.assertEqual(Character.objects.get(pk=character.pk).current_health, character.max_health)
+
+
+class LoadoutQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Запросы экипировки: SAVEPOINT и RELEASE транзакции внутри теста - еще 2"""
+
+    # (в пустой слот, замена, снятие): на PostgreSQL с изменяющими CTE, в SQLite - без них
+    STATEMENTS = (3, 3, 3) if connection.vendor == 'postgresql' else (4, 5, 4)
+
+    def setUp(self):
+        super().setUp()
+        self.player = Player.objects.create(telegram_id=510, first_name='Игрок')
+        self.character = Character.objects.create(player=self.player, name='Герой')
+        self.swords = [
+            Item.objects.create(name=f'Меч {index}', item_type='weapon', equipment_slot='weapon', attack_bonus=index + 1)
+            for index in range(2)
+        ]
+        InventoryService.add_items(self.player.id, {sword.id: 1 for sword in self.swords})
+
+    @contextmanager
+    def assertStatements(self, count):
+        with self.assertQueryBudget(count + 2) as context:
+            yield
+        self.assertEqual(len(context.captured_queries), count + 2)
+
+    def inventory(self):
+        return dict(Inventory.objects.filter(player=self.player).values_list('item_id', 'quantity'))
+
+    def test_equip_swap_unequip(self):
+        empty_slot, swap, unequip = self.STATEMENTS
+        with self.assertStatements(empty_slot):
+            _, old_item = LoadoutService.equip_item(self.player.telegram_id, self.swords[0].id)
+        self.assertIsNone(old_item)
+        self.assertEqual(self.inventory(), {self.swords[1].id: 1})
+
+        with self.assertStatements(swap):
+            character, old_item = LoadoutService.equip_item(self.player.telegram_id, self.swords[1].id)
+        self.assertEqual(old_item.pk, self.swords[0].pk)
+        self.assertEqual(character.equipment_attack_bonus, 2)
+        self.assertEqual(self.inventory(), {self.swords[0].id: 1})
+        self.assertEqual(Equipment.objects.get(character=self.character, slot='weapon').item_id, self.swords[1].id)
+
+        with self.assertStatements(unequip):
+            character, old_item = LoadoutService.unequip_item(self.player.telegram_id, 'weapon')
+        self.assertEqual(old_item.pk, self.swords[1].pk)
+        self.assertEqual(character.equipment_attack_bonus, 0)
+        self.assertEqual(self.inventory(), {sword.id: 1 for sword in self.swords})
+        self.assertFalse(Equipment.objects.filter(character=self.character).exists())
+
+    def test_equip_from_stack(self):
+        rings = [
+            Item.objects.create(name=f'Кольцо {index}', item_type='misc', equipment_slot='accessory',
+                                stackable=True, max_stack=10, dodge_chance_bonus=1.0)
+            for index in range(2)
+        ]
+        InventoryService.add_items(self.player.id, {rings[0].id: 3, rings[1].id: 2})
+
+        LoadoutService.equip_item(self.player.telegram_id, rings[0].id)
+        self.assertEqual(self.inventory()[rings[0].id], 2)
+        # Снятое кольцо возвращается в существующую стопку
+        LoadoutService.equip_item(self.player.telegram_id, rings[1].id)
+        self.assertEqual(self.inventory()[rings[0].id], 3)
+        self.assertEqual(self.inventory()[rings[1].id], 1)
+
+    def test_equip_errors(self):
+        potion = Item.objects.create(name='Зелье', item_type='consumable', stackable=True, max_stack=5)
+        InventoryService.add_item(self.player.id, potion.id)
+        cases = [
+            (self.swords[0].id + 1000, None, 'Предмет не найден в инвентаре'),
+            ('abc', None, 'Предмет не найден в инвентаре'),
+            (potion.id, None, 'Этот предмет нельзя экипировать'),
+            (self.swords[0].id, 'head', 'Неверный слот'),
+        ]
+        for item_id, slot, message in cases:
+            with self.assertRaisesMessage(ValueError, message):
+                LoadoutService.equip_item(self.player.telegram_id, item_id, slot)
+        with self.assertRaisesMessage(ValueError, 'Персонаж не найден'):
+            LoadoutService.equip_item(1, self.swords[0].id)
+
+
+class StatsRecomputeEngineTests(TestCase):
+    """Массовый пересчет дает те же значения, что и Character.calculate_stats"""
+
+    def setUp(self):
+        rng = random.Random(7)
+        slots = [slot for slot, _ in Equipment.SLOTS]
+        items = [
+            Item.objects.create(
+                name=f'Предмет {index}', item_type='misc', equipment_slot=slots[index % len(slots)],
+                strength_bonus=rng.randint(0, 3), agility_bonus=rng.randint(0, 3), vitality_bonus=rng.randint(0, 3),
+                attack_bonus=rng.randint(0, 5), defense_bonus=rng.randint(0, 5), health_bonus=rng.randint(0, 20),
+                crit_chance_bonus=rng.choice([0.0, 0.5, 1.5]), dodge_chance_bonus=rng.choice([0.0, 1.0, 2.5]),
+            )
+            for index in range(20)
+        ]
+        by_slot = {slot: [item for item in items if item.equipment_slot == slot] for slot in slots}
+        for index in range(40):
+            player = Player.objects.create(telegram_id=600 + index, first_name=f'Игрок {index}')
+            # Половина персонажей одинаковые и без экипировки - они попадут в групповой UPDATE
+            skills = (5, 5, 5) if index % 2 else (rng.randint(5, 15), rng.randint(5, 15), rng.randint(5, 15))
+            character = Character.objects.create(
+                player=player, name=f'Герой {index}', strength=skills[0], agility=skills[1], vitality=skills[2],
+            )
+            if not index % 2:
+                for slot in rng.sample(slots, 3):
+                    Equipment.objects.create(character=character, slot=slot, item=rng.choice(by_slot[slot]))
+            if index % 4 == 0:
+                Character.objects.filter(pk=character.pk).update(current_health=rng.randint(1, 50))
+
+        # Портим хранимые суммы и характеристики, здоровье оставляем как есть
+        self.expected = {}
+        for character in Character.objects.all():
+            character.calculate_stats()
+            self.expected[character.pk] = self.values(character)
+        Character.objects.update(
+            min_attack=0, defense=0, crit_chance=0.0, **{field: 0 for field in EQUIPMENT_BONUS_FIELDS},
+        )
+
+    def values(self, character):
+        return [getattr(character, field) for field in StatsRecomputeEngine.WRITE_FIELDS]
+
+    def test_matches_calculate_stats(self):
+        before = timezone.now()
+        report = StatsRecomputeEngine(chunk_size=7).run()
+
+        self.assertEqual((report['processed'], report['updated'], report['chunks']), (40, 40, 6))
+        characters = list(Character.objects.all())
+        for character in characters:
+            self.assertEqual(self.values(character), self.expected[character.pk], character.name)
+            self.assertGreaterEqual(character.updated_at, before)
+        # Раненые остаются ранеными, остальные - с полным здоровьем
+        damaged = [character for character in characters if character.current_health < character.max_health]
+        self.assertEqual(len(damaged), 10)
+
+        self.assertEqual(StatsRecomputeEngine().run()['updated'], 0)
 
-# Create your tests here.
+    def test_single_character_matches_engine(self):
+        StatsRecomputeEngine().run()
+        for character in Character.objects.all():
+            stored = [getattr(character, field) for field in STAT_FIELDS + ['current_health']]
+            character.calculate_stats()
+            self.assertEqual([getattr(character, field) for field in STAT_FIELDS + ['current_health']], stored)
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .game_settings import game_settings
+        from .models import GameSettings
+
+        def invalidate_game_settings(sender, **kwargs):
+            game_settings.invalidate()
+
+        post_save.connect(invalidate_game_settings, sender=GameSettings, weak=False, dispatch_uid='core.game_settings')
+        post_delete.connect(invalidate_game_settings, sender=GameSettings, weak=False, dispatch_uid='core.game_settings')
@@ -0,0 +1,111 @@
+"""
+Буферы отложенной записи в базу.
+
+LastSeenBuffer копит в памяти время последнего визита игроков, а фоновый
+поток раз в interval секунд записывает его пачкой: сколько бы раз игрок ни
+открыл страницу или бота за интервал, в базу уходит одно значение, а на
+каждые batch_size игроков - один UPDATE ... CASE. Запрос игрока запись не
+ждет. Буфер свой у каждого процесса; при остановке процесса остаток
+записывается (atexit), после падения теряется не больше одного интервала.
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+from django.db import close_old_connections, connections
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LastSeenBuffer:
+    """Отложенная запись отметок времени (например, PlayerProfile.last_login)"""
+
+    def __init__(self, model, field, key='pk', interval=60.0, batch_size=1000):
+        self.model = model
+        self.field = field
+        self.key = key
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        atexit.register(self.stop)
+
+    def touch(self, key, when=None):
+        """Отметить визит без запросов к базе; записывает фоновый поток раз в interval секунд"""
+        with self._cond:
+            self._pending[key] = when or timezone.now()
+        self._ensure_thread()
+
+    def get(self, key, default=None):
+        """Еще не записанная отметка (или default)"""
+        return self._pending.get(key, default)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Записать накопленные отметки; возвращает количество обновленных строк"""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        updated = 0
+        items = list(pending.items())
+        try:
+            for start in range(0, len(items), self.batch_size):
+                chunk = items[start:start + self.batch_size]
+                updated += self.model.objects.filter(**{f'{self.key}__in': [key for key, _ in chunk]}).update(**{
+                    self.field: Case(
+                        *(When(**{self.key: key}, then=Value(when)) for key, when in chunk),
+                        output_field=self.model._meta.get_field(self.field),
+                    )
+                })
+        except Exception as e:
+            # Отметки не критичны: вернуть в буфер (не затирая более свежие) и повторить позже
+            with self._cond:
+                for key, when in pending.items():
+                    self._pending.setdefault(key, when)
+            logger.error(f"Last-seen flush failed for {self.model.__name__}.{self.field}: {e}")
+        return updated
+
+    def stop(self):
+        """Остановить фоновый поток и записать остаток"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def _ensure_thread(self):
+        # Поток запускается при первой отметке в каждом процессе (в том числе после fork воркера)
+        if self._pid == os.getpid() or self._stopping:
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='last-seen-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopping, timeout=self.interval)
+                    stopping = self._stopping
+                close_old_connections()
+                self.flush()
+                if stopping:
+                    return
+        finally:
+            connections.close_all()
@@ -0,0 +1,77 @@
+"""
+Настройки игры (GameSettings) с типизированными значениями.
+
+Все активные настройки читаются одним запросом и разбираются по
+value_type; чтение game_settings.get(key) - обращение к словарю. Набор
+перечитывается, когда меняется версия 'game_settings' (core.versioning):
+при сохранении или удалении GameSettings через ORM. После массовых
+изменений queryset.update() нужно вызвать game_settings.invalidate().
+"""
+
+import json
+import logging
+
+from django.conf import settings
+
+from .versioning import VersionedCache
+
+logger = logging.getLogger(__name__)
+
+TRUE_VALUES = {'1', 'true', 'yes', 'on', 'да'}
+FALSE_VALUES = {'0', 'false', 'no', 'off', 'нет', ''}
+
+
+def parse_value(value, value_type):
+    """Значение настройки по ее типу; ValueError, если значение не соответствует типу"""
+    if value_type == 'int':
+        return int(value)
+    if value_type == 'float':
+        return float(value)
+    if value_type == 'bool':
+        normalized = value.strip().lower()
+        if normalized in TRUE_VALUES:
+            return True
+        if normalized in FALSE_VALUES:
+            return False
+        raise ValueError(f"Не логическое значение: {value!r}")
+    if value_type == 'json':
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Некорректный JSON: {e}")
+    return value
+
+
+class GameSettingsRegistry(VersionedCache):
+    """Активные настройки игры: {ключ: значение нужного типа}"""
+
+    def load(self):
+        from .models import GameSettings
+
+        values = {}
+        errors = {}
+        for key, value, value_type in GameSettings.objects.filter(is_active=True).values_list('key', 'value', 'value_type'):
+            try:
+                values[key] = parse_value(value, value_type)
+            except ValueError as e:
+                errors[key] = f"Настройка {key} ({value_type}): {e}"
+                logger.error(errors[key])
+        return values, errors
+
+    def get(self, key, default=None):
+        """Значение настройки или default; ValueError, если значение в базе некорректно"""
+        values, errors = self.data
+        if key in errors:
+            raise ValueError(errors[key])
+        return values.get(key, default)
+
+    def __contains__(self, key):
+        values, errors = self.data
+        return key in values or key in errors
+
+    def as_dict(self):
+        """Все корректные настройки"""
+        return dict(self.data[0])
+
+
+game_settings = GameSettingsRegistry('game_settings', check_interval=settings.CACHE_VERSION_CHECK_INTERVAL)
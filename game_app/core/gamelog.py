@@ -0,0 +1,190 @@
+"""
+Буферизованная запись игровых логов (core.models.GameLog).
+
+write() только кладет запись в очередь процесса, без запросов к базе.
+Фоновый поток записывает очередь через bulk_create, когда в ней
+набирается batch_size записей или раз в interval секунд; при остановке
+процесса остаток записывается (atexit). Очередь ограничена max_queue
+записями: при переполнении новые записи отбрасываются и считаются в
+метрике gamelog_records_total{result="dropped"} (/metrics).
+
+GameLogHandler подключает ту же очередь к модулю logging (settings.LOGGING).
+"""
+
+import atexit
+import collections
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+records_total = registry.counter(
+    'gamelog_records_total', 'Записи GameLog: записано, отброшено при переполнении, ошибка записи', ['result'],
+)
+queue_size = registry.gauge('gamelog_queue_size', 'Записей GameLog в очереди')
+
+# Уровни logging -> GameLog.level
+LOGGING_LEVELS = (
+    (logging.ERROR, 'error'),
+    (logging.WARNING, 'warning'),
+    (logging.INFO, 'info'),
+    (0, 'debug'),
+)
+
+
+class GameLogWriter:
+    """Очередь записей GameLog с фоновой записью пачками"""
+
+    def __init__(self, max_queue=10000, batch_size=500, interval=5.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        atexit.register(self.stop)
+
+    def write(self, level, message, source, player_id=None, character_id=None, ip_address=None, user_agent=''):
+        """Поставить запись в очередь; False - очередь переполнена, запись отброшена"""
+        record = {
+            'level': level,
+            'message': message,
+            'source': source[:100],
+            'player_id': player_id,
+            'character_id': character_id,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'created_at': timezone.now(),
+        }
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                records_total.inc(result='dropped')
+                return False
+            self._queue.append(record)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_thread()
+        return True
+
+    def __len__(self):
+        return len(self._queue)
+
+    def flush(self):
+        """Записать все записи из очереди; возвращает количество записанных"""
+        from .models import GameLog
+
+        written = 0
+        while True:
+            with self._cond:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                queue_size.set(len(self._queue))
+            if not batch:
+                return written
+            try:
+                GameLog.objects.bulk_create([GameLog(**record) for record in batch])
+            except Exception as e:
+                # Логи не повторяются: запись, которая не проходит в базу, зациклила бы очередь
+                records_total.inc(len(batch), result='failed')
+                logger.error(f"GameLog flush failed, {len(batch)} records lost: {e}")
+                return written
+            records_total.inc(len(batch), result='written')
+            written += len(batch)
+
+    def stop(self):
+        """Остановить фоновый поток и записать остаток очереди"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def _ensure_thread(self):
+        # Поток запускается при первой записи в каждом процессе (в том числе после fork воркера)
+        if self._pid == os.getpid() or self._stopping:
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='gamelog-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: self._stopping or len(self._queue) >= self.batch_size, timeout=self.interval,
+                    )
+                    stopping = self._stopping
+                # Соединение потока проверяется здесь, а не во flush: flush вызывают и из основного потока
+                close_old_connections()
+                self.flush()
+                if stopping:
+                    return
+        finally:
+            connections.close_all()
+
+
+writer = GameLogWriter(
+    max_queue=settings.GAMELOG_QUEUE_SIZE,
+    batch_size=settings.GAMELOG_BATCH_SIZE,
+    interval=settings.GAMELOG_FLUSH_INTERVAL,
+)
+
+
+def log_event(level, message, source, player=None, character=None, request=None):
+    """Игровое событие в GameLog (через очередь writer)"""
+    return writer.write(
+        level, message, source,
+        player_id=getattr(player, 'pk', player),
+        character_id=getattr(character, 'pk', character),
+        **request_meta(request),
+    )
+
+
+def request_meta(request):
+    # У записей django.server в record.request сокет, а не HttpRequest
+    meta = getattr(request, 'META', None)
+    if meta is None:
+        return {}
+    return {
+        'ip_address': meta.get('REMOTE_ADDR') or None,
+        'user_agent': meta.get('HTTP_USER_AGENT', ''),
+    }
+
+
+class GameLogHandler(logging.Handler):
+    """
+    Обработчик logging, пишущий записи в GameLog через очередь writer.
+    Игрок, персонаж и запрос передаются через extra:
+    logger.warning('...', extra={'player_id': ..., 'character_id': ..., 'request': request}).
+    """
+
+    # Свои ошибки записи и SQL самой записи в GameLog не пишутся, иначе запись зациклится
+    IGNORED_LOGGERS = (__name__, 'django.db.backends')
+
+    def emit(self, record):
+        if record.name.startswith(self.IGNORED_LOGGERS):
+            return
+        try:
+            level = next(name for levelno, name in LOGGING_LEVELS if record.levelno >= levelno)
+            writer.write(
+                level, self.format(record), record.name,
+                player_id=getattr(record, 'player_id', None),
+                character_id=getattr(record, 'character_id', None),
+                **request_meta(getattr(record, 'request', None)),
+            )
+        except Exception:
+            self.handleError(record)
@@ -0,0 +1,166 @@
+"""
+Метрики процесса в формате Prometheus.
+
+Счетчики и гистограммы хранятся в памяти процесса (у каждого воркера
+свои) и отдаются текстом по /metrics (core.views.metrics). Кроме метрик
+реестра можно зарегистрировать сборщик - функцию, которая при выдаче
+возвращает строки в формате Prometheus (так экспортируются метрики бота).
+"""
+
+import threading
+
+# Границы гистограмм времени, секунды
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Границы гистограмм количества (например, SQL-запросов на запрос)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def histogram_lines(name, labels, buckets, counts, total, count):
+    """Строки гистограммы: накопленные интервалы, сумма и количество"""
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip([*buckets, float('inf')], counts):
+        cumulative += bucket_count
+        lines.append(f'{name}_bucket{format_labels([*labels, ("le", format_value(bound))])} {cumulative}')
+    lines.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+    lines.append(f'{name}_count{format_labels(labels)} {count}')
+    return lines
+
+
+class Metric:
+    """Метрика с метками; значения по кортежу значений меток"""
+
+    type = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метки {self.name}: ожидаются {self.labelnames}, переданы {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values):
+            lines.extend(self._render_value(list(zip(self.labelnames, key)), value))
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_value(self, labels, value):
+        return [f'{self.name}{format_labels(labels)} {format_value(value)}']
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _render_value(self, labels, value):
+        return [f'{self.name}{format_labels(labels)} {format_value(value)}']
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _render_value(self, labels, value):
+        counts, total, count = value
+        return histogram_lines(self.name, labels, self.buckets, counts, total, count)
+
+
+class Registry:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Зарегистрировать метрику; метрика с тем же именем уже есть - вернуть ее"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, description, labelnames=()):
+        return self.register(Counter(name, description, labelnames))
+
+    def gauge(self, name, description, labelnames=()):
+        return self.register(Gauge(name, description, labelnames))
+
+    def histogram(self, name, description, labelnames=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(name, description, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """collector() возвращает строки Prometheus при каждой выдаче метрик"""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,176 @@
+"""
+Профилирование запросов.
+
+ProfilingMiddleware для каждого запроса измеряет общее время, количество
+и время SQL-запросов и время рендера шаблонов:
+- в ответ добавляется заголовок Server-Timing (видно во вкладке Network браузера);
+- значения попадают в гистограммы core.metrics по имени URL (view_name), /metrics;
+- медленные запросы (PROFILING_SLOW_REQUEST_MS) с вероятностью
+  PROFILING_SLOW_SAMPLE_RATE пишутся в лог вместе со списком SQL.
+
+SQL считается обработчиком execute_wrapper, который ставится на каждое
+соединение с базой; профиль текущего запроса хранится в contextvar и
+доступен и в потоках sync_to_async.
+"""
+
+import contextvars
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+
+from .metrics import COUNT_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+# Сколько SQL-запросов сохранять для лога медленного запроса
+MAX_RECORDED_QUERIES = 200
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Время обработки запроса', ['view'],
+)
+request_queries = registry.histogram(
+    'http_request_db_queries', 'SQL-запросов на запрос', ['view'], buckets=COUNT_BUCKETS,
+)
+request_db_time = registry.histogram(
+    'http_request_db_seconds', 'Время SQL на запрос', ['view'],
+)
+request_template_time = registry.histogram(
+    'http_request_template_seconds', 'Время рендера шаблонов на запрос', ['view'],
+)
+requests_total = registry.counter(
+    'http_requests_total', 'Обработано запросов', ['view', 'status'],
+)
+
+current_profile = contextvars.ContextVar('current_profile', default=None)
+
+
+class RequestProfile:
+    """Замеры одного запроса"""
+
+    __slots__ = ('started', 'queries', 'db_time', 'template_time', 'sql')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.sql = []
+
+    def record_query(self, sql, seconds):
+        self.queries += 1
+        self.db_time += seconds
+        if len(self.sql) < MAX_RECORDED_QUERIES:
+            self.sql.append((sql, seconds))
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper: время каждого SQL-запроса в профиль текущего запроса"""
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder, dispatch_uid='core.profiling.query_recorder')
+
+_template_render = Template.render
+
+
+def _profiled_template_render(self, context=None, request=None):
+    profile = current_profile.get()
+    if profile is None:
+        return _template_render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _template_render(self, context, request)
+    finally:
+        profile.template_time += time.perf_counter() - started
+
+
+# render() верхнего уровня: шаблоны из {% include %} и {% extends %} учтены во времени родителя
+Template.render = _profiled_template_render
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = settings.PROFILING_SLOW_REQUEST_MS / 1000
+        self.slow_sample_rate = settings.PROFILING_SLOW_SAMPLE_RATE
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Соединения, открытые до загрузки middleware (например, в тестах)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        self.finish(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        self.finish(request, response, profile)
+        return response
+
+    def finish(self, request, response, profile):
+        duration = time.perf_counter() - profile.started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={duration * 1000:.1f}',
+            f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"',
+            f'tpl;dur={profile.template_time * 1000:.1f}',
+        ])
+
+        request_duration.observe(duration, view=view)
+        request_queries.observe(profile.queries, view=view)
+        request_db_time.observe(profile.db_time, view=view)
+        request_template_time.observe(profile.template_time, view=view)
+        requests_total.inc(view=view, status=response.status_code)
+
+        if duration >= self.slow_seconds and random.random() < self.slow_sample_rate:
+            self.log_slow_request(request, response, profile, view, duration)
+
+    def log_slow_request(self, request, response, profile, view, duration):
+        listing = '\n'.join(
+            f'{index}. [{seconds * 1000:.1f} ms] {sql}'
+            for index, (sql, seconds) in enumerate(profile.sql, 1)
+        )
+        if profile.queries > len(profile.sql):
+            listing += f'\n... еще {profile.queries - len(profile.sql)} запросов'
+        logger.warning(
+            f"Медленный запрос {request.method} {request.path} ({view}) -> {response.status_code}: "
+            f"{duration * 1000:.0f} ms, SQL {profile.queries} за {profile.db_time * 1000:.0f} ms, "
+            f"шаблоны {profile.template_time * 1000:.0f} ms\n{listing}"
+        )
@@ -37,6 +37,21 @@ class GameSettings(BaseModel):
         return f"{self.key}: {self.value}"
 
 
+class CacheVersion(models.Model):
+    """Версия данных, закэшированных в памяти процессов (core.versioning)"""
+
+    name = models.CharField(max_length=100, unique=True, verbose_name="Кэш")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Версия")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Версия кэша"
+        verbose_name_plural = "Версии кэшей"
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
+
+
 class GameLog(BaseModel):
     """Логи игровых событий"""
 
@@ -0,0 +1,188 @@
+"""
+Секционирование GameLog по месяцам (только PostgreSQL).
+
+После convert() таблица core_gamelog секционирована по created_at:
+- core_gamelog_legacy - прежняя таблица целиком, все строки до начала следующего месяца;
+- core_gamelog_pYYYYMM - месячные секции (UTC), создаются заранее ensure_partitions();
+- core_gamelog_default - строки вне созданных секций (не должна заполняться).
+
+Устаревшая секция удаляется целиком (DETACH + DROP) вместо DELETE миллионов
+строк: без долгих блокировок, раздувания индексов и работы VACUUM.
+На SQLite секций нет, старые строки удаляются пачками (GameLogService.prune).
+"""
+
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import GameLog
+
+TABLE = GameLog._meta.db_table
+LEGACY_TABLE = f'{TABLE}_legacy'
+DEFAULT_PARTITION = f'{TABLE}_default'
+SEQUENCE = f'{TABLE}_id_seq'
+ID_INDEX = f'{TABLE}_id_idx'
+LEGACY_CHECK = f'{TABLE}_legacy_bound'
+
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def month_start(moment, months=0):
+    """Начало месяца (UTC), смещенного на months от месяца moment"""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(start):
+    return f'{TABLE}_p{start:%Y%m}'
+
+
+def is_partitioned():
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """Секции: [(имя, верхняя граница или None для DEFAULT и MAXVALUE)] по возрастанию границы"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND p.relnamespace = current_schema()::regnamespace",
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = _UPPER_BOUND.search(bound)
+        partitions.append((name, datetime.fromisoformat(match.group(1)) if match else None))
+    return sorted(partitions, key=lambda item: (item[1] is None, item[1] or 0))
+
+
+def ensure_partitions(months_ahead=2, now=None):
+    """Создать секции текущего и months_ahead следующих месяцев; возвращает созданные"""
+    now = now or datetime.now(dt_timezone.utc)
+    partitions = dict(list_partitions())
+    legacy_end = partitions.get(LEGACY_TABLE)
+    created = []
+    with connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            start, end = month_start(now, offset), month_start(now, offset + 1)
+            name = partition_name(start)
+            if name in partitions or (legacy_end and end <= legacy_end):
+                continue
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+            created.append(name)
+    return created
+
+
+def partition_rows(name, chunk_size=2000):
+    """
+    Строки одной секции словарями по столбцам, по возрастанию id.
+    Читается сама секция: строки DEFAULT из того же диапазона дат в выборку не попадают.
+    """
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(f'SELECT * FROM "{name}" ORDER BY id')
+        # У серверного курсора описание столбцов появляется после первой выборки
+        rows = cursor.fetchmany(chunk_size)
+        columns = [column[0] for column in cursor.description]
+        while rows:
+            for row in rows:
+                yield dict(zip(columns, row))
+            rows = cursor.fetchmany(chunk_size)
+
+
+def drop_partition(name):
+    """Отсоединить и удалить секцию (блокировка родительской таблицы - на время DETACH)"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+        cursor.execute(f'DROP TABLE "{name}"')
+
+
+def expired_partitions(cutoff):
+    """Секции, все строки которых старше cutoff"""
+    return [
+        (name, upper) for name, upper in list_partitions()
+        if upper is not None and name != DEFAULT_PARTITION and upper <= cutoff
+    ]
+
+
+def convert(months_ahead=2):
+    """
+    Однократно перевести core_gamelog в секционированную таблицу без копирования строк:
+    прежняя таблица становится секцией core_gamelog_legacy.
+
+    Долгие операции (индекс по id, проверка границы) выполняются до
+    переименования и не блокируют запись; сама замена таблицы - только
+    изменения каталога под короткой эксклюзивной блокировкой.
+    """
+    boundary = month_start(datetime.now(dt_timezone.utc), 1)
+
+    with connection.cursor() as cursor:
+        # Индекс, которым станет индекс секции по id (у секционированной таблицы нет PK по одному id)
+        cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{ID_INDEX}" ON "{TABLE}" (id)')
+        # Проверенное ограничение позволяет ATTACH PARTITION не сканировать таблицу
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{LEGACY_CHECK}" CHECK (created_at < %s) NOT VALID',
+            [boundary],
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" VALIDATE CONSTRAINT "{LEGACY_CHECK}"')
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND schemaname = current_schema()",
+            [TABLE],
+        )
+        indexes = [(name, definition) for name, definition in cursor.fetchall() if 'UNIQUE' not in definition]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM "{TABLE}"')
+        next_id = cursor.fetchone()[0]
+
+        # Прежняя таблица с переименованными индексами и ключами освобождает имена для новой
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY_TABLE}"')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{name[:56]}_legacy"')
+        for name, _ in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{LEGACY_TABLE}" RENAME CONSTRAINT "{name}" TO "{name[:56]}_legacy"')
+        cursor.execute(f'ALTER TABLE "{LEGACY_TABLE}" ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(f'ALTER TABLE "{LEGACY_TABLE}" ALTER COLUMN id DROP DEFAULT')
+        cursor.execute(f'DROP SEQUENCE IF EXISTS "{SEQUENCE}"')
+
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY_TABLE}" INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}" START WITH %s OWNED BY "{TABLE}".id', [next_id])
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval(%s)', [SEQUENCE])
+        # Определения индексов ссылаются на имя core_gamelog - теперь это новая таблица
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{LEGACY_TABLE}" FOR VALUES FROM (MINVALUE) TO (%s)',
+            [boundary],
+        )
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+        ensure_partitions(months_ahead)
@@ -0,0 +1,105 @@
+import gzip
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from . import partitions
+from .game_settings import game_settings
+from .models import GameLog
+
+logger = logging.getLogger(__name__)
+
+
+class GameLogArchive:
+    """Архив удаляемых логов: gzip, одна запись JSON на строку"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def write_rows(self, rows):
+        for row in rows:
+            self._file.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+            self._file.write('\n')
+            self.rows += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class GameLogService:
+    """Хранение игровых логов: срок хранения и удаление устаревших"""
+
+    # Срок хранения в днях в GameSettings (по умолчанию - settings.GAMELOG_RETENTION_DAYS)
+    RETENTION_KEY = 'gamelog_retention_days'
+    # Строк в одной транзакции удаления
+    CHUNK_SIZE = 5000
+
+    @staticmethod
+    def get_retention_days():
+        """Срок хранения логов в днях"""
+        value = game_settings.get(GameLogService.RETENTION_KEY, settings.GAMELOG_RETENTION_DAYS)
+        try:
+            days = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Настройка {GameLogService.RETENTION_KEY}: ожидается число дней, получено {value!r}")
+        if days < 1:
+            raise ValueError(f"Настройка {GameLogService.RETENTION_KEY}: срок хранения меньше дня")
+        return days
+
+    @staticmethod
+    def get_cutoff(days=None):
+        """Логи старше этого момента удаляются"""
+        return timezone.now() - timedelta(days=days or GameLogService.get_retention_days())
+
+    @staticmethod
+    def prune(cutoff, chunk_size=CHUNK_SIZE, archive=None, pause=0.0):
+        """
+        Удалить логи старше cutoff, предварительно записав их в archive (GameLogArchive).
+
+        Секции PostgreSQL, целиком старше cutoff, удаляются без DELETE; остальные
+        строки удаляются пачками по chunk_size, каждая в своей короткой транзакции,
+        с паузой pause секунд между пачками, чтобы не мешать записи логов.
+        Возвращает (удаленные секции, удаленные строки).
+        """
+        dropped = []
+        if partitions.is_partitioned():
+            partitions.ensure_partitions()
+            for name, _ in partitions.expired_partitions(cutoff):
+                if archive is not None:
+                    # Только строки самой секции: устаревшие строки DEFAULT архивирует удаление ниже
+                    archive.write_rows(partitions.partition_rows(name, chunk_size))
+                partitions.drop_partition(name)
+                dropped.append(name)
+                logger.info(f"GameLog partition {name} dropped")
+
+        deleted = 0
+        expired = GameLog.objects.filter(created_at__lt=cutoff).order_by('pk')
+        while True:
+            with transaction.atomic():
+                if archive is not None:
+                    rows = list(expired.values()[:chunk_size])
+                    ids = [row['id'] for row in rows]
+                else:
+                    ids = list(expired.values_list('pk', flat=True)[:chunk_size])
+                if not ids:
+                    return dropped, deleted
+                GameLog.objects.filter(pk__in=ids).delete()
+                if archive is not None:
+                    archive.write_rows(rows)
+            deleted += len(ids)
+            if pause:
+                time.sleep(pause)
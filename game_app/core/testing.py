@@ -0,0 +1,104 @@
+"""
+Общее для тестов: игровой мир с реалистичными данными и проверка
+бюджета запросов к базе.
+
+Бюджеты равны текущему числу запросов и не зависят от количества строк
+в фикстурах: лишний запрос или N+1 в списке сразу выходит за бюджет.
+"""
+
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Player, PlayerProfile
+from characters.models import Character
+from characters.services import LoadoutService
+from items.catalog import item_catalog
+from items.models import Item
+from items.services import InventoryService
+
+# Суммарное время SQL одного запроса к странице или API по умолчанию, секунды
+DEFAULT_MAX_SQL_TIME = 0.5
+
+# Токен бота для тестов сессий: без TELEGRAM_BOT_TOKEN токены сессии не выдаются
+TEST_BOT_TOKEN = '123456:test-token'
+
+# Экипируемые предметы фикстур: по одному на слот
+SLOT_ITEMS = [
+    ('weapon', 'weapon', {'attack_bonus': 5}),
+    ('torso', 'armor', {'defense_bonus': 4}),
+    ('head', 'armor', {'defense_bonus': 2}),
+    ('hands', 'armor', {'defense_bonus': 1}),
+    ('legs', 'armor', {'defense_bonus': 2}),
+    ('feet', 'armor', {'agility_bonus': 1}),
+    ('accessory', 'misc', {'health_bonus': 10}),
+]
+
+
+def seed_world(players=25, telegram_id_start=700_000):
+    """
+    Игроки с профилями, персонажами, инвентарем и экипировкой.
+    Каждый игрок надевает оружие и броню на торс, еще два предмета лежат в инвентаре.
+    """
+    items = [
+        Item.objects.create(
+            name=f'Предмет {slot}', item_type=item_type, equipment_slot=slot, rarity='blue', value=10, **bonuses,
+        )
+        for slot, item_type, bonuses in SLOT_ITEMS
+    ]
+    potion = Item.objects.create(
+        name='Зелье', item_type='consumable', equipment_slot='none', stackable=True, max_stack=20, value=1,
+    )
+    items.append(potion)
+
+    world = SimpleNamespace(players=[], characters=[], items=items, potion=potion)
+    for index in range(players):
+        player = Player.objects.create(
+            telegram_id=telegram_id_start + index,
+            username=f'player{index}',
+            first_name=f'Игрок {index}',
+        )
+        PlayerProfile.objects.create(player=player, level=1 + index % 10, experience=index * 37 % 100)
+        character = Character.objects.create(player=player, name=f'Герой {index}', strength=10)
+
+        for item in items[:4]:
+            InventoryService.add_item(player.id, item.id)
+        InventoryService.add_item(player.id, potion.id, 5)
+        LoadoutService.equip_item(player.telegram_id, items[0].id)
+        LoadoutService.equip_item(player.telegram_id, items[1].id)
+
+        world.players.append(player)
+        world.characters.append(character)
+
+    world.player = world.players[0]
+    world.character = world.characters[0]
+    return world
+
+
+class QueryBudgetMixin:
+    """Для TestCase: assertQueryBudget"""
+
+    def setUp(self):
+        super().setUp()
+        # Каталог предметов загружен, как на работающем сервере
+        item_catalog.refresh()
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_time=DEFAULT_MAX_SQL_TIME):
+        """Блок выполняет не больше max_queries запросов и не дольше max_time секунд SQL"""
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        queries = context.captured_queries
+        listing = '\n'.join(f"{index}. {query['sql']}" for index, query in enumerate(queries, 1))
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f"{len(queries)} запросов при бюджете {max_queries}:\n{listing}",
+        )
+        sql_time = sum(float(query['time']) for query in queries)
+        self.assertLessEqual(
+            sql_time, max_time,
+            f"SQL {sql_time:.3f} с при бюджете {max_time} с:\n{listing}",
+        )
@@ -1,3 +1,387 @@
-from django.test import TestCase
+import atexit
+import gzip
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Player, PlayerProfile
+from . import partitions
+from .buffers import LastSeenBuffer
+from .game_settings import GameSettingsRegistry, game_settings, parse_value
+from .gamelog import GameLogHandler, GameLogWriter, records_total
+from .models import GameLog, GameSettings
+from .versioning import get_version
+from .services import GameLogArchive, GameLogService
+
+
+class MetricsViewTests(TestCase):
+
+    def get(self, **headers):
+        return self.client.get('/metrics', HTTP_HOST='localhost', **headers)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_no_token_is_hidden(self):
+        self.assertEqual(self.get().status_code, 404)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_no_token_open_in_debug(self):
+        self.assertEqual(self.get().status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret', DEBUG=False)
+    def test_token(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        response = self.get(HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+
+def create_profiles(count):
+    profiles = []
+    for index in range(count):
+        player = Player.objects.create(telegram_id=600 + index, first_name=f'Игрок {index}')
+        profiles.append(PlayerProfile.objects.create(player=player, last_login=timezone.now() - timedelta(days=1)))
+    return profiles
+
+
+class LastSeenBufferTests(TestCase):
+
+    def buffer(self, **kwargs):
+        buffer = LastSeenBuffer(PlayerProfile, 'last_login', key='player_id', **{'interval': 3600, **kwargs})
+        self.addCleanup(buffer.stop)
+        return buffer
+
+    def test_touch_coalesces_without_queries(self):
+        profiles = create_profiles(3)
+        buffer = self.buffer(batch_size=2)
+        now = timezone.now()
+        with self.assertNumQueries(0):
+            for offset in range(5):
+                for profile in profiles:
+                    buffer.touch(profile.player_id, now + timedelta(seconds=offset))
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.get(profiles[0].player_id), now + timedelta(seconds=4))
+
+        # Одно значение на игрока, по UPDATE на batch_size игроков
+        with self.assertNumQueries(2):
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(len(buffer), 0)
+        for profile in profiles:
+            profile.refresh_from_db()
+            self.assertEqual(profile.last_login, now + timedelta(seconds=4))
+
+
+class LastSeenBufferThreadTests(TransactionTestCase):
+    """Запись фоновым потоком: строки должны быть закоммичены, чтобы их видело соединение потока"""
+
+    def test_flushes_by_interval(self):
+        profile = create_profiles(1)[0]
+        buffer = LastSeenBuffer(PlayerProfile, 'last_login', key='player_id', interval=0.05)
+        self.addCleanup(buffer.stop)
+        now = timezone.now()
+        buffer.touch(profile.player_id, now)
+
+        deadline = time.monotonic() + 5
+        while PlayerProfile.objects.get(pk=profile.pk).last_login != now and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(PlayerProfile.objects.get(pk=profile.pk).last_login, now)
+        self.assertEqual(len(buffer), 0)
+
+    def test_stop_flushes_rest(self):
+        # stop зарегистрирован в atexit: остаток записывается при остановке процесса
+        with mock.patch('core.buffers.atexit.register') as register:
+            buffer = LastSeenBuffer(PlayerProfile, 'last_login', key='player_id', interval=3600)
+        register.assert_called_once_with(buffer.stop)
+
+        profile = create_profiles(1)[0]
+        now = timezone.now()
+        buffer.touch(profile.player_id, now)
+        self.assertTrue(buffer._thread.is_alive())
+        buffer.stop()
+        self.assertFalse(buffer._thread.is_alive())
+        profile.refresh_from_db()
+        self.assertEqual(profile.last_login, now)
+
+
+def own_logs():
+    # Фоновый поток общего writer может дописать в таблицу записи из других тестов
+    return GameLog.objects.filter(source='test')
+
+
+def counted(result):
+    return records_total._values.get((result,), 0)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return predicate()
+
+
+class GameLogWriterTestMixin:
+
+    def writer(self, **kwargs):
+        writer = GameLogWriter(**{'max_queue': 100, 'batch_size': 100, 'interval': 3600, **kwargs})
+        self.addCleanup(atexit.unregister, writer.stop)
+        self.addCleanup(writer.stop)
+        return writer
+
+
+class GameLogWriterTests(GameLogWriterTestMixin, TestCase):
+
+    def test_queue_limit_drops(self):
+        writer = self.writer(max_queue=2)
+        dropped = counted('dropped')
+        with mock.patch.object(writer, '_ensure_thread'), self.assertNumQueries(0):
+            results = [writer.write('info', f'событие {index}', 'test') for index in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(len(writer), 2)
+        self.assertEqual(counted('dropped') - dropped, 1)
+
+        # Запись пачками по batch_size
+        writer.batch_size = 1
+        with self.assertNumQueries(2):
+            self.assertEqual(writer.flush(), 2)
+        self.assertEqual(list(own_logs().order_by('pk').values_list('message', flat=True)), ['событие 0', 'событие 1'])
+
+    def test_failed_flush_is_logged_not_raised(self):
+        writer = self.writer()
+        failed = counted('failed')
+        with mock.patch.object(writer, '_ensure_thread'):
+            writer.write('error', 'событие', 'test')
+        with mock.patch.object(GameLog.objects, 'bulk_create', side_effect=OperationalError('database is down')):
+            with self.assertLogs('core.gamelog', 'ERROR'):
+                self.assertEqual(writer.flush(), 0)
+        self.assertEqual(counted('failed') - failed, 1)
+        self.assertEqual(len(writer), 0)
+
+    def test_handler_never_raises(self):
+        handler = GameLogHandler()
+        test_logger = logging.getLogger('core.tests.handler')
+        test_logger.addHandler(handler)
+        test_logger.propagate = False
+        self.addCleanup(test_logger.removeHandler, handler)
+
+        writer = self.writer()
+        with mock.patch('core.gamelog.writer', writer), mock.patch.object(writer, '_ensure_thread'):
+            # База недоступна: запись в очередь не обращается к ней
+            with mock.patch.object(GameLog.objects, 'bulk_create', side_effect=OperationalError('database is down')):
+                with self.assertNumQueries(0):
+                    test_logger.error('Ошибка', extra={'player_id': 5})
+                self.assertEqual(writer._queue[0]['level'], 'error')
+                self.assertEqual(writer._queue[0]['player_id'], 5)
+                with self.assertLogs('core.gamelog', 'ERROR'):
+                    writer.flush()
+            # Сбой самой очереди уходит в handleError, а не в вызывающий код
+            with mock.patch.object(writer, 'write', side_effect=RuntimeError('queue broken')), \
+                    mock.patch.object(handler, 'handleError') as handle_error:
+                test_logger.warning('Предупреждение')
+            handle_error.assert_called_once()
+
+
+class GameLogWriterThreadTests(GameLogWriterTestMixin, TransactionTestCase):
+    """Запись фоновым потоком: по размеру пачки, по интервалу и при остановке"""
+
+    def test_flush_on_batch_size(self):
+        writer = self.writer(batch_size=3)
+        for index in range(3):
+            writer.write('info', f'событие {index}', 'test')
+        self.assertTrue(wait_for(lambda: own_logs().count() == 3))
+
+    def test_flush_on_interval(self):
+        writer = self.writer(interval=0.05)
+        writer.write('info', 'событие', 'test')
+        self.assertTrue(wait_for(lambda: own_logs().count() == 1))
+        self.assertEqual(len(writer), 0)
+
+    def test_stop_flushes_rest(self):
+        with mock.patch('core.gamelog.atexit.register') as register:
+            writer = GameLogWriter(batch_size=100, interval=3600)
+        register.assert_called_once_with(writer.stop)
+
+        writer.write('info', 'событие', 'test')
+        writer.write('info', 'событие', 'test')
+        self.assertEqual(own_logs().count(), 0)
+        writer.stop()
+        self.assertFalse(writer._thread.is_alive())
+        self.assertEqual(own_logs().count(), 2)
+        # После остановки поток не перезапускается, записи ждут следующего flush
+        writer.write('info', 'событие', 'test')
+        self.assertEqual(len(writer), 1)
+
+
+class GameLogArchiveMixin:
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'gamelog.jsonl.gz')
+
+    def archived(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+
+class GameLogPruneTests(GameLogArchiveMixin, TestCase):
+    """Удаление устаревших логов пачками (SQLite и несекционированная таблица PostgreSQL)"""
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.cutoff = now - timedelta(days=30)
+        for days in (40, 35, 31, 20, 0):
+            GameLog.objects.create(level='info', source='test', message=f'{days} дней', created_at=now - timedelta(days=days))
+
+    def messages(self):
+        return sorted(own_logs().values_list('message', flat=True))
+
+    def test_prune_with_archive(self):
+        with GameLogArchive(self.path) as archive:
+            dropped, deleted = GameLogService.prune(self.cutoff, chunk_size=2, archive=archive)
+        self.assertEqual((dropped, deleted, archive.rows), ([], 3, 3))
+        self.assertEqual(self.messages(), ['0 дней', '20 дней'])
+
+        rows = self.archived()
+        self.assertEqual([row['message'] for row in rows], ['40 дней', '35 дней', '31 дней'])
+        self.assertEqual(
+            set(rows[0]),
+            {'id', 'created_at', 'updated_at', 'is_active', 'level', 'message', 'source',
+             'player_id', 'character_id', 'ip_address', 'user_agent'},
+        )
+        self.assertLess(timezone.datetime.fromisoformat(rows[-1]['created_at']), self.cutoff)
+
+    def test_prune_without_archive(self):
+        self.assertEqual(GameLogService.prune(self.cutoff, chunk_size=2), ([], 3))
+        self.assertEqual(GameLogService.prune(self.cutoff), ([], 0))
+        self.assertEqual(self.messages(), ['0 дней', '20 дней'])
+
+
+@skipUnless(partitions.is_supported(), 'секции есть только в PostgreSQL')
+class GameLogPartitionPruneTests(GameLogArchiveMixin, TransactionTestCase):
+    """
+    Удаление секций целиком. convert() не выполняется в транзакции, поэтому
+    TransactionTestCase; таблица остается секционированной до конца прогона.
+    """
+
+    def test_default_rows_archived_once(self):
+        if not partitions.is_partitioned():
+            partitions.convert()
+        now = timezone.now()
+        # Секция через четыре месяца, а месяц перед ней не создан: его строки попадают в DEFAULT
+        gap_start = partitions.month_start(now, 3)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE "{partitions.partition_name(partitions.month_start(now, 4))}" '
+                f'PARTITION OF "{partitions.TABLE}" FOR VALUES FROM (%s) TO (%s)',
+                [partitions.month_start(now, 4), partitions.month_start(now, 5)],
+            )
+        GameLog.objects.create(level='info', source='test', message='сейчас')
+        GameLog.objects.create(level='info', source='test', message='в DEFAULT', created_at=gap_start + timedelta(days=1))
+        GameLog.objects.create(
+            level='info', source='test', message='в секции', created_at=partitions.month_start(now, 4) + timedelta(days=1),
+        )
+
+        with GameLogArchive(self.path) as archive:
+            dropped, deleted = GameLogService.prune(partitions.month_start(now, 6), archive=archive)
+        self.assertNotIn(partitions.DEFAULT_PARTITION, dropped)
+        self.assertEqual(deleted, 1)
+        self.assertEqual(
+            sorted(row['message'] for row in self.archived() if row['source'] == 'test'), ['в DEFAULT', 'в секции', 'сейчас'],
+        )
+        self.assertFalse(own_logs().exists())
+
+
+class ParseValueTests(TestCase):
+
+    def test_typed_values(self):
+        cases = [
+            ('42', 'int', 42), ('-3', 'int', -3), ('1.5', 'float', 1.5), ('2', 'float', 2.0),
+            ('true', 'bool', True), (' Да ', 'bool', True), ('off', 'bool', False), ('', 'bool', False),
+            ('{"rates": [1, 2]}', 'json', {'rates': [1, 2]}), ('null', 'json', None),
+            ('текст', 'string', 'текст'),
+        ]
+        for value, value_type, expected in cases:
+            with self.subTest(value=value, value_type=value_type):
+                parsed = parse_value(value, value_type)
+                self.assertEqual(parsed, expected)
+                self.assertIs(type(parsed), type(expected))
+
+    def test_bad_values(self):
+        for value, value_type in [('abc', 'int'), ('1.5', 'int'), ('x', 'float'), ('maybe', 'bool'), ('{', 'json')]:
+            with self.subTest(value=value, value_type=value_type), self.assertRaises(ValueError):
+                parse_value(value, value_type)
+
+
+class GameSettingsRegistryTests(TestCase):
+
+    def setUp(self):
+        for key, value, value_type in [
+            ('max_level', '50', 'int'), ('drop_rate', '0.25', 'float'), ('pvp_enabled', 'yes', 'bool'),
+            ('broken_rate', 'много', 'int'),
+        ]:
+            GameSettings.objects.create(key=key, value=value, value_type=value_type)
+        GameSettings.objects.create(key='disabled', value='1', value_type='int', is_active=False)
+        # Откат транзакции теста возвращает и версию: общий кэш не должен пережить тест
+        self.addCleanup(game_settings.expire)
+
+    def registry(self, check_interval=3600):
+        # Отдельный экземпляр - кэш другого процесса: сигналы сохранения его не сбрасывают
+        return GameSettingsRegistry('game_settings', check_interval=check_interval)
+
+    def test_get(self):
+        registry = self.registry()
+        with self.assertLogs('core.game_settings', 'ERROR'), self.assertNumQueries(2):
+            self.assertEqual(registry.get('max_level'), 50)
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.get('drop_rate'), 0.25)
+            self.assertIs(registry.get('pvp_enabled'), True)
+            self.assertEqual(registry.get('disabled', 7), 7)
+            self.assertIn('broken_rate', registry)
+            self.assertNotIn('disabled', registry)
+            self.assertEqual(registry.as_dict(), {'max_level': 50, 'drop_rate': 0.25, 'pvp_enabled': True})
+            with self.assertRaisesMessage(ValueError, 'Настройка broken_rate (int)'):
+                registry.get('broken_rate')
+
+    def test_version_bump_reaches_other_processes(self):
+        other = self.registry()
+        with self.assertLogs('core.game_settings', 'ERROR'):
+            self.assertEqual(other.get('max_level'), 50)
+        version = get_version('game_settings')
+
+        setting = GameSettings.objects.get(key='max_level')
+        setting.value = '60'
+        with self.captureOnCommitCallbacks(execute=True):
+            setting.save()
+        self.assertEqual(get_version('game_settings'), version + 1)
+        # В этом процессе кэш сброшен сразу
+        with self.assertLogs('core.game_settings', 'ERROR'):
+            self.assertEqual(game_settings.get('max_level'), 60)
+
+        # Другой процесс видит прежнее значение до проверки версии
+        with self.assertNumQueries(0):
+            self.assertEqual(other.get('max_level'), 50)
+        now = time.monotonic()
+        with mock.patch('core.versioning.time.monotonic', return_value=now + 3600):
+            with self.assertLogs('core.game_settings', 'ERROR'), self.assertNumQueries(2):
+                self.assertEqual(other.get('max_level'), 60)
+        # Версия не менялась - только проверка версии, без перечитывания
+        with mock.patch('core.versioning.time.monotonic', return_value=now + 7200), self.assertNumQueries(1):
+            self.assertEqual(other.get('max_level'), 60)
+
+    def test_delete_bumps_version(self):
+        other = self.registry(check_interval=0)
+        with self.assertLogs('core.game_settings', 'ERROR'):
+            self.assertTrue(other.get('pvp_enabled'))
+        GameSettings.objects.filter(key='pvp_enabled').delete()
+        with self.assertLogs('core.game_settings', 'ERROR'):
+            self.assertIsNone(other.get('pvp_enabled'))
@@ -0,0 +1,82 @@
+"""
+Кэши процесса со сбросом по версии.
+
+Данные, которые меняются редко, а читаются постоянно (настройки игры,
+каталог предметов), держатся в памяти каждого процесса - веб-воркеров и
+бота. Изменение данных увеличивает счетчик версии в таблице CacheVersion
+в той же транзакции; процесс сверяет версию не чаще раза в check_interval
+секунд (один запрос по уникальному индексу) и перечитывает данные только
+если версия изменилась. В процессе, где данные изменены, кэш сбрасывается
+сразу.
+"""
+
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+def get_version(name):
+    from .models import CacheVersion
+
+    return CacheVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+
+def bump_version(name):
+    """Увеличить версию кэша name (для всех процессов)"""
+    from .models import CacheVersion
+
+    updated = CacheVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now())
+    if not updated:
+        CacheVersion.objects.get_or_create(name=name)
+        CacheVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+class VersionedCache:
+    """Данные в памяти процесса, перечитываемые при изменении версии name"""
+
+    def __init__(self, name, check_interval=5.0):
+        self.name = name
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._data = None
+        self._version = None
+        self._checked_at = None
+
+    def load(self):
+        """Прочитать данные из базы; переопределяется в наследниках"""
+        raise NotImplementedError
+
+    @property
+    def data(self):
+        checked_at = self._checked_at
+        if checked_at is None or time.monotonic() - checked_at >= self.check_interval:
+            self.refresh()
+        return self._data
+
+    def refresh(self):
+        """Сверить версию и перечитать данные, если она изменилась"""
+        with self._lock:
+            # Версия читается до данных: изменение между запросами приведет к лишнему перечитыванию, а не к устаревшему кэшу
+            version = get_version(self.name)
+            if self._data is None or version != self._version:
+                self._data = self.load()
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    def expire(self):
+        """Перечитать данные при следующем обращении"""
+        with self._lock:
+            self._version = None
+            self._checked_at = None
+
+    def invalidate(self):
+        """
+        Данные изменены: увеличить версию для всех процессов и сбросить кэш.
+        Кэш сбрасывается и сразу (чтения в той же транзакции видят изменения), и после коммита.
+        """
+        bump_version(self.name)
+        self.expire()
+        transaction.on_commit(self.expire)
@@ -0,0 +1,236 @@
+"""
+Боевой движок.
+
+Бой считается по компактному снимку характеристик персонажа (CombatStats),
+без обращения к ORM. Каждый бой получает собственный seed, а результат
+хранит снимки бойцов, поэтому бой воспроизводится точно, даже если
+характеристики персонажей с тех пор изменились. Результаты пачки боев
+записываются в профили игроков несколькими групповыми UPDATE вместо
+сохранения профиля на каждый бой. Бой игрока в API - CombatService.fight.
+"""
+
+import logging
+import random
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from accounts.models import PlayerProfile
+from characters.models import Character
+
+logger = logging.getLogger(__name__)
+
+# Максимум раундов; если никто не упал, побеждает тот, у кого больше доля здоровья
+MAX_ROUNDS = 50
+CRIT_MULTIPLIER = 1.5
+MIN_DAMAGE = 1
+# Защита поглощает часть урона: damage - defense * DEFENSE_FACTOR
+DEFENSE_FACTOR = 0.5
+
+
+class CombatStats:
+    """Снимок боевых характеристик персонажа"""
+
+    __slots__ = (
+        'character_id', 'player_id', 'max_health', 'min_attack', 'max_attack',
+        'defense', 'crit_chance', 'dodge_chance',
+    )
+
+    def __init__(self, character_id, player_id, max_health, min_attack, max_attack,
+                 defense, crit_chance, dodge_chance):
+        self.character_id = character_id
+        self.player_id = player_id
+        self.max_health = max_health
+        self.min_attack = min_attack
+        self.max_attack = max(min_attack, max_attack)
+        self.defense = defense
+        self.crit_chance = crit_chance
+        self.dodge_chance = dodge_chance
+
+    def __repr__(self):
+        return f"CombatStats(character_id={self.character_id}, hp={self.max_health})"
+
+    @classmethod
+    def from_character(cls, character):
+        return cls(
+            character.pk, character.player_id, character.max_health, character.min_attack,
+            character.max_attack, character.defense, character.crit_chance, character.dodge_chance,
+        )
+
+    @classmethod
+    def load(cls, character_ids):
+        """Снимки персонажей одним запросом: {id персонажа: CombatStats}"""
+        rows = Character.objects.filter(pk__in=list(character_ids)).values_list(
+            'pk', 'player_id', 'max_health', 'min_attack', 'max_attack',
+            'defense', 'crit_chance', 'dodge_chance',
+        )
+        return {row[0]: cls(*row) for row in rows}
+
+
+class FightResult:
+    """Итог одного боя вместе со снимками бойцов, по которым он посчитан"""
+
+    __slots__ = ('attacker', 'defender', 'winner_id', 'loser_id', 'rounds', 'seed', 'health_left')
+
+    def __init__(self, attacker, defender, winner_id, loser_id, rounds, seed, health_left):
+        self.attacker = attacker
+        self.defender = defender
+        self.winner_id = winner_id
+        self.loser_id = loser_id
+        self.rounds = rounds
+        self.seed = seed
+        self.health_left = health_left
+
+    @property
+    def attacker_id(self):
+        return self.attacker.character_id
+
+    @property
+    def defender_id(self):
+        return self.defender.character_id
+
+    def __repr__(self):
+        return f"FightResult(winner={self.winner_id}, loser={self.loser_id}, rounds={self.rounds}, seed={self.seed})"
+
+
+def strike(attacker, defender, rng):
+    """Урон одного удара (0 - уворот)"""
+    if rng.random() * 100 < defender.dodge_chance:
+        return 0
+    damage = rng.randint(attacker.min_attack, attacker.max_attack)
+    if rng.random() * 100 < attacker.crit_chance:
+        damage = int(damage * CRIT_MULTIPLIER)
+    return max(MIN_DAMAGE, int(damage - defender.defense * DEFENSE_FACTOR))
+
+
+def resolve_fight(attacker, defender, seed):
+    """
+    Провести бой двух снимков. Атакующий бьет первым.
+    Один и тот же seed всегда дает один и тот же результат.
+    """
+    rng = random.Random(seed)
+    fighters = (attacker, defender)
+    health = [attacker.max_health, defender.max_health]
+
+    rounds = 0
+    loser = None
+    while rounds < MAX_ROUNDS and loser is None:
+        rounds += 1
+        for side in (0, 1):
+            target = 1 - side
+            health[target] -= strike(fighters[side], fighters[target], rng)
+            if health[target] <= 0:
+                loser = target
+                break
+
+    if loser is None:
+        # Ничья по раундам: проигрывает тот, у кого меньше доля здоровья (при равенстве - атакующий)
+        shares = [health[side] / max(fighters[side].max_health, 1) for side in (0, 1)]
+        loser = 0 if shares[0] <= shares[1] else 1
+
+    winner = 1 - loser
+    return FightResult(
+        attacker, defender,
+        fighters[winner].character_id, fighters[loser].character_id,
+        rounds, seed, max(health[winner], 0),
+    )
+
+
+class CombatEngine:
+    """
+    Пакетное проведение боев.
+
+    Пары (атакующий, защищающийся) обрабатываются пачками: снимки персонажей
+    пачки загружаются одним запросом, бои считаются в памяти, а статистика
+    побед и поражений записывается в профили групповыми UPDATE.
+    """
+
+    def __init__(self, seed=None, batch_size=1000, record=True):
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(32)
+        self.batch_size = batch_size
+        self.record = record
+        # Seed'ы отдельных боев выводятся из общего seed движка
+        self._seeds = random.Random(self.seed)
+
+    def resolve(self, pairs):
+        """
+        Провести бои для списка пар id персонажей.
+        Пары с отсутствующими персонажами или боем с самим собой пропускаются.
+        Возвращает список FightResult.
+        """
+        pairs = list(pairs)
+        results = []
+        for start in range(0, len(pairs), self.batch_size):
+            batch = pairs[start:start + self.batch_size]
+            snapshots = CombatStats.load({character_id for pair in batch for character_id in pair})
+
+            batch_results = []
+            for attacker_id, defender_id in batch:
+                seed = self._seeds.getrandbits(32)
+                attacker = snapshots.get(attacker_id)
+                defender = snapshots.get(defender_id)
+                if attacker is None or defender is None or attacker_id == defender_id:
+                    logger.warning(f"Skipping fight {attacker_id} vs {defender_id}")
+                    continue
+                batch_results.append(resolve_fight(attacker, defender, seed))
+
+            if self.record:
+                self.record_results(batch_results, snapshots)
+            results.extend(batch_results)
+
+        return results
+
+    @staticmethod
+    def replay(result):
+        """Повторить бой: те же снимки бойцов и seed дают тот же результат, без запросов"""
+        return resolve_fight(result.attacker, result.defender, result.seed)
+
+    @staticmethod
+    def record_results(results, snapshots):
+        """
+        Записать победы и поражения в профили игроков.
+        Игроки с одинаковым приростом (побед, поражений) обновляются одним UPDATE.
+        Возвращает количество обновленных профилей.
+        """
+        wins = Counter(snapshots[result.winner_id].player_id for result in results)
+        losses = Counter(snapshots[result.loser_id].player_id for result in results)
+
+        groups = defaultdict(list)
+        for player_id in wins.keys() | losses.keys():
+            groups[(wins[player_id], losses[player_id])].append(player_id)
+
+        updated = 0
+        with transaction.atomic():
+            for (won, lost), player_ids in groups.items():
+                updated += PlayerProfile.objects.filter(player_id__in=player_ids).update(
+                    wins=F('wins') + won,
+                    losses=F('losses') + lost,
+                    total_games=F('total_games') + won + lost,
+                )
+        return updated
+
+
+class CombatService:
+    """Бои персонажей игроков"""
+
+    @staticmethod
+    def fight(telegram_id, opponent_id, seed=None):
+        """
+        Бой персонажа игрока (атакует первым) с персонажем opponent_id.
+        Победа и поражение записываются в профили. Возвращает FightResult.
+        """
+        try:
+            opponent_id = int(opponent_id)
+        except (TypeError, ValueError):
+            raise ValueError('Противник не найден')
+        character_id = Character.objects.filter(player__telegram_id=telegram_id).values_list('pk', flat=True).first()
+        if character_id is None:
+            raise ValueError('Персонаж не найден')
+        if character_id == opponent_id:
+            raise ValueError('Нельзя сражаться с самим собой')
+
+        results = CombatEngine(seed=seed).resolve([(character_id, opponent_id)])
+        if not results:
+            raise ValueError('Противник не найден')
+        return results[0]
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from telegram_bot.services import OutboxService
+
+
+class Command(BaseCommand):
+    help = 'Ставит в outbox бота сообщение для всех активных игроков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('text', help='Текст сообщения')
+        parser.add_argument('--kind', default='broadcast', help='Тип сообщения (для фильтрации в админке)')
+        parser.add_argument('--parse-mode', default='', help='HTML или MarkdownV2')
+
+    def handle(self, *args, **options):
+        if not options['text'].strip():
+            raise CommandError('Пустой текст сообщения')
+        count = OutboxService.broadcast(options['text'], kind=options['kind'], parse_mode=options['parse_mode'])
+        self.stdout.write(self.style.SUCCESS(f"Поставлено в очередь сообщений: {count}"))
@@ -4,19 +4,31 @@ from characters.models import Equipment
 
 
 class Command(BaseCommand):
-    help = 'Очищает дублированные записи экипировки, оставляя по одной на персонажа'
+    help = 'Очищает дублированные и битые записи экипировки, оставляя по одной записи на слот персонажа'
 
     def handle(self, *args, **options):
-        # Получаем все персонажи с дублированной экипировкой
-        duplicate_characters = Equipment.objects.values('character').annotate(
-            count=models.Count('id')
-        ).filter(count__gt=1).values_list('character', flat=True)
-
         cleaned_count = 0
 
-        for character_id in duplicate_characters:
-            # Получаем все записи экипировки для этого персонажа
-            equipment_records = Equipment.objects.filter(character_id=character_id).order_by('id')
+        # Удаляем записи без слота или с неизвестным слотом
+        invalid = Equipment.objects.exclude(slot__in=[code for code, _ in Equipment.SLOTS])
+        invalid_count = invalid.count()
+        if invalid_count:
+            invalid.delete()
+            cleaned_count += invalid_count
+            self.stdout.write(
+                self.style.SUCCESS(f'Удалено {invalid_count} записей экипировки без корректного слота')
+            )
+
+        # Получаем слоты персонажей с дублированной экипировкой
+        duplicate_slots = Equipment.objects.values('character', 'slot').annotate(
+            count=models.Count('id')
+        ).filter(count__gt=1)
+
+        for duplicate in duplicate_slots:
+            # Получаем все записи экипировки для этого слота
+            equipment_records = Equipment.objects.filter(
+                character_id=duplicate['character'], slot=duplicate['slot']
+            ).order_by('id')
 
             # Оставляем первую запись, удаляем остальные
             first_equipment = equipment_records.first()
@@ -27,12 +39,15 @@ class Command(BaseCommand):
                 duplicates.delete()
                 cleaned_count += duplicate_count
                 self.stdout.write(
-                    self.style.SUCCESS(f'Удалено {duplicate_count} дубликатов экипировки для персонажа {character_id}')
+                    self.style.SUCCESS(
+                        f'Удалено {duplicate_count} дубликатов слота {duplicate["slot"]} '
+                        f'для персонажа {duplicate["character"]}'
+                    )
                 )
 
         if cleaned_count > 0:
             self.stdout.write(
-                self.style.SUCCESS(f'Всего очищено дубликатов: {cleaned_count}')
+                self.style.SUCCESS(f'Всего очищено записей: {cleaned_count}. Запустите recompute_stats для пересчета бонусов')
             )
         else:
             self.stdout.write(
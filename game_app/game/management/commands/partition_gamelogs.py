@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import partitions
+
+
+class Command(BaseCommand):
+    help = 'Секционирование GameLog по месяцам (PostgreSQL): перевод таблицы и создание секций заранее'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Однократно перевести таблицу в секционированную')
+        parser.add_argument('--months-ahead', type=int, default=2, help='На сколько месяцев вперед создать секции')
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            raise CommandError('Секционирование поддерживается только на PostgreSQL')
+
+        if options['convert']:
+            if partitions.is_partitioned():
+                raise CommandError(f'Таблица {partitions.TABLE} уже секционирована')
+            partitions.convert(options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS(f'Таблица {partitions.TABLE} секционирована'))
+        elif not partitions.is_partitioned():
+            raise CommandError(f'Таблица {partitions.TABLE} не секционирована, запустите с --convert')
+        else:
+            created = partitions.ensure_partitions(options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS(f"Создано секций: {len(created)}"))
+
+        for name, upper in partitions.list_partitions():
+            self.stdout.write(f"  {name}: до {upper:%Y-%m-%d}" if upper else f"  {name}")
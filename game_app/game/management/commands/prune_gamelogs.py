@@ -0,0 +1,52 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import GameLog
+from core.services import GameLogArchive, GameLogService
+
+
+class Command(BaseCommand):
+    help = 'Удаляет логи GameLog старше срока хранения (настройка gamelog_retention_days)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Срок хранения в днях вместо настройки')
+        parser.add_argument('--archive-dir', help='Сохранить удаляемые логи в gzip-архив в этой папке')
+        parser.add_argument('--chunk-size', type=int, default=GameLogService.CHUNK_SIZE, help='Строк в одной транзакции')
+        parser.add_argument('--pause', type=float, default=0.0, help='Пауза между пачками, секунды')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать устаревшие логи')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 1:
+            raise CommandError('Срок хранения меньше дня')
+        try:
+            cutoff = GameLogService.get_cutoff(options['days'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Удаляются логи старше {timezone.localtime(cutoff):%Y-%m-%d %H:%M}")
+
+        if options['dry_run']:
+            count = GameLog.objects.filter(created_at__lt=cutoff).count()
+            self.stdout.write(f"Устаревших логов: {count}")
+            return
+
+        archive = None
+        if options['archive_dir']:
+            os.makedirs(options['archive_dir'], exist_ok=True)
+            path = os.path.join(options['archive_dir'], f"gamelog-{timezone.now():%Y%m%d-%H%M%S}.jsonl.gz")
+            archive = GameLogArchive(path)
+
+        try:
+            dropped, deleted = GameLogService.prune(
+                cutoff, chunk_size=options['chunk_size'], archive=archive, pause=options['pause'],
+            )
+        finally:
+            if archive is not None:
+                archive.close()
+
+        if dropped:
+            self.stdout.write(f"Удалено секций: {len(dropped)} ({', '.join(dropped)})")
+        self.stdout.write(self.style.SUCCESS(f"Удалено логов: {deleted}"))
+        if archive is not None:
+            self.stdout.write(f"Архив: {archive.path} ({archive.rows} записей)")
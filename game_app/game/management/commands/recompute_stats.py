@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from characters.stats import StatsRecomputeEngine
+
+
+class Command(BaseCommand):
+    help = 'Массово пересчитывает характеристики всех персонажей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Размер пачки персонажей')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать изменения, без записи в базу')
+
+    def handle(self, *args, **options):
+        engine = StatsRecomputeEngine(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+
+        def on_chunk(report):
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f"Пачка {report['chunks']}: обработано {report['processed']}, "
+                    f"изменено {report['updated']}, {report['rows_per_second']:.0f} строк/с"
+                )
+
+        report = engine.run(on_chunk=on_chunk)
+
+        action = 'Требуют обновления' if options['dry_run'] else 'Обновлено'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обработано персонажей: {report['processed']}. {action}: {report['updated']}. "
+                f"Время: {report['elapsed']:.2f} с ({report['rows_per_second']:.0f} строк/с)"
+            )
+        )
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from telegram_bot import bot
+from telegram_bot.processing import metrics
+from telegram_bot.testing import FAKE_TOKEN, FakeTelegramRequest, asgi_post, fake_updates
+
+
+class Command(BaseCommand):
+    help = 'Прогоняет записанные или сгенерированные обновления Telegram через вебхук (нагрузочный тест)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Файл с обновлениями: JSON-массив или по одному JSON в строке')
+        parser.add_argument('--generate', type=int, default=0, help='Сгенерировать N обновлений вместо файла')
+        parser.add_argument('--users', type=int, default=100, help='Пользователей в сгенерированных обновлениях')
+        parser.add_argument('--repeat', type=int, default=1, help='Сколько раз повторить набор обновлений')
+        parser.add_argument('--concurrency', type=int, default=20, help='Одновременных запросов')
+        parser.add_argument('--url', help='Отправлять на работающий сервер (иначе - в процессе, с подменой Telegram API)')
+
+    def handle(self, *args, **options):
+        if options['path']:
+            updates = self.load(options['path'])
+        elif options['generate']:
+            updates = list(fake_updates(options['generate'], users=options['users']))
+        else:
+            raise CommandError('Укажите файл с обновлениями или --generate')
+        updates = updates * options['repeat']
+
+        fake_request = None
+        if not options['url']:
+            fake_request = FakeTelegramRequest()
+            bot.use_request_factory(lambda: fake_request, token=settings.TELEGRAM_BOT_TOKEN or FAKE_TOKEN)
+
+        metrics.reset()
+        try:
+            elapsed, statuses = asyncio.run(self.replay(updates, options['concurrency'], options['url']))
+        finally:
+            bot.use_request_factory(None)
+
+        failed = sum(count for status, count in statuses.items() if status != 200)
+        self.stdout.write(self.style.SUCCESS(
+            f"Обновлений: {len(updates)} за {elapsed:.2f} с ({len(updates) / elapsed:.0f} обновлений/с), "
+            f"ошибок HTTP: {failed}"
+        ))
+        if fake_request is not None:
+            self.stdout.write(f"Вызовов Telegram API: {len(fake_request.calls)}")
+            self.write_metrics(metrics.snapshot())
+
+    def write_metrics(self, snapshot):
+        wait = snapshot['wait']
+        self.stdout.write(
+            f"Максимальная очередь: {snapshot['max_queued']}, ожидание в очереди: "
+            f"p50 {wait['p50'] * 1000:.0f} мс, p95 {wait['p95'] * 1000:.0f} мс, макс. {wait['max'] * 1000:.0f} мс"
+        )
+        for name, handler in sorted(snapshot['handlers'].items()):
+            self.stdout.write(
+                f"  {name}: {handler['count']} вызовов, среднее {handler['avg'] * 1000:.1f} мс, "
+                f"p95 {handler['p95'] * 1000:.0f} мс, макс. {handler['max'] * 1000:.0f} мс"
+            )
+
+    def load(self, path):
+        with open(path, encoding='utf-8') as file:
+            content = file.read().strip()
+        if content.startswith('['):
+            return json.loads(content)
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    async def replay(self, updates, concurrency, url):
+        headers = {}
+        if settings.TELEGRAM_WEBHOOK_SECRET:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = settings.TELEGRAM_WEBHOOK_SECRET
+
+        if url:
+            import httpx
+            client = httpx.AsyncClient(timeout=30)
+        else:
+            from twgame.asgi import application
+            path = reverse('game:telegram_webhook')
+            host = settings.ALLOWED_HOSTS[0]
+
+        semaphore = asyncio.Semaphore(concurrency)
+        statuses = {}
+
+        async def send(update):
+            async with semaphore:
+                if url:
+                    status = (await client.post(url, json=update, headers=headers)).status_code
+                else:
+                    status = await asgi_post(application, path, json.dumps(update).encode(), host, headers)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(send(update) for update in updates))
+        finally:
+            if url:
+                await client.aclose()
+        return time.perf_counter() - started, statuses
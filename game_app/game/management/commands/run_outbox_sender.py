@@ -0,0 +1,47 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from telegram_bot.bot import build_application
+from telegram_bot.outbox import OutboxSender
+from telegram_bot.services import OutboxService
+from telegram_bot.testing import FAKE_TOKEN, FakeTelegramRequest
+
+
+class Command(BaseCommand):
+    help = 'Отправляет сообщения из outbox бота (обычно это делает процесс бота)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drain', action='store_true', help='Завершиться, когда очередь опустеет')
+        parser.add_argument('--fake', action='store_true', help='Подменить Telegram API (нагрузочный прогон)')
+        parser.add_argument('--rate', type=float, help='Сообщений в секунду')
+        parser.add_argument('--batch-size', type=int, help='Сообщений в пачке')
+
+    def handle(self, *args, **options):
+        request = FakeTelegramRequest(record=False) if options['fake'] else None
+
+        def on_batch(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Отправлено: {stats['sent']}, повторов: {stats['retried']}, ошибок: {stats['failed']}")
+
+        try:
+            stats = asyncio.run(self.run(request, options, on_batch))
+        except KeyboardInterrupt:
+            self.stdout.write('Отправка остановлена')
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Отправлено: {stats['sent']} за {stats['elapsed']:.1f} с "
+            f"({stats['sent'] / stats['elapsed']:.0f} сообщений/с), отложено: {stats['deferred']}, "
+            f"повторов: {stats['retried']}, ошибок: {stats['failed']}"
+        ))
+        self.stdout.write(f"Outbox: {OutboxService.get_stats()}")
+
+    async def run(self, request, options, on_batch):
+        token = (settings.TELEGRAM_BOT_TOKEN or FAKE_TOKEN) if request is not None else None
+        application = build_application(token=token, request=request, updater=False)
+        async with application:
+            sender = OutboxSender(
+                application.bot, rate=options['rate'], batch_size=options['batch_size'], on_batch=on_batch,
+            )
+            return await sender.run(until_empty=options['drain'])
@@ -0,0 +1,48 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from twitch_integration.worker import FakeEventSource, IRCChatSource, TwitchWorker
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркер Twitch-чата, начисляющий награды зрителям пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--channel', default=settings.TWITCH_CHAT_CHANNEL, help='Канал Twitch')
+        parser.add_argument('--interval', type=float, default=settings.TWITCH_REWARD_FLUSH_INTERVAL,
+                            help='Интервал записи наград в базу, с')
+        parser.add_argument('--fake', action='store_true', help='Случайные события вместо настоящего чата')
+        parser.add_argument('--fake-events', type=int, default=100_000, help='Количество случайных событий')
+        parser.add_argument('--fake-viewers', type=int, default=5000, help='Количество случайных зрителей')
+        parser.add_argument('--fake-rate', type=float, default=0, help='Событий в секунду (0 - без пауз)')
+
+    def handle(self, *args, **options):
+        if options['fake']:
+            source = FakeEventSource(
+                count=options['fake_events'],
+                viewers=options['fake_viewers'],
+                rate=options['fake_rate'],
+            )
+        else:
+            if not (options['channel'] and settings.TWITCH_CHAT_NICK and settings.TWITCH_CHAT_TOKEN):
+                raise CommandError('Укажите TWITCH_CHAT_CHANNEL, TWITCH_CHAT_NICK и TWITCH_CHAT_TOKEN')
+            source = IRCChatSource(options['channel'], settings.TWITCH_CHAT_NICK, settings.TWITCH_CHAT_TOKEN)
+
+        def on_flush(report):
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f"Записано игроков: {report['granted']}, повышений уровня: {len(report['level_ups'])}"
+                )
+
+        worker = TwitchWorker(source, flush_interval=options['interval'], on_flush=on_flush)
+        try:
+            stats = asyncio.run(worker.run())
+        except KeyboardInterrupt:
+            self.stdout.write('Воркер остановлен')
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Событий: {stats['events']} за {stats['elapsed']:.1f} с, записей в базу: {stats['flushes']}, "
+            f"наград игрокам: {stats['granted']}, неизвестных зрителей: {stats['unknown']}"
+        ))
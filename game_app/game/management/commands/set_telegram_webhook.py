@@ -0,0 +1,34 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from telegram import Update
+from telegram_bot.bot import build_application
+
+
+class Command(BaseCommand):
+    help = 'Регистрирует (или удаляет) вебхук Telegram бота'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=settings.TELEGRAM_WEBHOOK_URL, help='Адрес вебхука')
+        parser.add_argument('--delete', action='store_true', help='Удалить вебхук (вернуться к polling)')
+        parser.add_argument('--max-connections', type=int, default=40, help='Одновременных соединений от Telegram')
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        application = build_application(updater=False)
+        async with application:
+            if options['delete']:
+                await application.bot.delete_webhook()
+                self.stdout.write(self.style.SUCCESS('Вебхук удален'))
+                return
+
+            await application.bot.set_webhook(
+                url=options['url'],
+                secret_token=settings.TELEGRAM_WEBHOOK_SECRET or None,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=options['max_connections'],
+            )
+            self.stdout.write(self.style.SUCCESS(f"Вебхук установлен: {options['url']}"))
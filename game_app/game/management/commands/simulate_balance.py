@@ -0,0 +1,77 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from characters.stats import BASE_SKILL
+from game.simulation import BalanceSimulator, stat_splits, TOTAL_SKILL_POINTS
+
+
+class Command(BaseCommand):
+    help = 'Симулирует случайные бои между билдами и выводит винрейты и распределение урона'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--matchups', type=int, default=2_000_000, help='Количество боев')
+        parser.add_argument('--batch-size', type=int, default=500_000, help='Боев в одной пачке')
+        parser.add_argument('--seed', type=int, default=None, help='Seed генератора для воспроизводимости')
+        parser.add_argument('--points', type=int, default=TOTAL_SKILL_POINTS, help='Сумма навыков персонажа')
+        parser.add_argument('--output', help='Сохранить матрицы в .npz файл')
+
+    def handle(self, *args, **options):
+        if options['points'] < 3 * BASE_SKILL:
+            raise CommandError(f'Сумма навыков должна быть не меньше {3 * BASE_SKILL} (по {BASE_SKILL} на навык)')
+        if options['matchups'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError('Количество боев и размер пачки должны быть положительными')
+
+        simulator = BalanceSimulator(
+            splits=stat_splits(options['points']),
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+
+        def on_batch(report):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Проведено боев: {report.matchups} ({report.matchups / report.elapsed:.0f} боев/с)")
+
+        report = simulator.run(options['matchups'], on_batch=on_batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Боев: {report.matchups}, в среднем раундов: {report.rounds / max(report.matchups, 1):.1f}. "
+            f"Время: {report.elapsed:.2f} с ({report.matchups / report.elapsed:.0f} боев/с)"
+        ))
+
+        # Распределения навыков: винрейт и урон за раунд
+        self.stdout.write('\nРаспределение (С/Л/Ж)  винрейт  урон/раунд p10/p50/p90')
+        win_rate = report.split_win_rate
+        dps = report.dps_percentiles()
+        for index in win_rate.argsort()[::-1]:
+            self.stdout.write(
+                f"{report.split_label(index):>20}  {win_rate[index] * 100:6.1f}%  "
+                f"{dps[index, 0]:.0f}/{dps[index, 1]:.0f}/{dps[index, 2]:.0f}"
+            )
+
+        # Предметы по слотам: сводка, а построчно - только с -v 2
+        self.stdout.write('\nСлот  предметов  винрейт min/медиана/max  пустой слот  лучший / худший')
+        for slot, items in report.slot_items.items():
+            item_win_rate = report.item_win_rate(slot)
+            played = np.flatnonzero(report.item_games[slot][1:] > 0) + 1  # строка 0 - пустой слот
+            if len(played):
+                rates = item_win_rate[played]
+                best, worst = played[rates.argmax()], played[rates.argmin()]
+                self.stdout.write(
+                    f"{slot:>10}  {len(items) - 1:>9}  "
+                    f"{rates.min() * 100:.1f}/{np.median(rates) * 100:.1f}/{rates.max() * 100:.1f}%  "
+                    f"{item_win_rate[0] * 100:10.1f}%  "
+                    f"{items.names[best]} ({item_win_rate[best] * 100:.1f}%) / "
+                    f"{items.names[worst]} ({item_win_rate[worst] * 100:.1f}%)"
+                )
+            else:
+                self.stdout.write(f"{slot:>10}  {len(items) - 1:>9}  нет боев с предметами")
+
+        if options['verbosity'] > 1:
+            for slot, items in report.slot_items.items():
+                self.stdout.write(f'\nСлот {slot}: предмет  винрейт')
+                item_win_rate = report.item_win_rate(slot)
+                for index in item_win_rate.argsort()[::-1]:
+                    self.stdout.write(f"{items.names[index]:>30}  {item_win_rate[index] * 100:6.1f}%")
+
+        if options['output']:
+            report.save(options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Матрицы сохранены в {options['output']}"))
@@ -0,0 +1,44 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from items.catalog import item_catalog
+from items.loot import NOTHING, loot_tables
+
+
+class Command(BaseCommand):
+    help = 'Бросает добычу по таблице и сравнивает выпавшие доли с ожидаемыми'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', nargs='?', help='Код таблицы добычи (без него - список таблиц)')
+        parser.add_argument('--count', type=int, default=1_000_000, help='Количество выпадений')
+        parser.add_argument('--seed', type=int, default=None, help='Seed генератора для воспроизводимости')
+
+    def handle(self, *args, **options):
+        if not options['table']:
+            for code in loot_tables.codes():
+                table = loot_tables.get(code)
+                self.stdout.write(f"{code}: {table.name} ({table.source_type}), строк: {len(table.item_ids)}, бросков: {table.rolls}")
+            return
+
+        try:
+            table = loot_tables.get(options['table'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['count'] < 1:
+            raise CommandError('Количество выпадений должно быть положительным')
+
+        rng = np.random.default_rng(options['seed'])
+        started = time.perf_counter()
+        entries = table.sample(options['count'], rng)
+        elapsed = time.perf_counter() - started
+
+        observed = np.bincount(entries, minlength=len(table.item_ids)) / len(entries)
+        self.stdout.write(self.style.SUCCESS(
+            f"Бросков: {len(entries)} за {elapsed:.3f} с ({len(entries) / max(elapsed, 1e-9):.0f} бросков/с)"
+        ))
+        self.stdout.write('\n                          Предмет  ожидается  выпало')
+        for index, (item_id, expected) in enumerate(zip(table.item_ids, table.probabilities)):
+            name = 'ничего' if item_id == NOTHING else str(item_catalog.get(int(item_id), item_id))
+            self.stdout.write(f"{name:>33}  {expected * 100:8.3f}%  {observed[index] * 100:6.3f}%")
@@ -1,9 +1,35 @@
 import logging
 from .models import Player, PlayerProfile, Character, Equipment
+from core.buffers import LastSeenBuffer
+from django.conf import settings
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+# Время последнего входа игроков: в базу - одним UPDATE раз в интервал
+last_seen = LastSeenBuffer(PlayerProfile, 'last_login', key='player_id', interval=settings.LAST_SEEN_FLUSH_INTERVAL)
+
+
+class PlayerSnapshot:
+    """Игрок, его профиль и персонаж (отсутствующие - None), загруженные одним запросом"""
+
+    __slots__ = ('player', 'profile', 'character', 'rank')
+
+    def __init__(self, player, rank=None):
+        self.player = player
+        # select_related кэширует отсутствующие связи, поэтому getattr не делает запросов
+        self.profile = getattr(player, 'profile', None) if player else None
+        self.character = getattr(player, 'character', None) if player else None
+        self.rank = rank
+        if self.profile is not None:
+            # Еще не записанное время входа из буфера
+            self.profile.last_login = last_seen.get(player.id, self.profile.last_login)
+
+    @property
+    def has_character(self):
+        return self.character is not None
+
+
 class PlayerService:
     """Сервис для работы с игроками"""
 
@@ -27,33 +53,24 @@ class PlayerService:
 
             logger.info(f"Player {'created' if created else 'retrieved'}: {player}")
 
-            # Если игрок уже существует, обновляем его данные
-            if not created:
-                updated = False
-                if username and player.username != username:
-                    player.username = username
-                    updated = True
-                if first_name and player.first_name != first_name:
-                    player.first_name = first_name
-                    updated = True
-                if last_name and player.last_name != last_name:
-                    player.last_name = last_name
-                    updated = True
-
-                if updated:
-                    player.save()
-                    logger.info(f"Player {telegram_id} data updated")
-
-            # Создаем профиль, если его нет
             if created:
+                # Новый профиль получает last_login по умолчанию
                 profile = PlayerProfile.objects.create(player=player)
                 logger.info(f"Profile created for player {telegram_id}: {profile}")
+            else:
+                # Обновляем только изменившиеся поля
+                changed = []
+                for field, value in (('username', username), ('first_name', first_name), ('last_name', last_name)):
+                    if value and getattr(player, field) != value:
+                        setattr(player, field, value)
+                        changed.append(field)
+
+                if changed:
+                    player.save(update_fields=[*changed, 'updated_at'])
+                    logger.info(f"Player {telegram_id} data updated: {', '.join(changed)}")
 
-            # Обновляем время последнего входа
-            profile = player.profile
-            profile.last_login = timezone.now()
-            profile.save()
-            logger.info(f"Last login updated for player {telegram_id}")
+                # Время последнего входа пишется в базу пачкой (core.buffers)
+                last_seen.touch(player.id)
 
             return player, created
 
@@ -75,6 +92,26 @@ class PlayerService:
             logger.error(f"Error getting player {telegram_id}: {e}")
             return None
 
+    @staticmethod
+    def _snapshot_queryset(telegram_id):
+        return Player.objects.select_related('profile', 'character').filter(telegram_id=telegram_id)
+
+    @staticmethod
+    def get_player_snapshot(telegram_id, with_rank=False):
+        """
+        Игрок, профиль и персонаж одним запросом с JOIN.
+        with_rank=True - дополнительно место в таблице лидеров.
+        """
+        player = PlayerService._snapshot_queryset(telegram_id).first()
+        rank = PlayerService.get_player_rank(telegram_id) if with_rank and player else None
+        return PlayerSnapshot(player, rank)
+
+    @staticmethod
+    async def aget_player_snapshot(telegram_id):
+        """Асинхронный вариант get_player_snapshot (без места в рейтинге) - без перехода в поток"""
+        player = await PlayerService._snapshot_queryset(telegram_id).afirst()
+        return PlayerSnapshot(player)
+
     @staticmethod
     def get_player_profile(telegram_id):
         """Получить профиль игрока по Telegram ID"""
@@ -82,6 +119,7 @@ class PlayerService:
             player = PlayerService.get_player_by_telegram_id(telegram_id)
             if player:
                 profile = player.profile
+                profile.last_login = last_seen.get(player.id, profile.last_login)
                 logger.info(f"Found profile for player {telegram_id}: {profile}")
                 return profile
             logger.info(f"No profile found for player {telegram_id}")
@@ -115,6 +153,16 @@ class PlayerService:
         profile.save()
         return True
 
+    @staticmethod
+    def get_player_rank(telegram_id):
+        """Место игрока в таблице лидеров (None - игрока нет в рейтинге)"""
+        from accounts.services import PlayerService as AccountPlayerService
+        try:
+            return AccountPlayerService.get_player_rank(telegram_id)
+        except Exception as e:
+            logger.error(f"Error getting rank for player {telegram_id}: {e}")
+            return None
+
     @staticmethod
     def has_character(telegram_id):
         """Проверяет, есть ли у игрока персонаж"""
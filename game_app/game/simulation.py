@@ -0,0 +1,249 @@
+"""
+Монте-Карло симулятор баланса.
+
+Перебирает все допустимые распределения навыков и предметы экипировки,
+случайно сводит билды друг с другом и проводит бои векторно (NumPy) по тем же
+правилам, что и боевой движок (game.combat). Характеристики считаются той же
+функцией compute_stats, что и у персонажей, поэтому после правки
+коэффициентов в characters/stats.py достаточно перезапустить симуляцию.
+"""
+
+import itertools
+import time
+
+import numpy as np
+
+from characters.stats import BASE_SKILL, ITEM_BONUS_FIELDS, compute_stats
+from items.models import Item
+from .combat import CRIT_MULTIPLIER, DEFENSE_FACTOR, MAX_ROUNDS, MIN_DAMAGE
+
+# Сумма навыков при создании персонажа (15 базовых + 5 свободных очков)
+TOTAL_SKILL_POINTS = 20
+
+# Колонки матрицы характеристик билда
+HEALTH, MIN_ATTACK, MAX_ATTACK, DEFENSE, CRIT, DODGE = range(6)
+STAT_COLUMNS = ['max_health', 'min_attack', 'max_attack', 'defense', 'crit_chance', 'dodge_chance']
+
+# Гистограмма урона за раунд
+DPS_BIN_WIDTH = 1
+DPS_MAX = 500
+
+
+def stat_splits(total=TOTAL_SKILL_POINTS, minimum=BASE_SKILL):
+    """Все распределения (сила, ловкость, живучесть) с суммой total и минимумом minimum"""
+    free = total - 3 * minimum
+    if free < 0:
+        raise ValueError('Недостаточно очков навыков')
+    splits = [
+        (minimum + strength, minimum + agility, minimum + free - strength - agility)
+        for strength in range(free + 1)
+        for agility in range(free - strength + 1)
+    ]
+    return np.array(splits, dtype=np.int64)
+
+
+class SlotItems:
+    """Предметы одного слота: названия и матрица бонусов (строка 0 - пустой слот)"""
+
+    def __init__(self, slot, names, bonuses):
+        self.slot = slot
+        self.names = ['—'] + list(names)
+        self.bonuses = np.vstack([np.zeros((1, len(ITEM_BONUS_FIELDS))), np.asarray(bonuses, dtype=np.float64)])
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def load(cls):
+        """Экипируемые предметы из базы, сгруппированные по слотам"""
+        by_slot = {}
+        rows = Item.objects.exclude(equipment_slot='none').order_by('equipment_slot', 'pk').values_list(
+            'equipment_slot', 'name', *ITEM_BONUS_FIELDS
+        )
+        for slot, rows_iter in itertools.groupby(rows, key=lambda row: row[0]):
+            rows_list = list(rows_iter)
+            by_slot[slot] = cls(slot, [row[1] for row in rows_list], [row[2:] for row in rows_list])
+        return by_slot
+
+
+class BalanceReport:
+    """Накопленные результаты симуляции"""
+
+    def __init__(self, splits, slot_items):
+        self.splits = splits
+        self.slot_items = slot_items
+        count = len(splits)
+        self.split_wins = np.zeros((count, count), dtype=np.int64)
+        self.split_games = np.zeros((count, count), dtype=np.int64)
+        self.item_wins = {slot: np.zeros(len(items), dtype=np.int64) for slot, items in slot_items.items()}
+        self.item_games = {slot: np.zeros(len(items), dtype=np.int64) for slot, items in slot_items.items()}
+        self.dps_histogram = np.zeros((count, DPS_MAX // DPS_BIN_WIDTH + 1), dtype=np.int64)
+        self.matchups = 0
+        self.rounds = 0
+        self.elapsed = 0.0
+
+    @property
+    def win_rate_matrix(self):
+        """Доля побед распределения i против распределения j (NaN - не встречались)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.split_wins / self.split_games
+
+    @property
+    def split_win_rate(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.split_wins.sum(axis=1) / self.split_games.sum(axis=1)
+
+    def item_win_rate(self, slot):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.item_wins[slot] / self.item_games[slot]
+
+    def dps_percentiles(self, percentiles=(10, 50, 90)):
+        """Перцентили урона за раунд для каждого распределения: массив (распределения, перцентили)"""
+        cumulative = np.cumsum(self.dps_histogram, axis=1)
+        totals = cumulative[:, -1:]
+        result = np.full((len(self.splits), len(percentiles)), np.nan)
+        for column, percentile in enumerate(percentiles):
+            target = totals[:, 0] * percentile / 100
+            bins = (cumulative < target[:, None]).sum(axis=1)
+            result[:, column] = np.where(totals[:, 0] > 0, bins * DPS_BIN_WIDTH, np.nan)
+        return result
+
+    def split_label(self, index):
+        strength, agility, vitality = self.splits[index]
+        return f'{strength}/{agility}/{vitality}'
+
+    def save(self, path):
+        """Сохранить матрицы в .npz"""
+        arrays = {
+            'splits': self.splits,
+            'win_rate_matrix': self.win_rate_matrix,
+            'split_games': self.split_games,
+            'dps_histogram': self.dps_histogram,
+        }
+        for slot in self.slot_items:
+            arrays[f'item_win_rate_{slot}'] = self.item_win_rate(slot)
+            arrays[f'item_names_{slot}'] = np.array(self.slot_items[slot].names)
+        np.savez_compressed(path, **arrays)
+
+
+class BalanceSimulator:
+    """
+    Векторная симуляция случайных боев между билдами.
+
+    Билд - распределение навыков плюс по одному предмету (или пустому слоту)
+    в каждом слоте. Бои проводятся пачками по batch_size, все бои пачки
+    идут одновременно: на каждом раунде считаются удары только еще живых пар.
+    """
+
+    def __init__(self, slot_items=None, splits=None, seed=None, batch_size=500_000):
+        self.slot_items = SlotItems.load() if slot_items is None else slot_items
+        self.splits = stat_splits() if splits is None else splits
+        self.rng = np.random.default_rng(seed)
+        self.batch_size = batch_size
+
+    def run(self, matchups, on_batch=None):
+        """Провести matchups боев; on_batch(report) вызывается после каждой пачки"""
+        report = BalanceReport(self.splits, self.slot_items)
+        started = time.perf_counter()
+
+        remaining = matchups
+        while remaining > 0:
+            size = min(self.batch_size, remaining)
+            self._run_batch(size, report)
+            remaining -= size
+            report.elapsed = time.perf_counter() - started
+            if on_batch:
+                on_batch(report)
+
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def _sample_builds(self, size):
+        """Случайные билды: индексы распределений, предметов по слотам и матрица характеристик"""
+        split_index = self.rng.integers(len(self.splits), size=size)
+        item_index = {slot: self.rng.integers(len(items), size=size) for slot, items in self.slot_items.items()}
+
+        bonuses = np.zeros((size, len(ITEM_BONUS_FIELDS)))
+        for slot, items in self.slot_items.items():
+            bonuses += items.bonuses[item_index[slot]]
+
+        skills = self.splits[split_index]
+        stats = compute_stats(
+            skills[:, 0], skills[:, 1], skills[:, 2],
+            {field: bonuses[:, column] for column, field in enumerate(ITEM_BONUS_FIELDS)},
+        )
+        matrix = np.column_stack([np.asarray(stats[column], dtype=np.float64) for column in STAT_COLUMNS])
+        # Как и в базе, целочисленные характеристики хранятся целыми
+        for column in (HEALTH, MIN_ATTACK, MAX_ATTACK, DEFENSE):
+            matrix[:, column] = np.rint(matrix[:, column])
+        matrix[:, MAX_ATTACK] = np.maximum(matrix[:, MIN_ATTACK], matrix[:, MAX_ATTACK])
+        return split_index, item_index, matrix
+
+    def _strike(self, attacker, defender):
+        """Урон ударов attacker по defender (векторный аналог combat.strike)"""
+        size = len(attacker)
+        dodged = self.rng.random(size) * 100 < defender[:, DODGE]
+        damage = self.rng.integers(attacker[:, MIN_ATTACK], attacker[:, MAX_ATTACK], endpoint=True).astype(np.float64)
+        crit = self.rng.random(size) * 100 < attacker[:, CRIT]
+        damage = np.where(crit, np.trunc(damage * CRIT_MULTIPLIER), damage)
+        damage = np.maximum(MIN_DAMAGE, np.trunc(damage - defender[:, DEFENSE] * DEFENSE_FACTOR))
+        return np.where(dodged, 0.0, damage)
+
+    def _fight(self, attacker, defender):
+        """Бои пачки: (победил ли атакующий, раунды, урон атакующего, урон защищающегося)"""
+        size = len(attacker)
+        health = np.column_stack([attacker[:, HEALTH], defender[:, HEALTH]])
+        dealt = np.zeros((size, 2))
+        rounds = np.zeros(size, dtype=np.int64)
+        attacker_won = np.zeros(size, dtype=bool)
+
+        active = np.arange(size)
+        for _ in range(MAX_ROUNDS):
+            if not active.size:
+                break
+            rounds[active] += 1
+
+            damage = self._strike(attacker[active], defender[active])
+            health[active, 1] -= damage
+            dealt[active, 0] += damage
+            knocked_out = health[active, 1] <= 0
+            attacker_won[active[knocked_out]] = True
+            active = active[~knocked_out]
+
+            damage = self._strike(defender[active], attacker[active])
+            health[active, 0] -= damage
+            dealt[active, 1] += damage
+            active = active[health[active, 0] > 0]
+
+        # Ничья по раундам: побеждает тот, у кого больше доля здоровья
+        if active.size:
+            shares = health[active] / np.maximum(np.column_stack([attacker[active, HEALTH], defender[active, HEALTH]]), 1)
+            attacker_won[active] = shares[:, 0] > shares[:, 1]
+
+        return attacker_won, rounds, dealt
+
+    def _run_batch(self, size, report):
+        attacker_split, attacker_items, attacker = self._sample_builds(size)
+        defender_split, defender_items, defender = self._sample_builds(size)
+        attacker_won, rounds, dealt = self._fight(attacker, defender)
+        defender_won = ~attacker_won
+
+        # Результаты учитываются с обеих сторон боя
+        splits_count = len(self.splits)
+        for own, other, won in ((attacker_split, defender_split, attacker_won), (defender_split, attacker_split, defender_won)):
+            cell = own * splits_count + other
+            report.split_games += np.bincount(cell, minlength=splits_count ** 2).reshape(splits_count, splits_count)
+            report.split_wins += np.bincount(cell, weights=won, minlength=splits_count ** 2).astype(np.int64).reshape(splits_count, splits_count)
+
+        for slot, items in self.slot_items.items():
+            for own, won in ((attacker_items[slot], attacker_won), (defender_items[slot], defender_won)):
+                report.item_games[slot] += np.bincount(own, minlength=len(items))
+                report.item_wins[slot] += np.bincount(own, weights=won, minlength=len(items)).astype(np.int64)
+
+        bins = report.dps_histogram.shape[1]
+        for column, own in ((0, attacker_split), (1, defender_split)):
+            dps = np.minimum(dealt[:, column] / rounds // DPS_BIN_WIDTH, bins - 1).astype(np.int64)
+            report.dps_histogram += np.bincount(own * bins + dps, minlength=splits_count * bins).reshape(splits_count, bins)
+
+        report.matchups += size
+        report.rounds += int(rounds.sum())
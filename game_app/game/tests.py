@@ -1,3 +1,254 @@
-from django.test import TestCase
+import io
+import json
+import urllib.parse
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Player, PlayerProfile
+from characters.models import Character
+from accounts.session import issue_token
+from core.buffers import LastSeenBuffer
+from core.testing import TEST_BOT_TOKEN, QueryBudgetMixin, seed_world
+from . import models as legacy
+from .combat import CombatEngine, CombatService, FightResult
+from .services import PlayerService
+
+
+@override_settings(TELEGRAM_BOT_TOKEN=TEST_BOT_TOKEN)
+class GamePagesQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Бюджет запросов страниц игры и игровых действий"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.world = seed_world()
+        cls.player = cls.world.player
+        cls.token = issue_token(cls.player.id, cls.player.telegram_id, cls.world.character.id)
+
+    def user_param(self, player):
+        return urllib.parse.quote(json.dumps({
+            'id': player.telegram_id, 'username': player.username, 'first_name': player.first_name,
+        }))
+
+    def post_json(self, url, data, token=None):
+        headers = {'HTTP_X_SESSION_TOKEN': token} if token else {}
+        return self.client.post(url, json.dumps(data), content_type='application/json', **headers)
+
+    def test_welcome(self):
+        with self.assertQueryBudget(0):
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_home_by_session_token(self):
+        # Персонаж с игроком и профилем, инвентарь, экипировка
+        with self.assertQueryBudget(3):
+            response = self.client.get('/', {'session': self.token})
+        self.assertContains(response, self.world.character.name)
+
+    @override_settings(TELEGRAM_LEGACY_AUTH=True)
+    def test_home_by_user_param(self):
+        # Игрок (get_or_create), персонаж с профилем, инвентарь, экипировка
+        with self.assertQueryBudget(4):
+            response = self.client.get('/?user=' + self.user_param(self.player))
+        self.assertContains(response, self.world.character.name)
+
+    def test_legacy_auth_disabled(self):
+        # Без TELEGRAM_LEGACY_AUTH ?user= и telegram_id в теле запроса не дают войти
+        response = self.client.get('/?user=' + self.user_param(self.player))
+        self.assertTemplateUsed(response, 'game/welcome.html')
+        response = self.post_json('/api/equip-item/', {
+            'telegram_id': self.player.telegram_id, 'item_id': self.world.items[2].id,
+        })
+        self.assertFalse(response.json()['success'])
+
+    def test_home_without_character(self):
+        player = Player.objects.create(telegram_id=1, first_name='Новичок')
+        PlayerProfile.objects.create(player=player)
+        token = issue_token(player.id, player.telegram_id)
+        with self.assertQueryBudget(2):
+            response = self.client.get('/', {'session': token})
+        self.assertContains(response, '/api/create-character/')
+
+    def test_create_character(self):
+        player = Player.objects.create(telegram_id=1, first_name='Новичок')
+        PlayerProfile.objects.create(player=player)
+        token = issue_token(player.id, player.telegram_id)
+        # Проверка имени, игрок, проверка персонажа, INSERT
+        with self.assertQueryBudget(4):
+            response = self.post_json('/api/create-character/', {
+                'name': 'Новый герой', 'strength': 10, 'agility': 5, 'vitality': 5,
+            }, token)
+        self.assertTrue(response.json()['success'])
+
+    def test_equip_item(self):
+        # LoadoutService.equip_item в пустой слот (4 запроса в SQLite, 3 на PostgreSQL), SAVEPOINT и RELEASE
+        with self.assertQueryBudget(6):
+            response = self.post_json('/api/equip-item/', {'item_id': self.world.items[2].id}, self.token)
+        self.assertTrue(response.json()['success'])
+
+    def test_unequip_item(self):
+        # LoadoutService.unequip_item (4 запроса в SQLite, 3 на PostgreSQL), SAVEPOINT и RELEASE
+        with self.assertQueryBudget(6):
+            response = self.post_json('/api/unequip-item/', {'slot': 'weapon'}, self.token)
+        self.assertTrue(response.json()['success'])
+
+
+class SimulateBalanceCommandTests(TestCase):
+
+    def test_invalid_arguments(self):
+        for arguments in (['--points', '14'], ['--matchups', '0'], ['--batch-size', '-1']):
+            with self.assertRaises(CommandError):
+                call_command('simulate_balance', *arguments)
+
+    def test_item_rows_only_with_verbosity(self):
+        seed_world()
+        options = {'matchups': 2000, 'batch_size': 1000, 'seed': 1}
+
+        out = io.StringIO()
+        call_command('simulate_balance', stdout=out, **options)
+        self.assertIn('Предмет weapon (', out.getvalue())
+        self.assertNotIn('Слот weapon: предмет', out.getvalue())
+
+        out = io.StringIO()
+        call_command('simulate_balance', stdout=out, verbosity=2, **options)
+        self.assertIn('Слот weapon: предмет', out.getvalue())
+
+
+class CombatEngineTests(TestCase):
+
+    def setUp(self):
+        self.characters = []
+        for index in range(4):
+            player = Player.objects.create(telegram_id=900 + index, first_name=f'Боец {index}')
+            PlayerProfile.objects.create(player=player)
+            self.characters.append(Character.objects.create(player=player, name=f'Боец {index}', strength=5 + index * 3))
+        self.ids = [character.id for character in self.characters]
+
+    def profile_stats(self, character):
+        return tuple(PlayerProfile.objects.filter(player_id=character.player_id).values_list(
+            'wins', 'losses', 'total_games',
+        ).get())
+
+    def fight_key(self, result):
+        return (result.attacker_id, result.defender_id, result.winner_id, result.rounds, result.seed, result.health_left)
+
+    def test_seed_determinism(self):
+        pairs = [(self.ids[0], self.ids[1]), (self.ids[2], self.ids[3]), (self.ids[1], self.ids[3])] * 5
+        first = CombatEngine(seed=7, record=False).resolve(pairs)
+        second = CombatEngine(seed=7, record=False).resolve(pairs)
+        self.assertEqual([self.fight_key(result) for result in first], [self.fight_key(result) for result in second])
+        self.assertEqual(len({result.seed for result in first}), len(first))
+
+        # Повтор по снимку бойцов не зависит от изменений персонажа после боя
+        Character.objects.filter(pk=self.ids[0]).update(max_health=1, min_attack=1, max_attack=1)
+        with self.assertNumQueries(0):
+            replayed = CombatEngine.replay(first[0])
+        self.assertEqual(self.fight_key(replayed), self.fight_key(first[0]))
+
+    def test_skips_self_and_missing_fighters(self):
+        pairs = [(self.ids[0], self.ids[0]), (self.ids[0], 10**9), (self.ids[0], self.ids[1])]
+        with self.assertLogs('game.combat', 'WARNING') as logs:
+            results = CombatEngine(seed=1, record=False).resolve(pairs)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual([(result.attacker_id, result.defender_id) for result in results], [(self.ids[0], self.ids[1])])
+        self.assertIsInstance(results[0], FightResult)
+
+    def test_record_results_groups_updates(self):
+        pairs = [(self.ids[0], self.ids[1]), (self.ids[0], self.ids[2]), (self.ids[1], self.ids[2]), (self.ids[3], self.ids[0])]
+        engine = CombatEngine(seed=3, record=False)
+        results = engine.resolve(pairs)
+
+        expected = {character_id: [0, 0] for character_id in self.ids}
+        for result in results:
+            expected[result.winner_id][0] += 1
+            expected[result.loser_id][1] += 1
+        groups = {tuple(deltas) for deltas in expected.values()}
+
+        snapshots = {result.attacker_id: result.attacker for result in results}
+        snapshots.update({result.defender_id: result.defender for result in results})
+        # Один UPDATE на каждую пару (побед, поражений) плюс SAVEPOINT и RELEASE
+        with self.assertNumQueries(len(groups) + 2):
+            updated = CombatEngine.record_results(results, snapshots)
+        self.assertEqual(updated, len(self.ids))
+        for character in self.characters:
+            wins, losses = expected[character.id]
+            self.assertEqual(self.profile_stats(character), (wins, losses, wins + losses))
+
+    def test_fight_service(self):
+        result = CombatService.fight(self.characters[0].player.telegram_id, self.ids[1], seed=5)
+        self.assertEqual((result.attacker_id, result.defender_id), (self.ids[0], self.ids[1]))
+        self.assertEqual(self.profile_stats(self.characters[0])[2], 1)
+        self.assertEqual(self.profile_stats(self.characters[1])[2], 1)
+
+        telegram_id = self.characters[0].player.telegram_id
+        for opponent_id, message in ((self.ids[0], 'Нельзя сражаться с самим собой'), ('abc', 'Противник не найден')):
+            with self.assertRaisesMessage(ValueError, message):
+                CombatService.fight(telegram_id, opponent_id)
+        with self.assertRaisesMessage(ValueError, 'Персонаж не найден'):
+            CombatService.fight(1, self.ids[1])
+
+    @override_settings(TELEGRAM_BOT_TOKEN=TEST_BOT_TOKEN)
+    def test_fight_api(self):
+        attacker = self.characters[0]
+        token = issue_token(attacker.player_id, attacker.player.telegram_id, attacker.id)
+        response = self.client.post(
+            '/api/game/fight/', json.dumps({'opponent': self.ids[2]}), content_type='application/json',
+            HTTP_X_SESSION_TOKEN=token,
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertEqual(data['attacker']['character_id'], attacker.id)
+        self.assertIn(data['winner_id'], (attacker.id, self.ids[2]))
+        self.assertEqual(self.profile_stats(attacker)[2], 1)
+
+
+class PlayerSnapshotTests(TestCase):
+    """Снимок игрока (таблицы game.models): игрок, профиль и персонаж одним запросом"""
+
+    def setUp(self):
+        self.player = legacy.Player.objects.create(telegram_id=950, first_name='Игрок')
+        legacy.PlayerProfile.objects.create(player=self.player, level=3)
+        # save() прежней модели вызывает calculate_stats, которая падает (бонусы используются до присваивания)
+        legacy.Character.objects.bulk_create([legacy.Character(player=self.player, name='Герой')])
+        self.without_character = legacy.Player.objects.create(telegram_id=951, first_name='Новичок')
+        legacy.PlayerProfile.objects.create(player=self.without_character)
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            snapshot = PlayerService.get_player_snapshot(950)
+            self.assertEqual(snapshot.player.pk, self.player.pk)
+            self.assertEqual(snapshot.profile.level, 3)
+            self.assertEqual(snapshot.character.name, 'Герой')
+            self.assertTrue(snapshot.has_character)
+
+        with self.assertNumQueries(1):
+            snapshot = PlayerService.get_player_snapshot(951)
+            self.assertIsNotNone(snapshot.profile)
+            self.assertIsNone(snapshot.character)
+            self.assertFalse(snapshot.has_character)
+
+    def test_async_one_query(self):
+        with self.assertNumQueries(1):
+            snapshot = async_to_sync(PlayerService.aget_player_snapshot)(950)
+            self.assertEqual((snapshot.profile.level, snapshot.character.name), (3, 'Герой'))
+
+    def test_missing_player(self):
+        # Рейтинг для отсутствующего игрока не запрашивается
+        with self.assertNumQueries(1):
+            snapshot = PlayerService.get_player_snapshot(999, with_rank=True)
+        self.assertEqual((snapshot.player, snapshot.profile, snapshot.character, snapshot.rank), (None, None, None, None))
+        self.assertFalse(snapshot.has_character)
+        with self.assertNumQueries(1):
+            self.assertIsNone(async_to_sync(PlayerService.aget_player_snapshot)(999).player)
+
+    def test_buffered_last_login(self):
+        buffer = LastSeenBuffer(legacy.PlayerProfile, 'last_login', key='player_id', interval=3600)
+        self.addCleanup(buffer.stop)
+        seen_at = timezone.now() + timedelta(minutes=5)
+        buffer.touch(self.player.pk, seen_at)
+        with mock.patch('game.services.last_seen', buffer), self.assertNumQueries(1):
+            self.assertEqual(PlayerService.get_player_snapshot(950).profile.last_login, seen_at)
@@ -7,7 +7,10 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('api/status/', views.api_status, name='api_status'),
     path('api/telegram/webhook/', views.telegram_webhook, name='telegram_webhook'),
+    path('api/session/', views.create_session, name='create_session'),
     path('api/create-character/', views.create_character, name='create_character'),
+    path('api/equip-item/', views.equip_item, name='equip_item'),
+    path('api/unequip-item/', views.unequip_item, name='unequip_item'),
 
     # Twitch OAuth
     path('auth/twitch/', views.twitch_auth, name='twitch_auth'),
@@ -1,17 +1,33 @@
+import hmac
+import logging
+
+from django.conf import settings
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_POST
 from accounts.services import PlayerService
+from accounts.session import TOKEN_HEADER, TOKEN_PARAM, get_request_telegram_id, get_session, issue_token
+from characters.services import LoadoutService
 import json
 
+logger = logging.getLogger(__name__)
+
 # Create your views here.
 
 @require_GET
 def home(request):
     """Главная страница игры"""
-    # Проверяем, авторизован ли пользователь через Telegram
-    telegram_user = request.GET.get('user')
+    # Игрок из токена сессии Mini App - без get_or_create_player
+    try:
+        session = get_session(request)
+    except ValueError as e:
+        return render(request, 'game/error.html', {'error_message': str(e)})
+    if session is not None:
+        return render_session_home(request, session)
+
+    # Прежний вход по ?user= без проверки подписи - только если включен TELEGRAM_LEGACY_AUTH
+    telegram_user = request.GET.get('user') if settings.TELEGRAM_LEGACY_AUTH else None
     if not telegram_user:
         # Если пользователь не авторизован, показываем стартовую страницу
         return render(request, 'game/welcome.html', {
@@ -36,55 +52,15 @@ def home(request):
                 last_name=user_data.get('last_name')
             )
 
-            # Проверяем, есть ли у пользователя персонаж
-            has_character = PlayerService.has_character(telegram_id)
+            # Персонаж вместе с игроком и профилем - одним запросом
+            character = PlayerService.get_character(telegram_id)
 
-            if has_character:
+            if character:
                 # Персонаж есть - показываем игровое меню
-                character = PlayerService.get_character(telegram_id)
-                profile = PlayerService.get_player_profile(telegram_id)
-
-                # Вычисляем прогресс до следующего уровня
-                next_level_exp = character.level * 100
-                progress_percentage = (character.experience / next_level_exp * 100) if next_level_exp > 0 else 0
-
-                # Автоматически создаем слоты экипировки для персонажа, если их нет
-                from characters.models import Equipment
-                if not character.equipment.exists():
-                    Equipment.objects.create(character=character, slot='weapon')
-                    Equipment.objects.create(character=character, slot='torso')
-
-                # Получаем инвентарь игрока
-                inventory = player.inventory.all().select_related('item') if hasattr(player, 'inventory') else []
-                equipment = PlayerService.get_character_equipment(character)
-
-                # Получаем экипировку персонажа
-                equipment = character.equipment.all().select_related('item') if hasattr(character, 'equipment') else []
-
-                return render(request, 'game/game.html', {
-                    'game_name': 'TwGame',
-                    'version': '0.1.0',
-                    'character': character,
-                    'profile': profile,
-                    'player': player,
-                    'next_level_exp': next_level_exp,
-                    'progress_percentage': progress_percentage,
-                    'inventory': inventory,
-                    'equipment': equipment,
-                })
+                return render_game(request, player, character, getattr(character.player, 'profile', None))
             else:
                 # Персонажа нет - показываем страницу создания персонажа
-                skill_info = PlayerService.get_skill_info()
-
-                # Конвертируем user_data в JSON для безопасной передачи в JavaScript
-                telegram_user_json = json.dumps(user_data, ensure_ascii=False)
-
-                return render(request, 'game/create_character.html', {
-                    'game_name': 'TwGame',
-                    'version': '0.1.0',
-                    'skill_info': skill_info,
-                    'telegram_user_json': telegram_user_json,
-                })
+                return render_create_character(request, user_data)
         else:
             return render(request, 'game/error.html', {
                 'error_message': 'Неверные данные пользователя Telegram'
@@ -95,6 +71,85 @@ def home(request):
             'error_message': f'Ошибка обработки данных: {str(e)}'
         })
 
+
+def render_session_home(request, session):
+    """Главная страница по токену сессии: персонаж, игрок и профиль одним запросом"""
+    session_token = request.META.get(TOKEN_HEADER) or request.GET.get(TOKEN_PARAM)
+    character = PlayerService.get_session_character(session)
+    if character is not None:
+        player = character.player
+        return render_game(request, player, character, getattr(player, 'profile', None), session_token)
+
+    player = PlayerService.get_session_player(session)
+    user_data = {
+        'id': player.telegram_id,
+        'username': player.username,
+        'first_name': player.first_name,
+        'last_name': player.last_name,
+    }
+    return render_create_character(request, user_data, session_token)
+
+
+def render_game(request, player, character, profile, session_token=None):
+    """Игровое меню"""
+    # Вычисляем прогресс до следующего уровня
+    next_level_exp = character.level * 100
+    progress_percentage = (character.experience / next_level_exp * 100) if next_level_exp > 0 else 0
+
+    # Получаем инвентарь игрока
+    inventory = PlayerService.get_player_inventory(player)
+
+    # Получаем экипировку персонажа (все слоты одним запросом)
+    equipment = PlayerService.get_character_equipment(character)
+
+    return render(request, 'game/game.html', {
+        'game_name': 'TwGame',
+        'version': '0.1.0',
+        'character': character,
+        'profile': profile,
+        'player': player,
+        'next_level_exp': next_level_exp,
+        'progress_percentage': progress_percentage,
+        'inventory': inventory,
+        'equipment': equipment,
+        'session_token': session_token,
+    })
+
+
+def render_create_character(request, user_data, session_token=None):
+    """Страница создания персонажа"""
+    skill_info = PlayerService.get_skill_info()
+
+    # Конвертируем user_data в JSON для безопасной передачи в JavaScript
+    telegram_user_json = json.dumps(user_data, ensure_ascii=False)
+
+    return render(request, 'game/create_character.html', {
+        'game_name': 'TwGame',
+        'version': '0.1.0',
+        'skill_info': skill_info,
+        'telegram_user_json': telegram_user_json,
+        'session_token': session_token,
+    })
+
+
+@csrf_exempt
+@require_POST
+def create_session(request):
+    """Вход в Mini App: проверка initData Telegram и выдача токена сессии"""
+    try:
+        data = json.loads(request.body)
+        token, has_character = PlayerService.start_session(data.get('init_data'))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=403)
+
+    return JsonResponse({
+        'success': True,
+        'token': token,
+        'has_character': has_character,
+        'expires_in': settings.SESSION_TOKEN_MAX_AGE,
+    })
+
+
 @csrf_exempt
 @require_POST
 def create_character(request):
@@ -103,7 +158,8 @@ def create_character(request):
         import json
         data = json.loads(request.body)
 
-        telegram_id = data.get('telegram_id')
+        session = get_session(request)
+        telegram_id = get_request_telegram_id(request, data.get('telegram_id'))
         character_name = data.get('name')
         strength = int(data.get('strength', 5))
         agility = int(data.get('agility', 5))
@@ -137,6 +193,8 @@ def create_character(request):
         if character:
             return JsonResponse({
                 'success': True,
+                # Новый токен сессии уже с персонажем
+                'session_token': issue_token(session.player_id, session.telegram_id, character.id) if session else None,
                 'character': {
                     'id': character.id,
                     'name': character.name,
@@ -165,15 +223,25 @@ def api_status(request):
 
 @csrf_exempt
 @require_POST
-def telegram_webhook(request):
-    """Обработка вебхуков от Telegram"""
+async def telegram_webhook(request):
+    """Обработка вебхуков от Telegram теми же обработчиками, что и в режиме polling"""
+    from telegram_bot.bot import process_update_data
+
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    if secret and not hmac.compare_digest(request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), secret):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+
     try:
-        import json
         data = json.loads(request.body)
-        # Обработка данных от Telegram
-        return JsonResponse({'status': 'ok'})
+    except ValueError:
+        return JsonResponse({'error': 'invalid json'}, status=400)
+
+    try:
+        await process_update_data(data)
     except Exception as e:
-        return JsonResponse({'error': str(e)})
+        # Отвечаем 200, иначе Telegram будет повторять обновление
+        logger.error(f"Ошибка при обработке обновления Telegram: {e}")
+    return JsonResponse({'status': 'ok'})
 
 
 # Admin Panel Views
@@ -551,15 +619,25 @@ def api_status(request):
 
 @csrf_exempt
 @require_POST
-def telegram_webhook(request):
-    """Обработка вебхуков от Telegram"""
+async def telegram_webhook(request):
+    """Обработка вебхуков от Telegram теми же обработчиками, что и в режиме polling"""
+    from telegram_bot.bot import process_update_data
+
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    if secret and not hmac.compare_digest(request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), secret):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+
     try:
-        import json
         data = json.loads(request.body)
-        # Обработка данных от Telegram
-        return JsonResponse({'status': 'ok'})
+    except ValueError:
+        return JsonResponse({'error': 'invalid json'}, status=400)
+
+    try:
+        await process_update_data(data)
     except Exception as e:
-        return JsonResponse({'error': str(e)})
+        # Отвечаем 200, иначе Telegram будет повторять обновление
+        logger.error(f"Ошибка при обработке обновления Telegram: {e}")
+    return JsonResponse({'status': 'ok'})
 
 
 @csrf_exempt
@@ -567,52 +645,21 @@ def telegram_webhook(request):
 def equip_item(request):
     """Экипировка предмета"""
     try:
-        import json
         data = json.loads(request.body)
 
-        telegram_id = data.get('telegram_id')
+        telegram_id = get_request_telegram_id(request, data.get('telegram_id'))
         item_id = data.get('item_id')
         slot = data.get('slot')
 
-        if not all([telegram_id, item_id, slot]):
+        if not all([telegram_id, item_id]):
             return JsonResponse({'success': False, 'error': 'Отсутствуют необходимые данные'})
 
-        # Получаем персонажа
-        character = PlayerService.get_character(telegram_id)
-        if not character:
-            return JsonResponse({'success': False, 'error': 'Персонаж не найден'})
-
-        # Получаем предмет из инвентаря
-        inventory_item = Inventory.objects.filter(player__telegram_id=telegram_id, item_id=item_id).first()
-        if not inventory_item:
-            return JsonResponse({'success': False, 'error': 'Предмет не найден в инвентаре'})
-
-        # Получаем экипировку персонажа
-        equipment = PlayerService.get_character_equipment(character)
-
-        # Экипируем предмет
-        if slot == 'weapon':
-            equipment.weapon = inventory_item.item
-        elif slot == 'torso':
-            equipment.torso = inventory_item.item
-        else:
-            return JsonResponse({'success': False, 'error': 'Неверный слот'})
-
-        equipment.save()
-
-        # Уменьшаем количество предметов в инвентаре
-        inventory_item.quantity -= 1
-        if inventory_item.quantity <= 0:
-            inventory_item.delete()
-        else:
-            inventory_item.save()
-
-        # Пересчитываем характеристики персонажа
-        character.save()
+        # Снятие старого предмета, списание из инвентаря и пересчет - одной транзакцией
+        LoadoutService.equip_item(telegram_id, item_id, slot)
 
         return JsonResponse({'success': True})
 
-    except Exception as e:
+    except ValueError as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
 
@@ -621,37 +668,18 @@ def equip_item(request):
 def unequip_item(request):
     """Снятие предмета с экипировки"""
     try:
-        import json
         data = json.loads(request.body)
 
-        telegram_id = data.get('telegram_id')
+        telegram_id = get_request_telegram_id(request, data.get('telegram_id'))
         slot = data.get('slot')
 
         if not all([telegram_id, slot]):
             return JsonResponse({'success': False, 'error': 'Отсутствуют необходимые данные'})
 
-        # Получаем персонажа
-        character = PlayerService.get_character(telegram_id)
-        if not character:
-            return JsonResponse({'success': False, 'error': 'Персонаж не найден'})
-
-        # Получаем экипировку персонажа
-        equipment = PlayerService.get_character_equipment(character)
-
-        # Снимаем предмет из слота
-        if slot == 'weapon':
-            equipment.weapon = None
-        elif slot == 'torso':
-            equipment.torso = None
-        else:
-            return JsonResponse({'success': False, 'error': 'Неверный слот'})
-
-        equipment.save()
-
-        # Пересчитываем характеристики персонажа
-        character.save()
+        # Предмет возвращается в инвентарь, характеристики пересчитываются
+        LoadoutService.unequip_item(telegram_id, slot)
 
         return JsonResponse({'success': True})
 
-    except Exception as e:
+    except ValueError as e:
         return JsonResponse({'success': False, 'error': str(e)})
\ No newline at end of file
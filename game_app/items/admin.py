@@ -1,18 +1,18 @@
 from django.contrib import admin
-from .models import Item, Inventory
+from .models import Item, Inventory, LootTable, LootTableEntry
 
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
     list_display = ['name', 'rarity', 'item_type', 'equipment_slot', 'value', 'is_equippable', 'is_active']
     list_filter = ['rarity', 'item_type', 'equipment_slot', 'is_active', 'created_at']
-    search_fields = ['name', 'description']
+    search_fields = ['name', 'code', 'description']
     readonly_fields = ['created_at']
     ordering = ['name']
 
     fieldsets = (
         ('Основная информация', {
-            'fields': ('name', 'description')
+            'fields': ('name', 'code', 'description')
         }),
         ('Свойства предмета', {
             'fields': ('item_type', 'equipment_slot', 'rarity', 'is_active')
@@ -43,3 +43,20 @@ class InventoryAdmin(admin.ModelAdmin):
     search_fields = ['player__username', 'player__first_name', 'item__name']
     readonly_fields = ['obtained_at', 'total_value']
     ordering = ['-obtained_at']
+
+
+class LootTableEntryInline(admin.TabularInline):
+    model = LootTableEntry
+    extra = 1
+    autocomplete_fields = ['item']
+    fields = ['item', 'weight', 'min_quantity', 'max_quantity']
+
+
+@admin.register(LootTable)
+class LootTableAdmin(admin.ModelAdmin):
+    list_display = ['name', 'code', 'source_type', 'rolls', 'is_active', 'updated_at']
+    list_filter = ['source_type', 'is_active']
+    search_fields = ['name', 'code']
+    readonly_fields = ['created_at', 'updated_at']
+    ordering = ['code']
+    inlines = [LootTableEntryInline]
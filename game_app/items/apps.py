@@ -4,3 +4,23 @@ from django.apps import AppConfig
 class ItemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'items'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .catalog import item_catalog
+        from .loot import loot_tables
+        from .models import Item, LootTable, LootTableEntry
+
+        def invalidate_catalog(sender, **kwargs):
+            item_catalog.invalidate()
+
+        post_save.connect(invalidate_catalog, sender=Item, weak=False, dispatch_uid='items.catalog')
+        post_delete.connect(invalidate_catalog, sender=Item, weak=False, dispatch_uid='items.catalog')
+
+        def invalidate_loot_tables(sender, **kwargs):
+            loot_tables.invalidate()
+
+        for model in (LootTable, LootTableEntry):
+            post_save.connect(invalidate_loot_tables, sender=model, weak=False, dispatch_uid='items.loot_tables')
+            post_delete.connect(invalidate_loot_tables, sender=model, weak=False, dispatch_uid='items.loot_tables')
@@ -0,0 +1,128 @@
+"""
+Каталог предметов в памяти процесса.
+
+Предметы меняются редко, а нужны почти везде: в инвентаре, экипировке,
+сериализаторах API. Каталог держит неизменяемый снимок всех предметов
+(CatalogItem со __slots__) с индексами по редкости и слоту, поэтому
+строки инвентаря и экипировки читаются без JOIN с items_item, а
+предмет подставляется из каталога (item_catalog.attach).
+
+Снимок перечитывается, когда меняется версия 'item_catalog'
+(core.versioning): при сохранении или удалении Item через ORM. После
+массовых изменений (bulk_create, queryset.update) нужно вызвать
+item_catalog.invalidate().
+"""
+
+from django.conf import settings
+from django.db import models
+
+from characters.stats import ITEM_BONUS_FIELDS
+from core.versioning import VersionedCache
+from .models import Item
+
+ITEM_FIELDS = tuple(field.attname for field in Item._meta.concrete_fields)
+RARITY_NAMES = dict(Item.RARITIES)
+
+
+class CatalogItem:
+    """
+    Предмет из каталога: те же поля, что у Item, только для чтения.
+    bonus_vector - бонусы в порядке ITEM_BONUS_FIELDS.
+    """
+
+    __slots__ = ITEM_FIELDS + ('bonus_vector', 'rarity_display')
+
+    def __init__(self, values):
+        for name, value in zip(ITEM_FIELDS, values):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, 'bonus_vector', tuple(getattr(self, field) for field in ITEM_BONUS_FIELDS))
+        object.__setattr__(self, 'rarity_display', RARITY_NAMES.get(self.rarity, self.rarity))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Предмет каталога только для чтения')
+
+    def __str__(self):
+        return f"{self.rarity_display} {self.name}"
+
+    def __repr__(self):
+        return f"<CatalogItem {self.id}: {self.name}>"
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def is_equippable(self):
+        return self.equipment_slot != 'none'
+
+    def get_rarity_display(self):
+        return self.rarity_display
+
+
+class CatalogSnapshot:
+    __slots__ = ('items', 'by_rarity', 'by_slot')
+
+    def __init__(self, items):
+        self.items = items
+        by_rarity = {}
+        by_slot = {}
+        for item in items.values():
+            by_rarity.setdefault(item.rarity, []).append(item)
+            by_slot.setdefault(item.equipment_slot, []).append(item)
+        self.by_rarity = {rarity: tuple(group) for rarity, group in by_rarity.items()}
+        self.by_slot = {slot: tuple(group) for slot, group in by_slot.items()}
+
+
+class ItemCatalog(VersionedCache):
+    """Все предметы (в том числе неактивные - они могут лежать в инвентаре) по id"""
+
+    def load(self):
+        rows = Item.objects.order_by('pk').values_list(*ITEM_FIELDS)
+        return CatalogSnapshot({values[0]: CatalogItem(values) for values in rows.iterator(chunk_size=5000)})
+
+    def get(self, item_id, default=None):
+        return self.data.items.get(item_id, default)
+
+    def get_many(self, item_ids):
+        """{id: предмет} для найденных id; если каких-то нет - сначала сверить версию"""
+        items = self.data.items
+        if any(item_id not in items for item_id in item_ids):
+            self.refresh()
+            items = self.data.items
+        return {item_id: items[item_id] for item_id in item_ids if item_id in items}
+
+    def __getitem__(self, item_id):
+        return self.data.items[item_id]
+
+    def __len__(self):
+        return len(self.data.items)
+
+    def by_rarity(self, rarity):
+        return self.data.by_rarity.get(rarity, ())
+
+    def by_slot(self, slot):
+        return self.data.by_slot.get(slot, ())
+
+    def attach(self, rows, field='item'):
+        """
+        Подставить предметы каталога в строки с внешним ключом на Item (вместо select_related).
+        Принимает объект или итерируемое (queryset), возвращает объект или список.
+        """
+        single = isinstance(rows, models.Model)
+        rows = [rows] if single else list(rows)
+        if rows:
+            foreign_key = rows[0]._meta.get_field(field)
+            items = self.data.items
+            missing = {getattr(row, foreign_key.attname) for row in rows} - items.keys() - {None}
+            if missing:
+                # Предмет создан в другом процессе после сверки версии
+                self.refresh()
+                items = self.data.items
+            for row in rows:
+                item = items.get(getattr(row, foreign_key.attname))
+                if item is not None:
+                    foreign_key.set_cached_value(row, item)
+        return rows[0] if single else rows
+
+
+item_catalog = ItemCatalog('item_catalog', check_interval=settings.CACHE_VERSION_CHECK_INTERVAL)
@@ -0,0 +1,264 @@
+"""
+Процедурный генератор каталога предметов.
+
+Каталог - детерминированный перебор сочетаний уровня, префикса, суффикса,
+базы (оружие, броня по слотам, аксессуары) и редкости. У каждого предмета постоянный
+код (natural key), а характеристики берутся из генератора случайных чисел
+с зерном от кода, поэтому повторный запуск дает те же предметы и
+обновляет их на месте (upsert по Item.code), а не создает дубликаты.
+Первые предметы перебора (уровень 1 без аффиксов) - прежние базовые
+предметы create_items.
+"""
+
+import itertools
+import random
+import time
+import zlib
+
+from django.db import transaction
+
+from characters.stats import StatsRecomputeEngine
+from .catalog import item_catalog
+from .models import Item
+
+RARITY_ORDER = ['gray', 'green', 'blue', 'epic', 'legendary']
+
+# Сколько первичных и вторичных характеристик получает предмет редкости
+RARITY_STATS = {
+    'gray': {'secondary': 1},
+    'green': {'primary': 1, 'secondary': 1},
+    'blue': {'primary': 1, 'secondary': 2},
+    'epic': {'primary': 2, 'secondary': 2},
+    'legendary': {'primary': 3, 'secondary': 2},
+}
+
+RARITY_MODIFIERS = {
+    'gray': {'stat_mult': 0.5, 'value_mult': 1},
+    'green': {'stat_mult': 1, 'value_mult': 2},
+    'blue': {'stat_mult': 1.5, 'value_mult': 5},
+    'epic': {'stat_mult': 2, 'value_mult': 15},
+    'legendary': {'stat_mult': 3, 'value_mult': 50},
+}
+
+PRIMARY_STATS = ['strength', 'agility', 'vitality']
+SECONDARY_STATS = ['crit_chance', 'dodge_chance']
+
+# Базы: код, название, тип, слот, базовые бонусы и цена
+BASES = [
+    ('sword', 'Меч', 'weapon', 'weapon', {'attack_bonus': 5}, 10),
+    ('axe', 'Топор', 'weapon', 'weapon', {'attack_bonus': 8}, 15),
+    ('hammer', 'Молот', 'weapon', 'weapon', {'attack_bonus': 6}, 12),
+    ('dagger', 'Кинжал', 'weapon', 'weapon', {'attack_bonus': 4}, 8),
+    ('staff', 'Посох', 'weapon', 'weapon', {'attack_bonus': 3}, 20),
+    ('jacket', 'Куртка', 'armor', 'torso', {'defense_bonus': 2, 'health_bonus': 10}, 15),
+    ('breastplate', 'Нагрудник', 'armor', 'torso', {'defense_bonus': 4, 'health_bonus': 20}, 25),
+    ('plate', 'Латы', 'armor', 'torso', {'defense_bonus': 6, 'health_bonus': 30}, 40),
+    ('robe', 'Роба', 'armor', 'torso', {'defense_bonus': 1, 'health_bonus': 5}, 12),
+    ('helmet', 'Шлем', 'armor', 'head', {'defense_bonus': 2, 'health_bonus': 8}, 14),
+    ('hood', 'Капюшон', 'armor', 'head', {'defense_bonus': 1, 'health_bonus': 5}, 10),
+    ('gauntlets', 'Рукавицы', 'armor', 'hands', {'defense_bonus': 2, 'attack_bonus': 1}, 12),
+    ('gloves', 'Перчатки', 'armor', 'hands', {'defense_bonus': 1, 'attack_bonus': 1}, 9),
+    ('greaves', 'Поножи', 'armor', 'legs', {'defense_bonus': 3, 'health_bonus': 12}, 16),
+    ('trousers', 'Штаны', 'armor', 'legs', {'defense_bonus': 1, 'health_bonus': 6}, 10),
+    ('boots', 'Сапоги', 'armor', 'feet', {'defense_bonus': 2, 'health_bonus': 6}, 12),
+    ('sandals', 'Сандалии', 'armor', 'feet', {'defense_bonus': 1, 'health_bonus': 3}, 8),
+    ('ring', 'Кольцо', 'misc', 'accessory', {'health_bonus': 5}, 30),
+    ('amulet', 'Амулет', 'misc', 'accessory', {'health_bonus': 8}, 35),
+    ('talisman', 'Талисман', 'misc', 'accessory', {'attack_bonus': 1, 'health_bonus': 4}, 32),
+]
+
+# Аффиксы: код, часть названия, бонусы на первом уровне
+PREFIXES = [
+    (None, '', {}),
+    ('sturdy', 'Крепкий', {'defense_bonus': 1}),
+    ('sharp', 'Острый', {'attack_bonus': 2}),
+    ('heavy', 'Тяжелый', {'strength_bonus': 1, 'attack_bonus': 1}),
+    ('light', 'Легкий', {'agility_bonus': 1}),
+    ('vital', 'Живой', {'vitality_bonus': 1, 'health_bonus': 5}),
+    ('ancient', 'Древний', {'strength_bonus': 1, 'vitality_bonus': 1}),
+    ('cursed', 'Проклятый', {'attack_bonus': 3, 'health_bonus': -5}),
+    ('blessed', 'Благословенный', {'health_bonus': 10}),
+    ('swift', 'Быстрый', {'agility_bonus': 1, 'dodge_chance_bonus': 0.5}),
+    ('brutal', 'Жестокий', {'attack_bonus': 2, 'crit_chance_bonus': 0.5}),
+    ('guarding', 'Охраняющий', {'defense_bonus': 2}),
+    ('royal', 'Королевский', {'strength_bonus': 1, 'agility_bonus': 1, 'vitality_bonus': 1}),
+    ('shadow', 'Теневой', {'dodge_chance_bonus': 1.0}),
+    ('fiery', 'Огненный', {'attack_bonus': 2, 'strength_bonus': 1}),
+    ('icy', 'Ледяной', {'defense_bonus': 1, 'vitality_bonus': 1}),
+    ('storm', 'Грозовой', {'crit_chance_bonus': 1.0}),
+]
+
+SUFFIXES = [
+    (None, '', {}),
+    ('of-bear', 'медведя', {'strength_bonus': 2}),
+    ('of-fox', 'лисы', {'agility_bonus': 2}),
+    ('of-oak', 'дуба', {'vitality_bonus': 2}),
+    ('of-wolf', 'волка', {'strength_bonus': 1, 'agility_bonus': 1}),
+    ('of-hawk', 'ястреба', {'crit_chance_bonus': 1.0}),
+    ('of-cat', 'кошки', {'dodge_chance_bonus': 1.0}),
+    ('of-giant', 'великана', {'health_bonus': 15}),
+    ('of-turtle', 'черепахи', {'defense_bonus': 2}),
+    ('of-viper', 'гадюки', {'attack_bonus': 1, 'crit_chance_bonus': 0.5}),
+    ('of-dawn', 'рассвета', {'vitality_bonus': 1, 'health_bonus': 5}),
+    ('of-dusk', 'сумерек', {'agility_bonus': 1, 'dodge_chance_bonus': 0.5}),
+    ('of-king', 'короля', {'strength_bonus': 1, 'vitality_bonus': 1}),
+    ('of-hunter', 'охотника', {'attack_bonus': 2}),
+    ('of-sage', 'мудреца', {'vitality_bonus': 1, 'defense_bonus': 1}),
+    ('of-berserk', 'берсерка', {'attack_bonus': 3, 'defense_bonus': -1}),
+    ('of-stars', 'звезд', {'crit_chance_bonus': 0.5, 'dodge_chance_bonus': 0.5}),
+]
+
+GOLD_COIN = {
+    'code': 'gold-coin',
+    'name': 'Золотая монета',
+    'description': 'Ценная золотая монета',
+    'item_type': 'resource',
+    'equipment_slot': 'none',
+    'rarity': 'gray',
+    'value': 1,
+    'stackable': True,
+    'max_stack': 999,
+}
+
+# Поля, которые генератор задает и обновляет при повторном запуске
+GENERATED_FIELDS = [
+    'name', 'description', 'item_type', 'equipment_slot', 'rarity',
+    'strength_bonus', 'agility_bonus', 'vitality_bonus', 'attack_bonus', 'defense_bonus', 'health_bonus',
+    'crit_chance_bonus', 'dodge_chance_bonus', 'value', 'stackable', 'max_stack',
+]
+
+ITEMS_PER_LEVEL = len(BASES) * len(RARITY_ORDER) * len(PREFIXES) * len(SUFFIXES)
+BASE_ITEMS = len(BASES) * len(RARITY_ORDER)
+
+
+def item_code(base, rarity, level=1, prefix=None, suffix=None):
+    parts = [base, rarity] + [part for part in (prefix, suffix) if part]
+    if level > 1:
+        parts.append(f'l{level}')
+    return '-'.join(parts)
+
+
+def iter_specs(count):
+    """Первые count сочетаний (уровень, база, редкость, префикс, суффикс) в постоянном порядке"""
+    # Сначала предметы без аффиксов, затем с одним и с двумя: первые BASE_ITEMS - базовые
+    affixes = sorted(
+        itertools.product(PREFIXES, SUFFIXES),
+        key=lambda pair: (pair[0][0] is not None) + (pair[1][0] is not None),
+    )
+    produced = 0
+    for level in itertools.count(1):
+        for prefix, suffix in affixes:
+            for base in BASES:
+                for rarity in RARITY_ORDER:
+                    if produced >= count:
+                        return
+                    yield level, base, rarity, prefix, suffix
+                    produced += 1
+
+
+def build_item(level, base, rarity, prefix, suffix, seed=0):
+    """Несохраненный Item; одинаковые аргументы дают одинаковый предмет"""
+    base_code, base_name, item_type, slot, base_bonuses, base_value = base
+    code = item_code(base_code, rarity, level, prefix[0], suffix[0])
+    modifier = RARITY_MODIFIERS[rarity]
+    stats = RARITY_STATS[rarity]
+    # Уровень усиливает характеристики на 50% за ступень
+    multiplier = modifier['stat_mult'] * (1 + 0.5 * (level - 1))
+    rng = random.Random(zlib.crc32(code.encode()) ^ seed)
+
+    values = {field: 0 for field in GENERATED_FIELDS if field.endswith('_bonus')}
+    for field, bonus in base_bonuses.items():
+        values[field] += int(bonus * multiplier)
+    for stat in rng.sample(PRIMARY_STATS, stats.get('primary', 0)):
+        values[f'{stat}_bonus'] += int(rng.randint(1, 3) * multiplier)
+    for stat in rng.sample(SECONDARY_STATS, stats.get('secondary', 0)):
+        values[f'{stat}_bonus'] = round(values[f'{stat}_bonus'] + rng.uniform(0.5, 2.0) * multiplier, 1)
+    for _, _, bonuses in (prefix, suffix):
+        for field, bonus in bonuses.items():
+            values[field] += bonus * level if isinstance(bonus, int) else round(bonus * level, 1)
+
+    name = ' '.join(part for part in (prefix[1], rarity.title(), base_name, suffix[1]) if part)
+    if level > 1:
+        name = f'{name} +{level - 1}'
+    affix_count = (prefix[0] is not None) + (suffix[0] is not None)
+
+    return Item(
+        code=code,
+        name=name,
+        description=f'Предмет редкости {rarity}',
+        item_type=item_type,
+        equipment_slot=slot,
+        rarity=rarity,
+        value=int(base_value * modifier['value_mult'] * level * (1 + affix_count)),
+        stackable=False,
+        max_stack=1,
+        **values,
+    )
+
+
+class CatalogGenerator:
+    """Запись сгенерированного каталога пачками bulk_create(update_conflicts=True)"""
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, count, seed=0, batch_size=BATCH_SIZE):
+        if count < 0:
+            raise ValueError('Количество предметов не может быть отрицательным')
+        self.count = count
+        self.seed = seed
+        self.batch_size = batch_size
+
+    def items(self):
+        yield Item(**GOLD_COIN)
+        for spec in iter_specs(self.count):
+            yield build_item(*spec, seed=self.seed)
+
+    @staticmethod
+    def adopt_legacy(items):
+        """
+        Присвоить коды предметам, созданным прежней версией create_items (без кода, поиск по названию),
+        чтобы upsert обновил их, а не создал дубликаты.
+        """
+        codes = {item.name: item.code for item in items}
+        legacy = list(Item.objects.filter(code__isnull=True, name__in=codes).order_by('pk'))
+        adopted = []
+        for item in legacy:
+            if codes.get(item.name):
+                item.code = codes.pop(item.name)
+                adopted.append(item)
+        Item.objects.bulk_update(adopted, ['code'])
+        return len(adopted)
+
+    def run(self, on_batch=None):
+        """
+        Записать каталог; on_batch(записано, секунд) вызывается после каждой пачки.
+
+        Upsert меняет бонусы существующих предметов без сигналов, поэтому в той же
+        транзакции пересчитываются персонажи, на которых надеты предметы пачки.
+        Возвращает (записано, создано новых, адаптировано прежних, пересчитано персонажей, секунд).
+        """
+        started = time.perf_counter()
+        items_before = Item.objects.count()
+        written = adopted = recomputed = 0
+        engine = StatsRecomputeEngine()
+        items = self.items()
+        try:
+            while batch := list(itertools.islice(items, self.batch_size)):
+                with transaction.atomic():
+                    if written < BASE_ITEMS + 1:
+                        adopted += self.adopt_legacy(batch)
+                    Item.objects.bulk_create(
+                        batch,
+                        update_conflicts=True,
+                        unique_fields=['code'],
+                        update_fields=GENERATED_FIELDS,
+                    )
+                    codes = [item.code for item in batch]
+                    recomputed += engine.run_for_items(Item.objects.filter(code__in=codes))['updated']
+                written += len(batch)
+                if on_batch:
+                    on_batch(written, time.perf_counter() - started)
+        finally:
+            # bulk_create не отправляет сигналы - каталог сбрасывается явно
+            item_catalog.invalidate()
+        return written, Item.objects.count() - items_before, adopted, recomputed, time.perf_counter() - started
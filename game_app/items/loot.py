@@ -0,0 +1,140 @@
+"""
+Таблицы добычи с выборкой за O(1).
+
+Каждая активная LootTable компилируется в AliasSampler (метод псевдонимов
+Уокера в варианте Воуза): построение O(n) по числу строк таблицы, а
+каждый бросок - одно случайное целое и одно случайное число независимо от
+размера таблицы. Броски делаются пачками на NumPy: тысячи выпадений за
+один вызов, с воспроизводимым генератором (seed).
+
+Скомпилированные таблицы держатся в памяти процесса и перечитываются,
+когда меняется версия 'loot_tables' (core.versioning): при сохранении или
+удалении LootTable и LootTableEntry через ORM.
+"""
+
+import numpy as np
+from django.conf import settings
+
+from core.versioning import VersionedCache
+from .models import LootTable, LootTableEntry
+
+# item_id строки "ничего не выпало"
+NOTHING = -1
+
+
+class AliasSampler:
+    """Выборка индекса с вероятностью, пропорциональной весу (строки с нулевым весом не выпадают)"""
+
+    __slots__ = ('prob', 'alias', 'indexes', 'size')
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim != 1 or not len(weights):
+            raise ValueError('Нужен хотя бы один вес')
+        if not np.isfinite(weights).all() or (weights < 0).any():
+            raise ValueError('Веса должны быть неотрицательными числами')
+        # Таблица строится только по положительным весам: нулевой вес не может
+        # получить вероятность из-за погрешности округления
+        indexes = np.flatnonzero(weights > 0)
+        if not len(indexes):
+            raise ValueError('Нужен хотя бы один положительный вес')
+
+        size = len(indexes)
+        scaled = weights[indexes] * size / weights[indexes].sum()
+        prob = np.ones(size, dtype=np.float64)
+        alias = np.arange(size, dtype=np.int64)
+        small = [index for index in range(size) if scaled[index] < 1.0]
+        large = [index for index in range(size) if scaled[index] >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Остатки - погрешность округления, их вероятность 1
+
+        self.prob = prob
+        self.alias = alias
+        self.indexes = indexes
+        self.size = size
+
+    def sample(self, count, rng):
+        """count индексов весов: столбец выбирается равновероятно, затем он сам или его псевдоним"""
+        columns = rng.integers(self.size, size=count)
+        accepted = rng.random(count) < self.prob[columns]
+        return self.indexes[np.where(accepted, columns, self.alias[columns])]
+
+
+class CompiledLootTable:
+    """Таблица добычи, готовая к броскам"""
+
+    __slots__ = ('code', 'name', 'source_type', 'rolls', 'item_ids', 'min_quantity', 'max_quantity', 'weights', 'sampler')
+
+    def __init__(self, table, entries):
+        self.code = table['code']
+        self.name = table['name']
+        self.source_type = table['source_type']
+        self.rolls = table['rolls']
+        self.item_ids = np.array([NOTHING if item_id is None else item_id for item_id, *_ in entries], dtype=np.int64)
+        self.weights = np.array([weight for _, weight, _, _ in entries], dtype=np.float64)
+        self.min_quantity = np.array([low for _, _, low, _ in entries], dtype=np.int64)
+        self.max_quantity = np.array([high for _, _, _, high in entries], dtype=np.int64)
+        self.sampler = AliasSampler(self.weights)
+
+    @property
+    def probabilities(self):
+        """Вероятность каждой строки за один бросок"""
+        return self.weights / self.weights.sum()
+
+    def sample(self, count, rng):
+        """Индексы строк для count выпадений (по rolls бросков на выпадение)"""
+        return self.sampler.sample(count * self.rolls, rng)
+
+    def roll(self, count, rng):
+        """
+        Бросить добычу для count выпадений.
+        Возвращает (номер выпадения, item_id, количество) - массивы без пустых бросков.
+        """
+        entries = self.sample(count, rng)
+        drops = np.arange(len(entries)) // self.rolls
+        item_ids = self.item_ids[entries]
+        quantities = rng.integers(self.min_quantity[entries], self.max_quantity[entries], endpoint=True)
+        found = item_ids != NOTHING
+        return drops[found], item_ids[found], quantities[found]
+
+
+class LootTables(VersionedCache):
+    """Активные таблицы добычи по коду"""
+
+    def load(self):
+        tables = {row['id']: row for row in LootTable.objects.filter(is_active=True).values(
+            'id', 'code', 'name', 'source_type', 'rolls',
+        )}
+        entries = {}
+        rows = LootTableEntry.objects.filter(table_id__in=tables).order_by('pk').values_list(
+            'table_id', 'item_id', 'weight', 'min_quantity', 'max_quantity',
+        )
+        for table_id, *entry in rows:
+            entries.setdefault(table_id, []).append(entry)
+        # Таблица без строк с положительным весом не компилируется: бросать по ней нечего
+        return {
+            table['code']: CompiledLootTable(table, entries[table_id])
+            for table_id, table in tables.items()
+            if any(weight > 0 for _, weight, _, _ in entries.get(table_id, ()))
+        }
+
+    def get(self, code):
+        """Скомпилированная таблица; ValueError, если нет активной таблицы со строками"""
+        table = self.data.get(code)
+        if table is None:
+            raise ValueError(f"Таблица добычи {code} не найдена")
+        return table
+
+    def __contains__(self, code):
+        return code in self.data
+
+    def codes(self):
+        return sorted(self.data)
+
+
+loot_tables = LootTables('loot_tables', check_interval=settings.CACHE_VERSION_CHECK_INTERVAL)
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('items', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventory',
+            name='player',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='accounts.player', verbose_name='Игрок'),
+        ),
+    ]
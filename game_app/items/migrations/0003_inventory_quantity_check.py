@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:16
+
+from django.db import migrations, models
+
+
+def delete_empty_stacks(apps, schema_editor):
+    """Строки с нулевым или отрицательным количеством - пустые стопки"""
+    Inventory = apps.get_model('items', 'Inventory')
+    Inventory.objects.filter(quantity__lte=0).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_player_twitch_id_index'),
+        ('items', '0002_inventory_player_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_empty_stacks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='inventory',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gte', 0)), name='inventory_quantity_non_negative'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0003_inventory_quantity_check'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LootTable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(max_length=100, unique=True, verbose_name='Код')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('source_type', models.CharField(choices=[('monster', 'Монстр'), ('chest', 'Сундук'), ('twitch', 'Награда Twitch'), ('quest', 'Задание'), ('other', 'Другое')], default='other', max_length=20, verbose_name='Источник')),
+                ('rolls', models.PositiveSmallIntegerField(default=1, verbose_name='Бросков за выпадение')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активна')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Таблица добычи',
+                'verbose_name_plural': 'Таблицы добычи',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LootTableEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.FloatField(default=1.0, verbose_name='Вес')),
+                ('min_quantity', models.PositiveIntegerField(default=1, verbose_name='Минимум')),
+                ('max_quantity', models.PositiveIntegerField(default=1, verbose_name='Максимум')),
+                ('item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='items.item', verbose_name='Предмет')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='items.loottable', verbose_name='Таблица')),
+            ],
+            options={
+                'verbose_name': 'Строка таблицы добычи',
+                'verbose_name_plural': 'Строки таблиц добычи',
+                'constraints': [models.CheckConstraint(condition=models.Q(('weight__gt', 0)), name='loot_entry_weight_positive'), models.CheckConstraint(condition=models.Q(('max_quantity__gte', models.F('min_quantity')), ('min_quantity__gte', 1)), name='loot_entry_quantity_range')],
+            },
+        ),
+    ]
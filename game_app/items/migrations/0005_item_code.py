@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0004_loot_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='code',
+            field=models.SlugField(blank=True, max_length=100, null=True, unique=True, verbose_name='Код'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0005_item_code'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='loottableentry',
+            name='loot_entry_weight_positive',
+        ),
+        migrations.AddConstraint(
+            model_name='loottableentry',
+            constraint=models.CheckConstraint(condition=models.Q(('weight__gte', 0)), name='loot_entry_weight_non_negative'),
+        ),
+    ]
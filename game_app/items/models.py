@@ -36,6 +36,8 @@ class Item(models.Model):
     ]
 
     name = models.CharField(max_length=100, verbose_name="Название предмета")
+    # Постоянный ключ сгенерированного предмета (create_items), у созданных вручную может не быть
+    code = models.SlugField(max_length=100, unique=True, null=True, blank=True, verbose_name="Код")
     description = models.TextField(blank=True, verbose_name="Описание")
 
     item_type = models.CharField(max_length=20, choices=ITEM_TYPES, default='misc', verbose_name="Тип предмета")
@@ -81,7 +83,7 @@ class Item(models.Model):
 class Inventory(models.Model):
     """Инвентарь игрока"""
 
-    player = models.OneToOneField('accounts.Player', on_delete=models.CASCADE, related_name='inventory', verbose_name="Игрок")
+    player = models.ForeignKey('accounts.Player', on_delete=models.CASCADE, related_name='inventory', verbose_name="Игрок")
     item = models.ForeignKey(Item, on_delete=models.CASCADE, verbose_name="Предмет")
     quantity = models.IntegerField(default=1, verbose_name="Количество")
 
@@ -93,6 +95,9 @@ class Inventory(models.Model):
         verbose_name_plural = "Инвентари"
         unique_together = ['player', 'item']  # Один предмет - одно место в инвентаре
         ordering = ['-obtained_at']
+        constraints = [
+            models.CheckConstraint(condition=models.Q(quantity__gte=0), name='inventory_quantity_non_negative'),
+        ]
 
     def __str__(self):
         return f"{self.player} - {self.item.name} x{self.quantity}"
@@ -101,3 +106,58 @@ class Inventory(models.Model):
     def total_value(self):
         """Общая стоимость предметов"""
         return self.item.value * self.quantity
+
+
+class LootTable(models.Model):
+    """Таблица добычи источника: монстра, сундука, награды на стриме"""
+
+    SOURCE_TYPES = [
+        ('monster', 'Монстр'),
+        ('chest', 'Сундук'),
+        ('twitch', 'Награда Twitch'),
+        ('quest', 'Задание'),
+        ('other', 'Другое'),
+    ]
+
+    code = models.SlugField(max_length=100, unique=True, verbose_name="Код")
+    name = models.CharField(max_length=100, verbose_name="Название")
+    source_type = models.CharField(max_length=20, choices=SOURCE_TYPES, default='other', verbose_name="Источник")
+    rolls = models.PositiveSmallIntegerField(default=1, verbose_name="Бросков за выпадение")
+
+    is_active = models.BooleanField(default=True, verbose_name="Активна")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Таблица добычи"
+        verbose_name_plural = "Таблицы добычи"
+        ordering = ['code']
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
+
+class LootTableEntry(models.Model):
+    """Строка таблицы добычи: предмет (или ничего), вес и количество"""
+
+    table = models.ForeignKey(LootTable, on_delete=models.CASCADE, related_name='entries', verbose_name="Таблица")
+    # Пустой предмет - бросок без добычи
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Предмет")
+    # Нулевой вес - строка отключена и не выпадает
+    weight = models.FloatField(default=1.0, verbose_name="Вес")
+    min_quantity = models.PositiveIntegerField(default=1, verbose_name="Минимум")
+    max_quantity = models.PositiveIntegerField(default=1, verbose_name="Максимум")
+
+    class Meta:
+        verbose_name = "Строка таблицы добычи"
+        verbose_name_plural = "Строки таблиц добычи"
+        constraints = [
+            models.CheckConstraint(condition=models.Q(weight__gte=0), name='loot_entry_weight_non_negative'),
+            models.CheckConstraint(
+                condition=models.Q(min_quantity__gte=1, max_quantity__gte=models.F('min_quantity')),
+                name='loot_entry_quantity_range',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.table.code}: {self.item.name if self.item_id else 'ничего'} ({self.weight})"
@@ -0,0 +1,212 @@
+from collections import defaultdict
+
+import numpy as np
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .catalog import item_catalog
+from .loot import loot_tables
+from .models import Inventory
+
+
+def count_items(items):
+    """Суммировать количества: items - {item_id: количество} или пары (item_id, количество)"""
+    totals = defaultdict(int)
+    for item_id, quantity in (items.items() if isinstance(items, dict) else items):
+        if quantity <= 0:
+            raise ValueError('Количество предметов должно быть положительным')
+        totals[item_id] += quantity
+    return totals
+
+
+class InventoryService:
+    """
+    Сервис для работы с инвентарем игрока.
+
+    У игрока одна строка на предмет (уникальный индекс player, item), количество
+    в строке ограничено стопкой: max_stack для складываемых предметов, 1 для остальных.
+    """
+
+    # Строк в одном INSERT ... ON CONFLICT или UPDATE
+    BATCH_SIZE = 500
+
+    @staticmethod
+    def stack_limit(item):
+        """Сколько экземпляров предмета помещается в инвентарь"""
+        return max(item.max_stack, 1) if item.stackable else 1
+
+    @staticmethod
+    def get_stack_limits(item_ids):
+        """Лимиты стопок по каталогу предметов; ValueError, если предмета нет"""
+        items = item_catalog.get_many(item_ids)
+        missing = set(item_ids) - items.keys()
+        if missing:
+            raise ValueError(f"Предметы не найдены: {', '.join(map(str, sorted(missing)))}")
+        return {item_id: InventoryService.stack_limit(item) for item_id, item in items.items()}
+
+    @staticmethod
+    def add_item(player_id, item_id, quantity=1, enforce_stack=True):
+        """Добавить предметы в инвентарь одним запросом; возвращает количество после добавления"""
+        return InventoryService.add_items(player_id, {item_id: quantity}, enforce_stack)[item_id]
+
+    @staticmethod
+    def add_items(player_id, items, enforce_stack=True):
+        """
+        Добавить игроку несколько предметов: items - {item_id: количество} или пары.
+        Возвращает {item_id: количество после добавления}.
+        """
+        rows = [(player_id, item_id, quantity) for item_id, quantity in count_items(items).items()]
+        result = InventoryService.add_items_bulk(rows, enforce_stack)
+        return {item_id: quantity for (_, item_id), quantity in result.items()}
+
+    @staticmethod
+    def add_items_bulk(rows, enforce_stack=True):
+        """
+        Добавить предметы нескольким игрокам: rows - (player_id, item_id, количество).
+
+        Одинаковые пары игрок-предмет суммируются, на каждые BATCH_SIZE строк -
+        один INSERT ... ON CONFLICT (player_id, item_id) DO UPDATE. Количество
+        ограничивается лимитом стопки (CASE по item_id): что сверх лимита, не
+        добавляется. enforce_stack=False - без лимита (например, предмет
+        возвращается в инвентарь из экипировки).
+        Возвращает {(player_id, item_id): количество после добавления}.
+        """
+        totals = defaultdict(int)
+        for player_id, item_id, quantity in rows:
+            if quantity <= 0:
+                raise ValueError('Количество предметов должно быть положительным')
+            totals[(player_id, item_id)] += quantity
+        if not totals:
+            return {}
+
+        limits = InventoryService.get_stack_limits({item_id for _, item_id in totals}) if enforce_stack else {}
+        table = connection.ops.quote_name(Inventory._meta.db_table)
+        returning = connection.features.can_return_rows_from_bulk_insert
+        now = timezone.now()
+        keys = list(totals)
+        result = {}
+
+        # Без точки сохранения: один INSERT атомарен сам по себе, пачки - в общей транзакции
+        with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+            for start in range(0, len(keys), InventoryService.BATCH_SIZE):
+                batch = keys[start:start + InventoryService.BATCH_SIZE]
+                params = []
+                for player_id, item_id in batch:
+                    quantity = totals[(player_id, item_id)]
+                    params += [player_id, item_id, min(quantity, limits[item_id]) if enforce_stack else quantity, now]
+
+                quantity = f'{table}.quantity + excluded.quantity'
+                if enforce_stack:
+                    item_ids = sorted({item_id for _, item_id in batch})
+                    limit = 'CASE excluded.item_id ' + ' '.join('WHEN %s THEN %s' for _ in item_ids) + ' END'
+                    limit_params = [value for item_id in item_ids for value in (item_id, limits[item_id])]
+                    quantity = f'CASE WHEN {quantity} > {limit} THEN {limit} ELSE {quantity} END'
+                    params += limit_params * 2
+
+                cursor.execute(
+                    f'INSERT INTO {table} (player_id, item_id, quantity, obtained_at) VALUES '
+                    + ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+                    + f' ON CONFLICT (player_id, item_id) DO UPDATE SET quantity = {quantity}'
+                    + (' RETURNING player_id, item_id, quantity' if returning else ''),
+                    params,
+                )
+                if returning:
+                    result.update(((player_id, item_id), quantity) for player_id, item_id, quantity in cursor.fetchall())
+
+        if not returning:
+            condition = Q()
+            for player_id, item_id in keys:
+                condition |= Q(player_id=player_id, item_id=item_id)
+            rows = Inventory.objects.filter(condition).values_list('player_id', 'item_id', 'quantity')
+            result = {(player_id, item_id): quantity for player_id, item_id, quantity in rows}
+        return result
+
+    @staticmethod
+    def remove_items(player_id, items):
+        """
+        Забрать у игрока несколько предметов: items - {item_id: количество} или пары.
+
+        Все или ничего: если какого-то предмета не хватает - ValueError, инвентарь
+        не меняется. На каждые BATCH_SIZE предметов - один UPDATE с CASE по item_id,
+        опустевшие строки удаляются одним DELETE.
+        """
+        totals = count_items(items)
+        rows = Inventory.objects.filter(player_id=player_id)
+        item_ids = list(totals)
+
+        with transaction.atomic():
+            for start in range(0, len(item_ids), InventoryService.BATCH_SIZE):
+                batch = item_ids[start:start + InventoryService.BATCH_SIZE]
+                enough = Q()
+                for item_id in batch:
+                    enough |= Q(item_id=item_id, quantity__gte=totals[item_id])
+                taken = rows.filter(enough).update(quantity=F('quantity') - Case(
+                    *(When(item_id=item_id, then=Value(totals[item_id])) for item_id in batch),
+                    output_field=IntegerField(),
+                ))
+                if taken != len(batch):
+                    raise ValueError('Недостаточно предметов в инвентаре')
+            rows.filter(item_id__in=item_ids, quantity__lte=0).delete()
+
+    @staticmethod
+    def take_item(player_id, item_id, quantity=1, current_quantity=None):
+        """
+        Забрать предметы из инвентаря условным запросом.
+
+        Если известно текущее количество (current_quantity), хватает одного запроса:
+        последняя стопка удаляется, иначе количество уменьшается. Если строка
+        успела измениться или предметов не хватает - ValueError.
+        """
+        rows = Inventory.objects.filter(player_id=player_id, item_id=item_id)
+
+        if current_quantity is not None and current_quantity < quantity:
+            raise ValueError('Недостаточно предметов в инвентаре')
+
+        if current_quantity == quantity:
+            taken, _ = rows.filter(quantity=quantity).delete()
+        else:
+            taken = rows.filter(quantity__gte=quantity).update(quantity=F('quantity') - quantity)
+            if taken and current_quantity is None:
+                rows.filter(quantity__lte=0).delete()
+
+        if not taken:
+            raise ValueError('Предмет не найден в инвентаре')
+
+
+class LootService:
+    """Выпадение добычи по таблицам (items.loot)"""
+
+    @staticmethod
+    def roll(table_code, count=1, seed=None):
+        """
+        Бросить добычу count раз без записи в инвентарь (для симуляций и предпросмотра).
+        seed - число или np.random.Generator. Возвращает массивы (номер выпадения, item_id, количество).
+        """
+        if count < 1:
+            raise ValueError('Количество выпадений должно быть положительным')
+        return loot_tables.get(table_code).roll(count, np.random.default_rng(seed))
+
+    @staticmethod
+    def drop(table_code, player_ids, seed=None):
+        """
+        Выдать добычу: по одному выпадению на каждый элемент player_ids (игрок
+        может повторяться - например, победил нескольких монстров).
+
+        Броски делаются одной пачкой, одинаковые пары игрок-предмет суммируются
+        и пишутся в инвентарь InventoryService.add_items_bulk (с лимитом стопок).
+        Возвращает [(player_id, item_id, выпавшее количество)].
+        """
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+        if not len(player_ids):
+            return []
+        drops, item_ids, quantities = LootService.roll(table_code, len(player_ids), seed)
+        if not len(drops):
+            return []
+
+        pairs, index = np.unique(np.stack([player_ids[drops], item_ids], axis=1), axis=0, return_inverse=True)
+        totals = np.bincount(index.ravel(), weights=quantities).astype(np.int64)
+        rows = [(int(player_id), int(item_id), int(quantity)) for (player_id, item_id), quantity in zip(pairs, totals)]
+        InventoryService.add_items_bulk(rows)
+        return rows
@@ -1,3 +1,274 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+
+from accounts.models import Player
+from characters.models import Character, Equipment
+from characters.services import LoadoutService
+from characters.stats import ITEM_BONUS_FIELDS
+from core.testing import QueryBudgetMixin
+from core.versioning import get_version
+from .catalog import CatalogItem, ItemCatalog, item_catalog
+from .generator import BASE_ITEMS, CatalogGenerator
+from .loot import AliasSampler, loot_tables
+from .models import Inventory, Item, LootTable, LootTableEntry
+from .services import InventoryService, LootService
+
+
+class InventoryServiceTests(TestCase):
+
+    def setUp(self):
+        self.player = Player.objects.create(telegram_id=610, first_name='Игрок')
+        self.other = Player.objects.create(telegram_id=611, first_name='Другой')
+        self.potion = Item.objects.create(name='Зелье', item_type='consumable', stackable=True, max_stack=10)
+        self.ore = Item.objects.create(name='Руда', item_type='resource', stackable=True, max_stack=50)
+        self.sword = Item.objects.create(name='Меч', item_type='weapon', equipment_slot='weapon')
+
+    def quantities(self, player):
+        return dict(Inventory.objects.filter(player=player).values_list('item_id', 'quantity'))
+
+    def test_stack_limit_clamps_quantity(self):
+        self.assertEqual(InventoryService.add_item(self.player.id, self.potion.id, 7), 7)
+        # Сверх max_stack не добавляется - ни в новой строке, ни в существующей
+        self.assertEqual(InventoryService.add_item(self.player.id, self.potion.id, 7), 10)
+        self.assertEqual(InventoryService.add_item(self.other.id, self.potion.id, 25), 10)
+        self.assertEqual(InventoryService.add_item(self.player.id, self.potion.id, 5, enforce_stack=False), 15)
+
+    def test_non_stackable_item(self):
+        self.assertEqual(InventoryService.add_item(self.player.id, self.sword.id, 3), 1)
+        self.assertEqual(InventoryService.add_item(self.player.id, self.sword.id), 1)
+        self.assertEqual(self.quantities(self.player), {self.sword.id: 1})
+
+    def test_bulk_add_sums_duplicates(self):
+        result = InventoryService.add_items_bulk([
+            (self.player.id, self.ore.id, 20),
+            (self.other.id, self.ore.id, 5),
+            (self.player.id, self.ore.id, 20),
+            (self.player.id, self.potion.id, 4),
+            (self.player.id, self.potion.id, 8),
+        ])
+        self.assertEqual(result, {
+            (self.player.id, self.ore.id): 40,
+            (self.other.id, self.ore.id): 5,
+            (self.player.id, self.potion.id): 10,
+        })
+        self.assertEqual(InventoryService.add_items(self.player.id, [(self.ore.id, 6), (self.ore.id, 6)]), {self.ore.id: 50})
+
+    def test_add_rejects_unknown_item_and_bad_quantity(self):
+        with self.assertRaises(ValueError):
+            InventoryService.add_item(self.player.id, self.sword.id + 1000)
+        with self.assertRaises(ValueError):
+            InventoryService.add_item(self.player.id, self.potion.id, 0)
+        self.assertEqual(self.quantities(self.player), {})
+
+    def test_remove_items(self):
+        InventoryService.add_items(self.player.id, {self.potion.id: 5, self.ore.id: 10, self.sword.id: 1})
+        InventoryService.remove_items(self.player.id, [(self.potion.id, 2), (self.potion.id, 3), (self.ore.id, 4)])
+        # Опустевшая стопка удаляется
+        self.assertEqual(self.quantities(self.player), {self.ore.id: 6, self.sword.id: 1})
+
+    def test_remove_partial_stock_changes_nothing(self):
+        InventoryService.add_items(self.player.id, {self.potion.id: 5, self.ore.id: 10})
+        before = self.quantities(self.player)
+        # Зелий хватает, руды - нет (с учетом повторов в одном вызове)
+        for items in (
+            {self.potion.id: 2, self.ore.id: 11},
+            [(self.potion.id, 2), (self.ore.id, 6), (self.ore.id, 6)],
+            {self.potion.id: 1, self.sword.id: 1},
+        ):
+            with self.assertRaises(ValueError):
+                InventoryService.remove_items(self.player.id, items)
+            self.assertEqual(self.quantities(self.player), before)
+
+
+class AliasSamplerTests(SimpleTestCase):
+
+    def test_frequencies_match_weights(self):
+        weights = np.array([1.0, 2.0, 3.0, 4.0, 0.5, 9.5])
+        draws = 200_000
+        observed = np.bincount(AliasSampler(weights).sample(draws, np.random.default_rng(0)), minlength=len(weights))
+        expected = weights / weights.sum() * draws
+        chi_square = ((observed - expected) ** 2 / expected).sum()
+        # Критическое значение хи-квадрат для 5 степеней свободы при p = 0.001
+        self.assertLess(chi_square, 20.52)
+
+    def test_zero_weight_never_drawn(self):
+        sampler = AliasSampler([0.0, 1.0, 0.0, 1e-9, 3.0, 0.0])
+        drawn = set(np.unique(sampler.sample(100_000, np.random.default_rng(1))).tolist())
+        self.assertTrue(drawn <= {1, 3, 4})
+        self.assertTrue({1, 4} <= drawn)
+
+    def test_single_entry(self):
+        self.assertTrue((AliasSampler([2.5]).sample(1000, np.random.default_rng(2)) == 0).all())
+
+    def test_invalid_weights(self):
+        for weights in ([], [0.0, 0.0], [1.0, -1.0], [1.0, float('nan')]):
+            with self.assertRaises(ValueError):
+                AliasSampler(weights)
+
+    def test_seed_is_reproducible(self):
+        sampler = AliasSampler([1.0, 2.0, 3.0])
+        first = sampler.sample(1000, np.random.default_rng(3))
+        self.assertTrue((first == sampler.sample(1000, np.random.default_rng(3))).all())
+
+
+class LootServiceTests(TestCase):
+
+    def setUp(self):
+        self.coin = Item.objects.create(name='Монета', item_type='resource', stackable=True, max_stack=999)
+        self.sword = Item.objects.create(name='Меч', item_type='weapon', equipment_slot='weapon')
+        self.table = LootTable.objects.create(code='goblin', name='Гоблин', source_type='monster', rolls=2)
+        LootTableEntry.objects.create(table=self.table, item=None, weight=2)
+        LootTableEntry.objects.create(table=self.table, item=self.coin, weight=7, min_quantity=1, max_quantity=5)
+        LootTableEntry.objects.create(table=self.table, item=self.sword, weight=1)
+        self.players = [Player.objects.create(telegram_id=620 + index, first_name=f'Игрок {index}') for index in range(5)]
+
+    def test_roll(self):
+        drops, item_ids, quantities = LootService.roll('goblin', 10_000, seed=4)
+        self.assertTrue((drops < 10_000).all())
+        coins = item_ids == self.coin.id
+        self.assertTrue(((quantities[coins] >= 1) & (quantities[coins] <= 5)).all())
+        self.assertTrue((quantities[~coins] == 1).all())
+        # 2 броска на выпадение, монета - 70% бросков, меч - 10%
+        self.assertAlmostEqual(coins.sum() / 20_000, 0.7, delta=0.02)
+        self.assertAlmostEqual((item_ids == self.sword.id).sum() / 20_000, 0.1, delta=0.01)
+
+    def test_drop_writes_inventory(self):
+        player_ids = [player.id for player in self.players] * 20
+        rows = LootService.drop('goblin', player_ids, seed=5)
+        self.assertTrue(rows)
+        # Тот же seed - та же добыча; вторая выдача добавляется к первой
+        self.assertEqual(LootService.drop('goblin', player_ids, seed=5), rows)
+        inventory = {
+            (player_id, item_id): quantity
+            for player_id, item_id, quantity in Inventory.objects.values_list('player_id', 'item_id', 'quantity')
+        }
+        self.assertEqual(set(inventory), {(player_id, item_id) for player_id, item_id, _ in rows})
+        for player_id, item_id, quantity in rows:
+            # Меч не складывается - в инвентаре не больше одного
+            self.assertEqual(inventory[(player_id, item_id)], quantity * 2 if item_id == self.coin.id else 1)
+
+    def test_signals_drop_cached_tables(self):
+        self.assertEqual(len(loot_tables.get('goblin').item_ids), 3)
+        LootTableEntry.objects.create(table=self.table, item=self.coin, weight=0)
+        self.assertEqual(len(loot_tables.get('goblin').item_ids), 4)
+
+        self.table.is_active = False
+        self.table.save()
+        self.assertNotIn('goblin', loot_tables)
+        with self.assertRaises(ValueError):
+            LootService.roll('goblin')
+
+
+class CatalogGeneratorTests(TestCase):
+
+    def test_rerun_updates_items_and_wearers(self):
+        written, created, *_ = CatalogGenerator(BASE_ITEMS).run()
+        self.assertEqual(created, written)
+
+        player = Player.objects.create(telegram_id=600, first_name='Игрок')
+        character = Character.objects.create(player=player, name='Герой')
+        item = Item.objects.get(code='sword-legendary')
+        InventoryService.add_item(player.id, item.id)
+        LoadoutService.equip_item(player.telegram_id, item.id)
+
+        # Другой seed - другие случайные бонусы тех же предметов
+        _, created, _, recomputed, _ = CatalogGenerator(BASE_ITEMS, seed=1).run()
+        self.assertEqual(created, 0)
+        self.assertEqual(recomputed, 1)
+        regenerated = Item.objects.get(pk=item.pk)
+        self.assertNotEqual(
+            [getattr(item, field) for field in ITEM_BONUS_FIELDS],
+            [getattr(regenerated, field) for field in ITEM_BONUS_FIELDS],
+        )
+        character.refresh_from_db()
+        self.assertEqual(character.get_equipment_bonuses(), {field: getattr(regenerated, field) for field in ITEM_BONUS_FIELDS})
+
+        LoadoutService.unequip_item(player.telegram_id, 'weapon')
+        character.refresh_from_db()
+        self.assertEqual(character.get_equipment_bonuses(), {field: 0 for field in ITEM_BONUS_FIELDS})
+
+
+class ItemCatalogTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        slots = [slot for slot, _ in Equipment.SLOTS]
+        self.items = [
+            Item.objects.create(
+                name=f'Предмет {index}', item_type='misc', equipment_slot=slots[index % len(slots)],
+                rarity=('gray', 'blue')[index % 2], attack_bonus=index,
+            )
+            for index in range(10)
+        ]
+        self.characters = []
+        for index in range(15):
+            player = Player.objects.create(telegram_id=620 + index, first_name=f'Игрок {index}')
+            character = Character.objects.create(player=player, name=f'Герой {index}')
+            for item in self.items[:3]:
+                Equipment.objects.create(character=character, slot=item.equipment_slot, item=item)
+            self.characters.append(character)
+        # Откат транзакции теста возвращает и версию: общий кэш не должен пережить тест
+        self.addCleanup(item_catalog.expire)
+        super().setUp()
+
+    def catalog(self):
+        # Отдельный экземпляр - кэш другого процесса: сигналы сохранения его не сбрасывают
+        catalog = ItemCatalog('item_catalog', check_interval=3600)
+        catalog.refresh()
+        return catalog
+
+    def test_attach_without_join(self):
+        # Один запрос на строки экипировки, сколько бы их ни было
+        with self.assertQueryBudget(1) as context:
+            equipment = item_catalog.attach(Equipment.objects.filter(character__in=self.characters))
+            names = {equip.item.name for equip in equipment}
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn('items_item', context.captured_queries[0]['sql'])
+        self.assertEqual(len(equipment), 45)
+        self.assertEqual(names, {item.name for item in self.items[:3]})
+        self.assertIsInstance(equipment[0].item, CatalogItem)
+
+        equip = Equipment.objects.filter(character=self.characters[0]).first()
+        with self.assertNumQueries(0):
+            self.assertIs(item_catalog.attach(equip), equip)
+            self.assertIs(equip.item, item_catalog[equip.item_id])
+
+    def test_indexes(self):
+        catalog = self.catalog()
+        self.assertEqual(len(catalog), 10)
+        with self.assertNumQueries(0):
+            self.assertEqual([item.pk for item in catalog.by_rarity('blue')], [item.pk for item in self.items[1::2]])
+            self.assertEqual([item.pk for item in catalog.by_slot('weapon')], [self.items[0].pk, self.items[7].pk])
+            self.assertEqual(catalog.by_rarity('legendary'), ())
+            item = catalog.get(self.items[3].pk)
+        self.assertEqual(item.bonus_vector[ITEM_BONUS_FIELDS.index('attack_bonus')], 3)
+        self.assertEqual(item.get_rarity_display(), 'Синий')
+        self.assertTrue(item.is_equippable)
+        with self.assertRaises(AttributeError):
+            item.name = 'Другое имя'
+
+    def test_rebuild_after_version_bump(self):
+        other = self.catalog()
+        version = get_version('item_catalog')
+
+        # Массовое изменение без сигналов - версию увеличивает invalidate()
+        Item.objects.filter(pk=self.items[0].pk).update(name='Переименован')
+        item_catalog.invalidate()
+        self.assertEqual(get_version('item_catalog'), version + 1)
+        self.assertEqual(item_catalog[self.items[0].pk].name, 'Переименован')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(other[self.items[0].pk].name, 'Предмет 0')
+        with mock.patch('core.versioning.time.monotonic', return_value=time.monotonic() + 3600), self.assertNumQueries(2):
+            self.assertEqual(other[self.items[0].pk].name, 'Переименован')
+
+    def test_unknown_item_refreshes(self):
+        other = self.catalog()
+        created = Item.objects.create(name='Новый', item_type='misc')
+        # Предмета нет в снимке - версия сверяется сразу, не дожидаясь check_interval
+        with self.assertNumQueries(2):
+            self.assertEqual(set(other.get_many([self.items[0].pk, created.pk])), {self.items[0].pk, created.pk})
+        with self.assertNumQueries(1):
+            self.assertEqual(other.get_many([created.pk + 1000]), {})
@@ -1,3 +1,11 @@
 from django.contrib import admin
+from .models import OutboxMessage
 
-# Register your models here.
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'chat_id', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['chat_id', 'text']
+    readonly_fields = ['created_at', 'sent_at', 'attempts', 'last_error']
+    ordering = ['-id']
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TelegramBotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'telegram_bot'
+
+    def ready(self):
+        from core.metrics import registry
+        from .processing import metrics
+
+        registry.add_collector(metrics.prometheus_lines)
@@ -0,0 +1,92 @@
+"""
+Приложение python-telegram-bot для режима вебхука.
+
+В режиме вебхука обновления приходят POST-запросом на
+/api/telegram/webhook/ и обрабатываются прямо в ASGI-приложении Django:
+отдельный процесс с long polling не нужен, а пропускная способность бота
+растет вместе с количеством веб-воркеров.
+"""
+
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+from telegram import Update
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler
+
+from .handlers import button_handler, start
+from .outbox import start_sender, stop_sender
+from .processing import PerUserUpdateProcessor, timed
+
+logger = logging.getLogger(__name__)
+
+# Приложения по циклам событий: клиент HTTP привязан к циклу, в котором создан.
+# Под ASGI цикл один на воркер, под WSGI (runserver) - свой на каждый запрос.
+_applications = weakref.WeakKeyDictionary()
+_request_factory = None
+_request_token = None
+
+
+def add_handlers(application):
+    """Зарегистрировать обработчики бота"""
+    application.add_handler(CommandHandler("start", timed(start)))
+    application.add_handler(CallbackQueryHandler(timed(button_handler)))
+    return application
+
+
+def build_application(token=None, request=None, updater=True, outbox=False):
+    """
+    Собрать приложение бота.
+    request - собственный транспорт (например, FakeTelegramRequest),
+    updater=False - без Updater, для режима вебхука,
+    outbox=True - отправлять сообщения из outbox, пока приложение работает.
+    """
+    builder = (
+        Application.builder()
+        .token(token or settings.TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(settings.TELEGRAM_MAX_CONCURRENT_UPDATES))
+    )
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    if not updater:
+        builder = builder.updater(None)
+    if outbox:
+        builder = builder.post_init(start_sender).post_shutdown(stop_sender)
+    return add_handlers(builder.build())
+
+
+def use_request_factory(factory, token=None):
+    """
+    Подменить транспорт для приложений вебхука (None - настоящий Telegram).
+    token - токен для подмененного транспорта, если TELEGRAM_BOT_TOKEN не задан.
+    """
+    global _request_factory, _request_token
+    _request_factory = factory
+    _request_token = token if factory else None
+    _applications.clear()
+
+
+async def get_application():
+    """Инициализированное приложение для текущего цикла событий"""
+    loop = asyncio.get_running_loop()
+    application = _applications.get(loop)
+    if application is None:
+        request = _request_factory() if _request_factory else None
+        application = build_application(token=_request_token, request=request, updater=False)
+        await application.initialize()
+        if loop in _applications:
+            # Параллельный запрос успел инициализировать приложение раньше
+            await application.shutdown()
+        else:
+            _applications[loop] = application
+    return _applications[loop]
+
+
+async def process_update_data(data):
+    """Обработать обновление (словарь из JSON вебхука)"""
+    application = await get_application()
+    update = Update.de_json(data, application.bot)
+    # Через тот же пул, что и при polling: порядок обновлений игрока и общий лимит
+    await application.update_processor.process_update(update, application.process_update(update))
+    return update
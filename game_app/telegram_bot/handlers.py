@@ -0,0 +1,167 @@
+"""
+Обработчики Telegram бота.
+
+Используются и в режиме polling (telegram_bot/main.py), и в режиме вебхука
+(game.views.telegram_webhook), поэтому не зависят от способа
+получения обновлений.
+"""
+
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+from telegram.ext import ContextTypes
+
+from game.services import PlayerService
+
+logger = logging.getLogger(__name__)
+
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /start"""
+    user = update.effective_user
+
+    # Создаем или получаем игрока из базы данных
+    try:
+        # Используем sync_to_async для работы с Django ORM в асинхронном контексте
+        await sync_to_async(PlayerService.get_or_create_player)(
+            telegram_id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name
+        )
+
+        # Всегда показываем одинаковые кнопки - логика создания персонажа на сайте
+        welcome_message = (
+            f"🎉 Добро пожаловать в TwGame, {user.first_name or 'игрок'}!\n\n"
+            "Выберите действие:"
+        )
+
+        keyboard = [
+            [InlineKeyboardButton("🎮 Играть", callback_data='play_game')],
+            [InlineKeyboardButton("👤 Профиль", callback_data='show_profile')]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        await update.message.reply_text(
+            welcome_message,
+            reply_markup=reply_markup
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка при регистрации игрока: {e}")
+        await update.message.reply_text(
+            "❌ Произошла ошибка при регистрации. Попробуйте позже."
+        )
+
+async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик нажатий на кнопки"""
+    query = update.callback_query
+    await query.answer()
+
+    user = query.from_user
+
+    if query.data == 'play_game':
+        # Открываем игру как Telegram WebApp
+        await query.answer()
+
+        # Страница сама передает initData Telegram на /api/session/ и получает токен сессии
+        game_url = settings.TELEGRAM_WEBAPP_URL
+
+        # Создаем WebApp кнопку
+        web_app = WebAppInfo(url=game_url)
+        keyboard = [[InlineKeyboardButton("🎮 Играть в TwGame", web_app=web_app)]]
+
+        await query.edit_message_text(
+            text="🎯 TwGame готова к игре!\n\n"
+                 "Нажмите кнопку ниже, чтобы открыть игру:",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+    elif query.data == 'show_profile':
+        # Показываем профиль игрока
+        try:
+            # Игрок, профиль, персонаж и место в рейтинге - за один переход в поток
+            snapshot = await sync_to_async(PlayerService.get_player_snapshot)(user.id, with_rank=True)
+            if snapshot.has_character and snapshot.profile:
+                profile = snapshot.profile
+                profile_text = (
+                    f"👤 Ваш профиль:\n\n"
+                    f"🏆 Персонаж: {snapshot.character.name}\n"
+                    f"📊 Уровень: {profile.level}\n"
+                    f"⭐ Опыт: {profile.experience}\n"
+                    f"🏅 Место в рейтинге: {snapshot.rank or '—'}\n"
+                    f"💰 Золото: {profile.gold}\n"
+                    f"🎮 Игр сыграно: {profile.total_games}\n"
+                    f"🏆 Побед: {profile.wins}\n"
+                    f"❌ Поражений: {profile.losses}\n"
+                    f"📈 Процент побед: {profile.win_rate}%\n\n"
+                    f"🕐 Последний вход: {profile.last_login.strftime('%d.%m.%Y %H:%M')}"
+                )
+            else:
+                profile_text = (
+                    "👤 Профиль\n\n"
+                    "❌ Персонаж не создан\n\n"
+                    "Чтобы увидеть свой профиль, сначала создайте персонажа через кнопку '🎮 Играть'"
+                )
+
+            keyboard = [
+                [InlineKeyboardButton("⬅️ Назад", callback_data='back_to_menu')]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+
+            await query.edit_message_text(
+                text=profile_text,
+                reply_markup=reply_markup
+            )
+
+        except Exception as e:
+            logger.error(f"Ошибка при получении профиля: {e}")
+            await query.edit_message_text(
+                text="❌ Ошибка при загрузке профиля. Попробуйте позже.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("⬅️ Назад", callback_data='back_to_menu')
+                ]])
+            )
+
+    elif query.data == 'back_to_menu':
+        # Возвращаемся в главное меню
+        try:
+            # Профиль загружается вместе с игроком асинхронным запросом
+            snapshot = await PlayerService.aget_player_snapshot(user.id)
+            if snapshot.profile:
+                profile = snapshot.profile
+                welcome_message = (
+                    f"🎮 С возвращением в TwGame, {user.first_name or 'игрок'}!\n\n"
+                    f"📊 Ваш уровень: {profile.level}\n"
+                    f"💰 Золото: {profile.gold}\n\n"
+                )
+            else:
+                welcome_message = "Добро пожаловать в TwGame! 🚀\n\n"
+
+            keyboard = [
+                [InlineKeyboardButton("🎮 Играть", callback_data='play_game')],
+                [InlineKeyboardButton("👤 Профиль", callback_data='show_profile')]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+
+            welcome_message += "Выберите действие:"
+
+            await query.edit_message_text(
+                text=welcome_message,
+                reply_markup=reply_markup
+            )
+
+        except Exception as e:
+            logger.error(f"Ошибка при возврате в меню: {e}")
+            keyboard = [
+                [InlineKeyboardButton("🎮 Играть", callback_data='play_game')],
+                [InlineKeyboardButton("👤 Профиль", callback_data='show_profile')]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+
+            await query.edit_message_text(
+                text="Добро пожаловать в TwGame! 🚀\n\nВыберите действие:",
+                reply_markup=reply_markup
+            )
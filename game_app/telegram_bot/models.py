@@ -1,3 +1,46 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class OutboxMessage(models.Model):
+    """
+    Исходящее сообщение бота (транзакционный outbox).
+
+    Игровой код пишет сообщения в той же транзакции, что и изменения игры,
+    отправляет их OutboxSender в процессе бота с учетом лимитов Telegram.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    chat_id = models.BigIntegerField(verbose_name="Чат")
+    text = models.TextField(verbose_name="Текст")
+    parse_mode = models.CharField(max_length=20, blank=True, verbose_name="Разметка")
+    reply_markup = models.JSONField(null=True, blank=True, verbose_name="Клавиатура")
+    kind = models.CharField(max_length=50, default='notification', verbose_name="Тип")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    # Для ожидающих - не раньше этого времени: повтор после ошибки или аренда отправителем
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Дата создания")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата отправки")
+
+    class Meta:
+        verbose_name = "Исходящее сообщение"
+        verbose_name_plural = "Исходящие сообщения"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"[{self.status}] {self.chat_id}: {self.text[:50]}"
@@ -0,0 +1,228 @@
+"""
+Отправитель исходящих сообщений бота (OutboxMessage).
+
+Работает фоновой задачей в процессе бота: забирает из базы пачки готовых
+сообщений и отправляет их с учетом лимитов Telegram - общего (корзина
+токенов на весь бот) и на чат (не чаще раза в chat_interval секунд).
+Ошибки сети и flood control повторяются с экспоненциальной задержкой,
+заблокировавшие бота пользователи и неверные чаты помечаются как failed.
+Обработчики обновлений не ждут рассылку: она идет в отдельной задаче, а
+запросы к базе выполняются в потоке через sync_to_async.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from .services import OutboxService
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Корзина токенов: не больше rate событий в секунду, всплеск до capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def pause(self, seconds):
+        """Остановить выдачу токенов (например, после RetryAfter от Telegram)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ChatLimiter:
+    """Лимит на чат: следующее сообщение в чат не раньше чем через interval секунд"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next_free = {}
+
+    def reserve(self, chat_id, max_wait):
+        """
+        Занять ближайшее окно чата и вернуть, сколько секунд до него ждать.
+        Если ждать дольше max_wait - окно не занимается, возвращается None.
+        """
+        now = time.monotonic()
+        start = max(now, self._next_free.get(chat_id, 0.0))
+        if start - now > max_wait:
+            return None
+        self._next_free[chat_id] = start + self.interval
+        return start - now
+
+    def wait_time(self, chat_id):
+        return max(0.0, self._next_free.get(chat_id, 0.0) - time.monotonic())
+
+    def prune(self):
+        """Забыть чаты, окно которых уже свободно"""
+        now = time.monotonic()
+        self._next_free = {chat_id: free for chat_id, free in self._next_free.items() if free > now}
+
+
+def retry_after_seconds(error):
+    value = error.retry_after
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+class OutboxSender:
+    """Отправляет OutboxMessage пачками с лимитами и повторами"""
+
+    def __init__(self, bot, rate=None, chat_interval=None, batch_size=None, max_attempts=None,
+                 poll_interval=1.0, backoff_base=2.0, backoff_max=600.0, report_interval=60.0, on_batch=None):
+        self.bot = bot
+        self.rate = rate or settings.TELEGRAM_OUTBOX_RATE
+        self.bucket = TokenBucket(self.rate)
+        self.chats = ChatLimiter(chat_interval if chat_interval is not None else settings.TELEGRAM_OUTBOX_CHAT_INTERVAL)
+        self.batch_size = batch_size or settings.TELEGRAM_OUTBOX_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.TELEGRAM_OUTBOX_MAX_ATTEMPTS
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.report_interval = report_interval
+        self.on_batch = on_batch
+        self.stats = {'sent': 0, 'retried': 0, 'deferred': 0, 'failed': 0, 'batches': 0}
+        self._stopping = False
+
+    @property
+    def lease_seconds(self):
+        """Аренда пачки: время отправки при полном лимите с запасом"""
+        return self.batch_size / self.rate * 2 + 60
+
+    def stop(self):
+        self._stopping = True
+
+    async def run(self, until_empty=False):
+        """Отправлять, пока не вызван stop() (или пока не кончатся ожидающие при until_empty)"""
+        started = time.perf_counter()
+        reported_at = started
+        reported_sent = 0
+        while not self._stopping:
+            try:
+                batch = await self.send_batch()
+            except Exception as e:
+                # Сбой базы не должен останавливать бота: пачка вернется в очередь после аренды
+                logger.error(f"Outbox batch failed: {e}")
+                batch = 0
+            if not batch:
+                if until_empty and not await sync_to_async(OutboxService.has_pending)():
+                    break
+                await asyncio.sleep(self.poll_interval)
+
+            now = time.perf_counter()
+            if now - reported_at >= self.report_interval:
+                logger.info(
+                    f"Outbox: {(self.stats['sent'] - reported_sent) / (now - reported_at):.1f} msg/s, "
+                    f"sent {self.stats['sent']}, retried {self.stats['retried']}, failed {self.stats['failed']}"
+                )
+                reported_at, reported_sent = now, self.stats['sent']
+        self.stats['elapsed'] = time.perf_counter() - started
+        return self.stats
+
+    async def send_batch(self):
+        """Отправить одну пачку; возвращает количество взятых сообщений"""
+        messages = await sync_to_async(OutboxService.claim_batch)(self.batch_size, self.lease_seconds)
+        if not messages:
+            return 0
+
+        sent, retries, failures, deferrals = [], [], [], []
+        sends = []
+        for message in messages:
+            delay = self.chats.reserve(message['chat_id'], max_wait=self.chats.interval)
+            if delay is None:
+                # В чат уже идут сообщения этой пачки: отложить без траты попытки
+                self._defer(message, self.chats.wait_time(message['chat_id']), deferrals)
+            else:
+                sends.append(self._send(message, delay, sent, retries, failures, deferrals))
+        await asyncio.gather(*sends)
+        self.chats.prune()
+
+        await sync_to_async(OutboxService.complete_batch)(sent, retries, failures, deferrals)
+        self.stats['batches'] += 1
+        self.stats['sent'] += len(sent)
+        self.stats['failed'] += len(failures)
+        if self.on_batch:
+            self.on_batch(self.stats)
+        return len(messages)
+
+    async def _send(self, message, delay, sent, retries, failures, deferrals):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.bucket.acquire()
+        reply_markup = message['reply_markup']
+        try:
+            await self.bot.send_message(
+                chat_id=message['chat_id'],
+                text=message['text'],
+                parse_mode=message['parse_mode'] or None,
+                reply_markup=InlineKeyboardMarkup.de_json(reply_markup, self.bot) if reply_markup else None,
+            )
+        except RetryAfter as e:
+            # Flood control относится ко всему боту, а не к сообщению - попытка не тратится
+            seconds = retry_after_seconds(e)
+            self.bucket.pause(seconds)
+            self._defer(message, seconds, deferrals)
+        except (Forbidden, BadRequest) as e:
+            # Бот заблокирован или чат не существует - повтор не поможет
+            failures.append((message['id'], str(e)))
+        except TelegramError as e:
+            delay = min(self.backoff_max, self.backoff_base ** message['attempts'])
+            self._retry(message, delay * random.uniform(1, 1.2), str(e), retries, failures)
+        else:
+            sent.append(message['id'])
+
+    def _defer(self, message, delay, deferrals):
+        deferrals.append((message['id'], delay, message['attempts'] - 1))
+        self.stats['deferred'] += 1
+
+    def _retry(self, message, delay, error, retries, failures):
+        if message['attempts'] >= self.max_attempts:
+            failures.append((message['id'], error))
+        else:
+            retries.append((message['id'], delay, error, message['attempts']))
+            self.stats['retried'] += 1
+
+
+async def start_sender(application):
+    """post_init приложения бота: запустить отправителя фоновой задачей"""
+    sender = OutboxSender(application.bot)
+    application.bot_data['outbox_sender'] = sender
+    application.bot_data['outbox_task'] = asyncio.create_task(sender.run())
+
+
+async def stop_sender(application):
+    """post_shutdown приложения бота: дождаться текущей пачки и остановить отправителя"""
+    sender = application.bot_data.pop('outbox_sender', None)
+    task = application.bot_data.pop('outbox_task', None)
+    if sender is not None:
+        sender.stop()
+        await task
+
+
+async def serve(application):
+    """Только отправка сообщений, без обработки обновлений (режим вебхука)"""
+    async with application:
+        await OutboxSender(application.bot).run()
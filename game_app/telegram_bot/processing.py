@@ -0,0 +1,239 @@
+"""
+Параллельная обработка обновлений бота с сохранением порядка для игрока.
+
+По умолчанию python-telegram-bot обрабатывает обновления по одному, и
+медленный запрос к базе у одного игрока задерживает нажатия всех
+остальных. PerUserUpdateProcessor выполняет обновления разных игроков
+параллельно (не больше max_concurrent_updates одновременно), а
+обновления одного игрока - строго по очереди, в порядке поступления.
+
+Метрики (глубина очереди, время ожидания и время работы обработчиков)
+собираются в общий объект metrics, снимок - metrics.snapshot(); в режиме
+webhook они же отдаются по /metrics (metrics.prometheus_lines).
+"""
+
+import asyncio
+import contextlib
+import functools
+import threading
+import time
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Верхние границы интервалов гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными интервалами"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Оценка квантиля по верхней границе интервала"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'avg': self.total / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': self.max,
+            'buckets': dict(zip([*self.buckets, float('inf')], self.counts)),
+        }
+
+
+class UpdateMetrics:
+    """
+    Метрики обработки обновлений.
+    Обработчики выполняются и в потоках sync_to_async, поэтому запись под блокировкой.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.queued = 0
+            self.running = 0
+            self.max_queued = 0
+            self.processed = 0
+            self.wait = LatencyHistogram()
+            self.handlers = {}
+
+    def update_queued(self):
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+    def update_started(self, waited):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.wait.observe(waited)
+
+    def update_cancelled(self):
+        with self._lock:
+            self.queued -= 1
+
+    def update_finished(self):
+        with self._lock:
+            self.running -= 1
+            self.processed += 1
+
+    def observe_handler(self, name, seconds):
+        with self._lock:
+            histogram = self.handlers.get(name)
+            if histogram is None:
+                histogram = self.handlers[name] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'queued': self.queued,
+                'running': self.running,
+                'max_queued': self.max_queued,
+                'processed': self.processed,
+                'wait': self.wait.snapshot(),
+                'handlers': {name: histogram.snapshot() for name, histogram in self.handlers.items()},
+            }
+
+    def prometheus_lines(self):
+        """Метрики в формате Prometheus, сборщик для core.metrics.registry"""
+        from core.metrics import histogram_lines
+
+        with self._lock:
+            lines = [
+                '# TYPE telegram_updates_queued gauge', f'telegram_updates_queued {self.queued}',
+                '# TYPE telegram_updates_running gauge', f'telegram_updates_running {self.running}',
+                '# TYPE telegram_updates_processed_total counter', f'telegram_updates_processed_total {self.processed}',
+                '# TYPE telegram_update_wait_seconds histogram',
+                *histogram_lines(
+                    'telegram_update_wait_seconds', [], self.wait.buckets,
+                    self.wait.counts, self.wait.total, self.wait.count,
+                ),
+                '# TYPE telegram_handler_duration_seconds histogram',
+            ]
+            for name, histogram in sorted(self.handlers.items()):
+                lines.extend(histogram_lines(
+                    'telegram_handler_duration_seconds', [('handler', name)], histogram.buckets,
+                    histogram.counts, histogram.total, histogram.count,
+                ))
+        return lines
+
+
+metrics = UpdateMetrics()
+
+
+def timed(callback, name=None):
+    """Обернуть обработчик бота замером времени выполнения"""
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            metrics.observe_handler(name, time.perf_counter() - started)
+
+    return wrapper
+
+
+def update_key(update):
+    """Ключ очереди: игрок, затем чат; None - порядок не важен"""
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Ограниченный пул обработки обновлений с очередью на каждого игрока.
+
+    Пул (не больше max_concurrent_updates обновлений) ограничивает базовый
+    process_update, а do_process_update перед выполнением ждет блокировку
+    игрока: asyncio.Lock отдается ожидающим в порядке очереди, поэтому
+    обновления одного игрока выполняются по одному и в порядке поступления.
+    """
+
+    __slots__ = ('metrics', '_locks')
+
+    def __init__(self, max_concurrent_updates, metrics=metrics):
+        super().__init__(max_concurrent_updates)
+        self.metrics = metrics
+        # Игрок -> [блокировка, обновлений в обработке и в очереди]; удаляется, когда очередь пустеет
+        self._locks = {}
+
+    async def do_process_update(self, update, coroutine):
+        key = update_key(update)
+        entry = None
+        if key is not None:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+
+        self.metrics.update_queued()
+        queued_at = time.perf_counter()
+        started = False
+        try:
+            async with entry[0] if entry is not None else contextlib.nullcontext():
+                self.metrics.update_started(time.perf_counter() - queued_at)
+                started = True
+                try:
+                    await coroutine
+                finally:
+                    self.metrics.update_finished()
+        finally:
+            if not started:
+                self.metrics.update_cancelled()
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()
+            if entry is not None:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def pending_users(self):
+        """Игроков с обновлениями в обработке или в очереди"""
+        return len(self._locks)
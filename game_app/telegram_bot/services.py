@@ -0,0 +1,150 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from accounts.models import Player
+from .models import OutboxMessage
+
+
+class OutboxService:
+    """Сервис исходящих сообщений бота (outbox)"""
+
+    # Размер пачки при массовой записи
+    CHUNK_SIZE = 5000
+
+    @staticmethod
+    def enqueue(chat_id, text, kind='notification', parse_mode='', reply_markup=None):
+        """
+        Поставить сообщение в очередь.
+        Внутри transaction.atomic() сообщение уйдет, только если транзакция зафиксируется.
+        """
+        return OutboxMessage.objects.create(
+            chat_id=chat_id,
+            text=text,
+            kind=kind,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup,
+        )
+
+    @staticmethod
+    def enqueue_many(messages, kind='notification', parse_mode=''):
+        """Поставить в очередь пары (chat_id, текст) пачками INSERT"""
+        now = timezone.now()
+        objects = [
+            OutboxMessage(
+                chat_id=chat_id, text=text, kind=kind, parse_mode=parse_mode,
+                created_at=now, next_attempt_at=now,
+            )
+            for chat_id, text in messages
+        ]
+        OutboxMessage.objects.bulk_create(objects, batch_size=OutboxService.CHUNK_SIZE)
+        return len(objects)
+
+    @staticmethod
+    def broadcast(text, kind='broadcast', parse_mode='', reply_markup=None):
+        """
+        Рассылка всем активным игрокам одним запросом INSERT ... SELECT:
+        идентификаторы игроков не загружаются в память, сколько бы их ни было.
+        Возвращает количество поставленных в очередь сообщений.
+        """
+        table = connection.ops.quote_name(OutboxMessage._meta.db_table)
+        players = connection.ops.quote_name(Player._meta.db_table)
+        markup_field = OutboxMessage._meta.get_field('reply_markup')
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (chat_id, text, parse_mode, reply_markup, kind, status, attempts, '
+                f'next_attempt_at, last_error, created_at) '
+                f'SELECT telegram_id, %s, %s, %s, %s, %s, 0, %s, %s, %s FROM {players} WHERE is_active',
+                [
+                    text, parse_mode, markup_field.get_db_prep_value(reply_markup, connection),
+                    kind, OutboxMessage.STATUS_PENDING, now, '', now,
+                ],
+            )
+            return cursor.rowcount
+
+    @staticmethod
+    def claim_batch(limit, lease_seconds):
+        """
+        Забрать пачку готовых к отправке сообщений.
+
+        Сообщения не меняют статус, а получают аренду: next_attempt_at сдвигается
+        на lease_seconds. Если отправитель упадет, сообщения вернутся в очередь
+        по истечении аренды. На PostgreSQL строки, занятые другим отправителем,
+        пропускаются (SKIP LOCKED).
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            messages = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(status=OutboxMessage.STATUS_PENDING, next_attempt_at__lte=now)
+                .order_by('id')
+                .values('id', 'chat_id', 'text', 'parse_mode', 'reply_markup', 'attempts')[:limit]
+            )
+            if messages:
+                OutboxMessage.objects.filter(id__in=[message['id'] for message in messages]).update(
+                    next_attempt_at=now + timedelta(seconds=lease_seconds),
+                    attempts=F('attempts') + 1,
+                )
+        for message in messages:
+            message['attempts'] += 1
+        return messages
+
+    @staticmethod
+    def complete_batch(sent_ids, retries=(), failures=(), deferrals=()):
+        """
+        Записать итоги отправки пачки:
+        sent_ids - отправленные, retries - (id, через сколько секунд повторить, ошибка, попыток),
+        failures - (id, ошибка) для окончательно неотправленных, deferrals - (id, через
+        сколько секунд повторить, попыток) для отложенных из-за лимита чата или flood
+        control: попытки без учета этой, последняя ошибка сообщения не меняется.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            if sent_ids:
+                OutboxMessage.objects.filter(id__in=sent_ids).update(
+                    status=OutboxMessage.STATUS_SENT, sent_at=now, last_error='',
+                )
+            if retries:
+                OutboxMessage.objects.bulk_update(
+                    [
+                        OutboxMessage(id=message_id, next_attempt_at=now + timedelta(seconds=delay),
+                                      last_error=error, attempts=attempts)
+                        for message_id, delay, error, attempts in retries
+                    ],
+                    ['next_attempt_at', 'last_error', 'attempts'],
+                    batch_size=OutboxService.CHUNK_SIZE,
+                )
+            if deferrals:
+                OutboxMessage.objects.bulk_update(
+                    [
+                        OutboxMessage(id=message_id, next_attempt_at=now + timedelta(seconds=delay), attempts=attempts)
+                        for message_id, delay, attempts in deferrals
+                    ],
+                    ['next_attempt_at', 'attempts'],
+                    batch_size=OutboxService.CHUNK_SIZE,
+                )
+            if failures:
+                OutboxMessage.objects.bulk_update(
+                    [
+                        OutboxMessage(id=message_id, status=OutboxMessage.STATUS_FAILED, last_error=error)
+                        for message_id, error in failures
+                    ],
+                    ['status', 'last_error'],
+                    batch_size=OutboxService.CHUNK_SIZE,
+                )
+
+    @staticmethod
+    def has_pending():
+        """Есть ли неотправленные сообщения (в том числе ожидающие повтора)"""
+        return OutboxMessage.objects.filter(status=OutboxMessage.STATUS_PENDING).exists()
+
+    @staticmethod
+    def get_stats():
+        """Количество сообщений по статусам"""
+        counts = dict(
+            OutboxMessage.objects.order_by().values_list('status').annotate(count=Count('id'))
+        )
+        return {status: counts.get(status, 0) for status, _ in OutboxMessage.STATUS_CHOICES}
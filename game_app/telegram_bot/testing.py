@@ -0,0 +1,126 @@
+"""
+Локальная подмена Telegram Bot API для тестов и нагрузочных прогонов.
+
+FakeTelegramRequest отвечает на вызовы API без сети и запоминает их,
+так что записанные обновления можно прогонять через обработчики бота
+без настоящего токена.
+"""
+
+import asyncio
+import json
+import time
+
+from telegram.request import BaseRequest
+
+FAKE_BOT = {'id': 1, 'is_bot': True, 'first_name': 'TwGame', 'username': 'twgame_fake_bot'}
+# Токен для прогонов без TELEGRAM_BOT_TOKEN: в сеть он не уходит
+FAKE_TOKEN = f"{FAKE_BOT['id']}:fake-token"
+
+
+class FakeTelegramRequest(BaseRequest):
+    """Транспорт python-telegram-bot, который отвечает сам и записывает вызовы"""
+
+    def __init__(self, record=True):
+        self.record = record
+        self.calls = []
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        parameters = request_data.parameters if request_data else {}
+        if self.record:
+            self.calls.append((api_method, parameters))
+        result = self._result(api_method, parameters)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    def _result(self, api_method, parameters):
+        if api_method == 'getMe':
+            return FAKE_BOT
+        if api_method.startswith(('send', 'edit')):
+            self._message_id += 1
+            chat_id = parameters.get('chat_id') or 0
+            return {
+                'message_id': parameters.get('message_id') or self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': FAKE_BOT,
+                'text': parameters.get('text', ''),
+            }
+        return True
+
+
+def fake_updates(count, users=100, start_update_id=1):
+    """
+    Сгенерировать count обновлений от users пользователей:
+    /start, затем нажатия кнопок профиля и возврата в меню.
+    """
+    callbacks = ['show_profile', 'back_to_menu']
+    now = int(time.time())
+    for offset in range(count):
+        update_id = start_update_id + offset
+        user_id = 10_000_000 + offset % users
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'Player{user_id}', 'username': f'player{user_id}'}
+        chat = {'id': user_id, 'type': 'private'}
+        step = offset // users
+        if step == 0:
+            yield {
+                'update_id': update_id,
+                'message': {
+                    'message_id': update_id, 'date': now, 'chat': chat, 'from': user, 'text': '/start',
+                    'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+                },
+            }
+        else:
+            yield {
+                'update_id': update_id,
+                'callback_query': {
+                    'id': str(update_id), 'from': user, 'chat_instance': str(user_id),
+                    'data': callbacks[step % len(callbacks)],
+                    'message': {'message_id': update_id, 'date': now, 'chat': chat, 'from': FAKE_BOT, 'text': 'menu'},
+                },
+            }
+
+
+async def asgi_post(application, path, body, host='localhost', headers=None):
+    """
+    POST-запрос напрямую в ASGI-приложение (без сети).
+    Возвращает HTTP-статус ответа.
+    """
+    raw_headers = [
+        (b'host', host.encode()),
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+    ]
+    raw_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'POST', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'headers': raw_headers,
+        'client': ('127.0.0.1', 0), 'server': (host, 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {}
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Клиент не отключается, пока приложение не ответит
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+
+    await application(scope, receive, send)
+    return response.get('status')
@@ -1,3 +1,293 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from telegram import Update
+from telegram.error import Forbidden, RetryAfter, TimedOut
+
+from accounts.models import Player
+from game.models import Player as LegacyPlayer
+from .models import OutboxMessage
+from .outbox import ChatLimiter, OutboxSender, TokenBucket
+from .processing import PerUserUpdateProcessor, UpdateMetrics
+from .services import OutboxService
+from .testing import fake_updates
+
+
+class PerUserUpdateProcessorTests(SimpleTestCase):
+
+    def updates(self, users):
+        # Первые обновления fake_updates - /start от users разных пользователей
+        return [Update.de_json(data, None) for data in fake_updates(users * 2, users=users)]
+
+    def test_same_user_in_order_other_users_concurrently(self):
+        async def scenario():
+            processor = PerUserUpdateProcessor(4, metrics=UpdateMetrics())
+            first, second, first_again, _ = self.updates(2)
+            log = []
+            release = asyncio.Event()
+
+            async def handler(name, wait=False):
+                log.append(f'{name} start')
+                if wait:
+                    await release.wait()
+                log.append(f'{name} end')
+
+            tasks = [
+                asyncio.create_task(processor.process_update(first, handler('first', wait=True))),
+                asyncio.create_task(processor.process_update(first_again, handler('first again'))),
+                asyncio.create_task(processor.process_update(second, handler('second'))),
+            ]
+            await asyncio.sleep(0.01)
+            # Первое обновление первого игрока ждет, второе стоит за ним, второй игрок уже обработан
+            self.assertEqual(log, ['first start', 'second start', 'second end'])
+            self.assertEqual(processor.pending_users, 1)
+
+            release.set()
+            await asyncio.gather(*tasks)
+            self.assertEqual(log[3:], ['first end', 'first again start', 'first again end'])
+            self.assertEqual(processor.pending_users, 0)
+            return processor.metrics.snapshot()
+
+        snapshot = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+        self.assertEqual((snapshot['queued'], snapshot['running'], snapshot['processed']), (0, 0, 3))
+
+    def test_cancelled_update_closes_coroutine(self):
+        async def scenario():
+            processor = PerUserUpdateProcessor(2, metrics=UpdateMetrics())
+            update = self.updates(1)[0]
+            release = asyncio.Event()
+            blocking = asyncio.create_task(processor.process_update(update, release.wait()))
+            await asyncio.sleep(0)
+
+            queued = processor.process_update(update, asyncio.sleep(0))
+            waiting = asyncio.create_task(queued)
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            release.set()
+            await blocking
+            return processor
+
+        processor = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+        self.assertEqual(processor.metrics.snapshot()['queued'], 0)
+        self.assertEqual(processor.pending_users, 0)
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def acquire(self, bucket, count):
+        async def scenario():
+            for _ in range(count):
+                await bucket.acquire()
+
+        started = time.monotonic()
+        asyncio.run(scenario())
+        return time.monotonic() - started
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=20, capacity=2)
+        self.assertLess(self.acquire(bucket, 2), 0.04)
+        # Корзина пуста: еще два токена - не быстрее 2/20 с
+        self.assertGreaterEqual(self.acquire(bucket, 2), 0.09)
+
+    def test_pause(self):
+        bucket = TokenBucket(rate=1000)
+        bucket.pause(0.1)
+        self.assertEqual(bucket.tokens, 0)
+        self.assertGreaterEqual(self.acquire(bucket, 1), 0.09)
+
+
+class ChatLimiterTests(SimpleTestCase):
+
+    def test_reserve(self):
+        chats = ChatLimiter(interval=1.0)
+        self.assertEqual(chats.reserve(1, max_wait=1.0), 0)
+        self.assertAlmostEqual(chats.reserve(1, max_wait=1.0), 1.0, places=2)
+        # Окно через 2 секунды дальше max_wait - не занимается
+        self.assertIsNone(chats.reserve(1, max_wait=1.0))
+        self.assertAlmostEqual(chats.wait_time(1), 2.0, places=2)
+        self.assertEqual(chats.reserve(2, max_wait=1.0), 0)
+
+    def test_prune(self):
+        chats = ChatLimiter(interval=0.0)
+        chats.reserve(1, max_wait=0)
+        chats.prune()
+        self.assertEqual(chats.wait_time(1), 0)
+        self.assertEqual(chats._next_free, {})
+
+
+class OutboxServiceTests(TestCase):
+
+    def test_claim_batch_lease(self):
+        OutboxService.enqueue_many([(chat_id, 'Привет') for chat_id in range(1, 4)])
+
+        with self.assertNumQueries(4):  # SAVEPOINT, SELECT, UPDATE, RELEASE
+            messages = OutboxService.claim_batch(2, lease_seconds=60)
+        self.assertEqual([(message['chat_id'], message['attempts']) for message in messages], [(1, 1), (2, 1)])
+        # Арендованные сообщения не выдаются повторно, пока не истечет аренда
+        self.assertEqual([message['chat_id'] for message in OutboxService.claim_batch(10, 60)], [3])
+        self.assertEqual(OutboxService.claim_batch(10, 60), [])
+
+        OutboxMessage.objects.filter(chat_id=1).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        messages = OutboxService.claim_batch(10, 60)
+        self.assertEqual([(message['chat_id'], message['attempts']) for message in messages], [(1, 2)])
+        self.assertTrue(OutboxService.has_pending())
+
+    def test_broadcast_insert_select(self):
+        for telegram_id, is_active in [(801, True), (802, True), (803, False)]:
+            Player.objects.create(telegram_id=telegram_id, first_name='Игрок', is_active=is_active)
+
+        markup = {'inline_keyboard': [[{'text': 'Играть', 'callback_data': 'play'}]]}
+        with self.assertNumQueries(1):
+            count = OutboxService.broadcast('Старт события!', reply_markup=markup)
+        self.assertEqual(count, 2)
+        messages = OutboxMessage.objects.order_by('chat_id')
+        self.assertEqual([message.chat_id for message in messages], [801, 802])
+        for message in messages:
+            self.assertEqual(
+                (message.text, message.kind, message.status, message.attempts, message.reply_markup),
+                ('Старт события!', 'broadcast', OutboxMessage.STATUS_PENDING, 0, markup),
+            )
+        self.assertEqual(OutboxService.get_stats(), {'pending': 2, 'sent': 0, 'failed': 0})
+
+
+class FakeBot:
+    """Бот, который отвечает ошибкой errors[chat_id] или запоминает сообщение"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        error = self.errors.get(chat_id)
+        if error is not None:
+            raise error
+        self.sent.append((chat_id, text))
+
+
+class OutboxSenderTests(TestCase):
+
+    def setUp(self):
+        messages = [
+            (1, 'первое', 0), (1, 'второе', 0), (1, 'третье', 0),  # третье упрется в лимит чата
+            (2, 'сеть', 0), (3, 'flood', 2), (4, 'заблокирован', 0), (5, 'последняя попытка', 2),
+        ]
+        for chat_id, text, attempts in messages:
+            OutboxMessage.objects.create(chat_id=chat_id, text=text, attempts=attempts, last_error='старая ошибка')
+        self.bot = FakeBot({
+            2: TimedOut('timeout'), 3: RetryAfter(timedelta(seconds=0.2)),
+            4: Forbidden('blocked'), 5: TimedOut('timeout'),
+        })
+        self.sender = OutboxSender(
+            self.bot, rate=1000, chat_interval=0.05, batch_size=100, max_attempts=3, backoff_base=2.0,
+        )
+
+    def message(self, text):
+        return OutboxMessage.objects.get(text=text)
+
+    def test_send_batch(self):
+        claimed_at = timezone.now()
+        self.assertEqual(async_to_sync(self.sender.send_batch)(), 7)
+
+        self.assertEqual(self.bot.sent, [(1, 'первое'), (1, 'второе')])
+        self.assertEqual(
+            {key: self.sender.stats[key] for key in ('sent', 'retried', 'deferred', 'failed')},
+            {'sent': 2, 'retried': 1, 'deferred': 2, 'failed': 2},
+        )
+        sent = self.message('первое')
+        self.assertEqual((sent.status, sent.last_error), (OutboxMessage.STATUS_SENT, ''))
+
+        # Ошибка сети: попытка засчитана, повтор через base ** attempts секунд
+        retried = self.message('сеть')
+        self.assertEqual((retried.status, retried.attempts, retried.last_error), ('pending', 1, 'timeout'))
+        self.assertGreaterEqual(retried.next_attempt_at, claimed_at + timedelta(seconds=2))
+        self.assertLessEqual(retried.next_attempt_at, timezone.now() + timedelta(seconds=2.4))
+
+        # Лимит чата и flood control: попытка не тратится, прежняя ошибка остается
+        for text, attempts in [('третье', 0), ('flood', 2)]:
+            deferred = self.message(text)
+            self.assertEqual((deferred.status, deferred.attempts, deferred.last_error), ('pending', attempts, 'старая ошибка'))
+            self.assertGreater(deferred.next_attempt_at, claimed_at)
+
+        for text, error in [('заблокирован', 'blocked'), ('последняя попытка', 'timeout')]:
+            failed = self.message(text)
+            self.assertEqual((failed.status, failed.last_error), (OutboxMessage.STATUS_FAILED, error))
+
+    def test_run_until_empty(self):
+        self.bot.errors.clear()
+        self.sender.poll_interval = 0.01
+        stats = async_to_sync(self.sender.run)(until_empty=True)
+        self.assertEqual(stats['sent'], 7)
+        self.assertEqual(OutboxService.get_stats(), {'pending': 0, 'sent': 7, 'failed': 0})
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET='webhook-secret')
+class TelegramWebhookTests(TestCase):
+
+    def setUp(self):
+        self.url = reverse('game:telegram_webhook')
+        self.update = next(fake_updates(1))
+
+    def post(self, body, secret='webhook-secret'):
+        headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret is not None else {}
+        return self.client.post(self.url, body, content_type='application/json', headers=headers)
+
+    @mock.patch('telegram_bot.bot.process_update_data')
+    def test_secret_mismatch(self, process_update_data):
+        for secret in (None, '', 'wrong-secret'):
+            with self.subTest(secret=secret):
+                self.assertEqual(self.post(json.dumps(self.update), secret=secret).status_code, 403)
+        process_update_data.assert_not_called()
+
+    @mock.patch('telegram_bot.bot.process_update_data')
+    def test_dispatch(self, process_update_data):
+        self.assertEqual(self.post('{not json').status_code, 400)
+
+        response = self.post(json.dumps(self.update))
+        self.assertEqual((response.status_code, response.json()), (200, {'status': 'ok'}))
+        process_update_data.assert_called_once_with(self.update)
+
+    @mock.patch('telegram_bot.bot.process_update_data', side_effect=RuntimeError('handler failed'))
+    def test_handler_error_still_ok(self, process_update_data):
+        # Ошибка обработчика не должна приводить к повторной доставке обновления Telegram
+        with self.assertLogs('game.views', 'ERROR'):
+            self.assertEqual(self.post(json.dumps(self.update)).status_code, 200)
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='', TELEGRAM_WEBHOOK_SECRET='webhook-secret')
+class ReplayTelegramUpdatesTests(TransactionTestCase):
+    """
+    Прогон через ASGI-приложение и обработчики бота с FakeTelegramRequest.
+    Обработчики ходят в базу из потоков sync_to_async, поэтому TransactionTestCase.
+    """
+
+    def test_replay_generated_updates(self):
+        out = io.StringIO()
+        # ASGI выполняет каждый запрос в своем потоке; общая база SQLite в памяти блокирует
+        # таблицу при одновременной записи из разных соединений, поэтому там запросы по одному
+        concurrency = 4 if connection.vendor == 'postgresql' else 1
+        # 5 игроков: /start, затем по два нажатия кнопок
+        call_command('replay_telegram_updates', generate=15, users=5, concurrency=concurrency, stdout=out)
+        output = out.getvalue()
+
+        self.assertIn('Обновлений: 15', output)
+        self.assertIn('ошибок HTTP: 0', output)
+        self.assertEqual(
+            sorted(LegacyPlayer.objects.values_list('telegram_id', flat=True)), list(range(10_000_000, 10_000_005)),
+        )
+        # Ответы бота: приветствие на /start и ответы на нажатия кнопок
+        calls = int(output.split('Вызовов Telegram API: ')[1].split()[0])
+        self.assertGreaterEqual(calls, 15)
+        self.assertIn('start: 5 вызовов', output)
+        self.assertIn('button_handler: 10 вызовов', output)
@@ -67,6 +67,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -193,3 +194,81 @@ REST_FRAMEWORK = {
 
 # Game settings
 GAME_NAME = 'TwGame'
+
+# Как часто процесс сверяет версии кэшей в памяти (настройки игры и др., core.versioning), секунды
+CACHE_VERSION_CHECK_INTERVAL = float(os.environ.get('CACHE_VERSION_CHECK_INTERVAL', '5'))
+
+# Интервал записи времени последнего входа игроков (core.buffers.LastSeenBuffer), секунды
+LAST_SEEN_FLUSH_INTERVAL = float(os.environ.get('LAST_SEEN_FLUSH_INTERVAL', '60'))
+
+# Игровые логи (core.gamelog): очередь процесса, запись пачками раз в GAMELOG_FLUSH_INTERVAL
+# секунд или по GAMELOG_BATCH_SIZE записей; при переполнении очереди записи отбрасываются
+GAMELOG_QUEUE_SIZE = 10000
+GAMELOG_BATCH_SIZE = 500
+GAMELOG_FLUSH_INTERVAL = float(os.environ.get('GAMELOG_FLUSH_INTERVAL', '5'))
+# Срок хранения логов в днях, если не задана настройка игры gamelog_retention_days (prune_gamelogs)
+GAMELOG_RETENTION_DAYS = 30
+
+# Предупреждения и ошибки приложений и ошибки запросов (500) пишутся в GameLog
+GAMELOG_LOGGERS = [
+    'core', 'accounts', 'characters', 'items', 'game', 'admin_panel', 'api', 'telegram_bot', 'twitch_integration',
+]
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'gamelog': {'class': 'core.gamelog.GameLogHandler', 'level': 'WARNING'},
+        'gamelog_errors': {'class': 'core.gamelog.GameLogHandler', 'level': 'ERROR'},
+    },
+    'loggers': {
+        **{name: {'handlers': ['gamelog']} for name in GAMELOG_LOGGERS},
+        'django.request': {'handlers': ['gamelog_errors']},
+    },
+}
+
+# Профилирование запросов (core.middleware.ProfilingMiddleware): запросы дольше
+# PROFILING_SLOW_REQUEST_MS пишутся в лог со списком SQL, с вероятностью PROFILING_SLOW_SAMPLE_RATE
+PROFILING_SLOW_REQUEST_MS = float(os.environ.get('PROFILING_SLOW_REQUEST_MS', '500'))
+PROFILING_SLOW_SAMPLE_RATE = float(os.environ.get('PROFILING_SLOW_SAMPLE_RATE', '0.1'))
+# Токен для /metrics (заголовок Authorization: Bearer <токен>); пустой - /metrics отдает 404,
+# если не включен DEBUG
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Telegram bot
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '')
+# polling - отдельный процесс telegram_bot/main.py, webhook - обновления приходят в Django
+TELEGRAM_BOT_MODE = os.environ.get('TELEGRAM_BOT_MODE', 'polling')
+TELEGRAM_WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL', 'https://twgame-production.up.railway.app/api/telegram/webhook/')
+TELEGRAM_WEBHOOK_SECRET = os.environ.get('TELEGRAM_WEBHOOK_SECRET', '')
+TELEGRAM_WEBAPP_URL = os.environ.get('TELEGRAM_WEBAPP_URL', 'https://twgame-production.up.railway.app/')
+# Сессия Mini App (accounts.session): срок initData Telegram и токена сессии, секунды
+TELEGRAM_INIT_DATA_MAX_AGE = int(os.environ.get('TELEGRAM_INIT_DATA_MAX_AGE', '86400'))
+SESSION_TOKEN_MAX_AGE = int(os.environ.get('SESSION_TOKEN_MAX_AGE', '7200'))
+# Прежний вход без проверки подписи: ?user= на главной и telegram_id в теле запросов.
+# Выключен по умолчанию; оставлен на время перехода и будет удален в следующем релизе.
+TELEGRAM_LEGACY_AUTH = os.environ.get('TELEGRAM_LEGACY_AUTH', 'False').lower() == 'true'
+# Обновлений разных игроков, обрабатываемых одновременно (обновления одного игрока - по очереди)
+TELEGRAM_MAX_CONCURRENT_UPDATES = int(os.environ.get('TELEGRAM_MAX_CONCURRENT_UPDATES', '32'))
+
+# Рассылка сообщений из outbox (telegram_bot.outbox). Лимит Telegram - около 30 сообщений/с
+# на бота и 1 сообщение/с в чат; часть общего лимита остается ответам обработчиков.
+TELEGRAM_OUTBOX_RATE = float(os.environ.get('TELEGRAM_OUTBOX_RATE', '25'))
+TELEGRAM_OUTBOX_CHAT_INTERVAL = 1.0
+TELEGRAM_OUTBOX_BATCH_SIZE = 100
+TELEGRAM_OUTBOX_MAX_ATTEMPTS = 5
+
+# Twitch chat worker (twitch_integration.worker)
+TWITCH_CHAT_CHANNEL = os.environ.get('TWITCH_CHAT_CHANNEL', '')
+TWITCH_CHAT_NICK = os.environ.get('TWITCH_CHAT_NICK', '')
+TWITCH_CHAT_TOKEN = os.environ.get('TWITCH_CHAT_TOKEN', '')
+TWITCH_REWARD_FLUSH_INTERVAL = float(os.environ.get('TWITCH_REWARD_FLUSH_INTERVAL', '10'))
+
+# Награды за активность на стриме: (опыт, золото)
+TWITCH_REWARDS = {
+    'chat': (1, 0),           # за сообщение, не больше TWITCH_CHAT_REWARD_LIMIT за интервал
+    'follow': (20, 10),
+    'subscribe': (100, 50),
+    'raid': (50, 20),         # стримеру, который привел рейд
+    'cheer': (1, 1),          # за каждые 100 bits
+}
+TWITCH_CHAT_REWARD_LIMIT = 5
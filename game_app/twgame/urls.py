@@ -17,9 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('db-admin/', include('admin_panel.urls')),
     path('api/', include('api.urls')),
+    path('metrics', metrics, name='metrics'),
     path('', include('game.urls')),
 ]
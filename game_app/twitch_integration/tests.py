@@ -1,3 +1,132 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase
+
+from accounts.models import Player, PlayerProfile
+from accounts.services import RewardService
+from .worker import FakeEventSource, IRCChatSource, RewardAggregator, TwitchEvent, TwitchWorker
+
+REWARDS = {'chat': (1, 0), 'follow': (20, 10), 'cheer': (1, 1)}
+
+
+class RewardAggregatorTests(SimpleTestCase):
+
+    def aggregator(self):
+        return RewardAggregator(rewards=REWARDS, chat_limit=3)
+
+    def test_per_user_totals(self):
+        aggregator = self.aggregator()
+        for event in [
+            TwitchEvent('chat', 1), TwitchEvent('follow', 1), TwitchEvent('chat', 2),
+            TwitchEvent('raid', 2),  # награды за рейд в таблице нет
+        ]:
+            aggregator.add(event)
+        self.assertEqual(sorted(aggregator.drain()), [('1', 21, 10), ('2', 1, 0)])
+        self.assertEqual(aggregator.drain(), [])
+
+    def test_chat_limit_per_interval(self):
+        aggregator = self.aggregator()
+        for _ in range(10):
+            aggregator.add(TwitchEvent('chat', 1))
+        self.assertEqual(aggregator.drain(), [('1', 3, 0)])
+        # После сброса счетчик сообщений начинается заново
+        aggregator.add(TwitchEvent('chat', 1))
+        self.assertEqual(aggregator.drain(), [('1', 1, 0)])
+
+    def test_cheer_multiplier(self):
+        aggregator = self.aggregator()
+        aggregator.add(TwitchEvent('cheer', 1, amount=550))
+        aggregator.add(TwitchEvent('cheer', 2, amount=99))  # меньше 100 bits - без награды
+        self.assertEqual(aggregator.drain(), [('1', 5, 5)])
+
+    def test_restore(self):
+        aggregator = self.aggregator()
+        aggregator.add(TwitchEvent('follow', 1))
+        rewards = aggregator.drain()
+        aggregator.add(TwitchEvent('chat', 1))
+        aggregator.restore(rewards)
+        self.assertEqual(aggregator.drain(), [('1', 21, 10)])
+
+
+class TwitchWorkerTests(TestCase):
+
+    def setUp(self):
+        self.players = [
+            Player.objects.create(telegram_id=700 + index, twitch_id=str(index), first_name=f'Зритель {index}')
+            for index in (1, 2)
+        ]
+        for player in self.players:
+            PlayerProfile.objects.create(player=player, level=1, experience=0, gold=0)
+
+    def worker(self, events):
+        return TwitchWorker(
+            FakeEventSource(events), flush_interval=3600, aggregator=RewardAggregator(rewards=REWARDS, chat_limit=3),
+        )
+
+    def totals(self):
+        return dict(PlayerProfile.objects.values_list('player__twitch_id', 'experience'))
+
+    def test_run_flushes_rewards(self):
+        events = [TwitchEvent('chat', 1) for _ in range(5)] + [
+            TwitchEvent('cheer', 2, amount=300), TwitchEvent('follow', 3),
+        ]
+        stats = async_to_sync(self.worker(events).run)()
+
+        self.assertEqual(self.totals(), {'1': 3, '2': 3})
+        self.assertEqual(PlayerProfile.objects.get(player=self.players[1]).gold, 3)
+        self.assertEqual((stats['events'], stats['flushes'], stats['granted'], stats['unknown']), (7, 1, 2, 1))
+
+    def test_failed_flush_keeps_rewards(self):
+        worker = self.worker([])
+        worker.aggregator.add(TwitchEvent('follow', 1))
+
+        with mock.patch.object(RewardService, 'grant_bulk', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                async_to_sync(worker.flush)()
+        self.assertEqual(worker.stats['failed_flushes'], 1)
+        self.assertEqual(self.totals(), {'1': 0, '2': 0})
+
+        # Следующий сброс записывает и старую пачку, и новые события
+        worker.aggregator.add(TwitchEvent('chat', 1))
+        report = async_to_sync(worker.flush)()
+        self.assertEqual(report['granted'], 1)
+        self.assertEqual(self.totals(), {'1': 21, '2': 0})
+
+
+class IRCChatSourceTests(SimpleTestCase):
+
+    def test_reconnects_after_disconnect(self):
+        lines = [
+            '@user-id=1;display-name=One :one!one@one.tmi.twitch.tv PRIVMSG #chan :hi',
+            '@user-id=2;display-name=Two;bits=100 :two!two@two.tmi.twitch.tv PRIVMSG #chan :cheer100',
+        ]
+
+        async def scenario():
+            connections = []
+
+            async def handle(reader, writer):
+                # Каждое соединение отдает одну строку и закрывается
+                connections.append(writer)
+                writer.write(f'{lines[len(connections) - 1]}\r\n'.encode())
+                await writer.drain()
+                writer.close()
+
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            source = IRCChatSource('chan', 'bot', 'token', host='127.0.0.1', port=port,
+                                   reconnect_delay=0.01, max_reconnect_delay=0.05)
+            events = []
+            async with server:
+                async for event in source.events():
+                    events.append(event)
+                    if len(events) == len(lines):
+                        await source.close()
+            return source, events
+
+        with self.assertLogs('twitch_integration.worker', 'WARNING'):
+            source, events = asyncio.run(asyncio.wait_for(scenario(), timeout=10))
+        self.assertEqual([(event.kind, event.twitch_id) for event in events], [('chat', '1'), ('cheer', '2')])
+        self.assertEqual(source.connections, 2)
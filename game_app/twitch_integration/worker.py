@@ -0,0 +1,321 @@
+"""
+Воркер активности Twitch-чата.
+
+Читает события (сообщения чата, подписки, рейды, bits) из подключаемого
+источника, копит награды зрителей в памяти и раз в flush_interval секунд
+записывает их пачкой через RewardService.grant_bulk (по Player.twitch_id).
+Запись в базу не зависит от количества сообщений: за интервал выполняется
+несколько групповых UPDATE, сколько бы сообщений ни пришло.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from accounts.services import RewardService
+
+logger = logging.getLogger(__name__)
+
+TWITCH_IRC_HOST = 'irc.chat.twitch.tv'
+TWITCH_IRC_PORT = 6667
+
+# msg-id в USERNOTICE -> вид события
+USERNOTICE_KINDS = {
+    'sub': 'subscribe',
+    'resub': 'subscribe',
+    'subgift': 'subscribe',
+    'raid': 'raid',
+}
+
+
+class TwitchEvent:
+    """Событие стрима: kind - chat, follow, subscribe, raid или cheer"""
+
+    __slots__ = ('kind', 'twitch_id', 'username', 'amount')
+
+    def __init__(self, kind, twitch_id, username='', amount=1):
+        self.kind = kind
+        self.twitch_id = str(twitch_id)
+        self.username = username
+        self.amount = amount
+
+    def __repr__(self):
+        return f"TwitchEvent({self.kind}, {self.twitch_id}, amount={self.amount})"
+
+
+class EventSource:
+    """Источник событий: асинхронный итератор TwitchEvent"""
+
+    async def events(self):
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    async def close(self):
+        pass
+
+
+class FakeEventSource(EventSource):
+    """
+    Локальный источник для тестов и нагрузочных прогонов: либо отдает
+    заданный список событий, либо генерирует count случайных событий
+    от viewers зрителей со скоростью rate событий в секунду (0 - без пауз).
+    """
+
+    def __init__(self, events=None, count=1000, viewers=100, rate=0, seed=None):
+        self._events = events
+        self.count = count
+        self.viewers = viewers
+        self.rate = rate
+        self.rng = random.Random(seed)
+
+    def _generate(self):
+        kinds = ['chat'] * 95 + ['cheer'] * 2 + ['follow', 'subscribe', 'raid']
+        for _ in range(self.count):
+            kind = self.rng.choice(kinds)
+            viewer = self.rng.randint(1, self.viewers)
+            amount = self.rng.choice([100, 500, 1000]) if kind == 'cheer' else 1
+            yield TwitchEvent(kind, viewer, f'viewer{viewer}', amount)
+
+    async def events(self):
+        events = self._events if self._events is not None else self._generate()
+        delay = 1 / self.rate if self.rate else 0
+        for index, event in enumerate(events):
+            yield event
+            if delay:
+                await asyncio.sleep(delay)
+            elif index % 1000 == 0:
+                # Отдаем управление циклу событий, чтобы успевали срабатывать сбросы
+                await asyncio.sleep(0)
+
+
+def parse_irc_tags(raw):
+    """Разобрать теги IRCv3: '@a=1;b=2' -> {'a': '1', 'b': '2'}"""
+    tags = {}
+    for pair in raw.lstrip('@').split(';'):
+        key, _, value = pair.partition('=')
+        tags[key] = value
+    return tags
+
+
+def parse_irc_line(line):
+    """Преобразовать строку чата Twitch в TwitchEvent (None - не событие)"""
+    if not line.startswith('@'):
+        return None
+    raw_tags, _, rest = line.partition(' ')
+    tags = parse_irc_tags(raw_tags)
+    parts = rest.split(' ', 3)
+    if len(parts) < 3 or not tags.get('user-id'):
+        return None
+
+    command = parts[1]
+    username = tags.get('display-name') or tags.get('login', '')
+    if command == 'PRIVMSG':
+        bits = int(tags.get('bits') or 0)
+        if bits:
+            return TwitchEvent('cheer', tags['user-id'], username, bits)
+        return TwitchEvent('chat', tags['user-id'], username)
+    if command == 'USERNOTICE':
+        kind = USERNOTICE_KINDS.get(tags.get('msg-id'))
+        if kind:
+            return TwitchEvent(kind, tags['user-id'], username)
+    return None
+
+
+class IRCChatSource(EventSource):
+    """
+    Чат канала Twitch через IRC (с тегами, чтобы получать user-id).
+
+    Разрыв соединения (ошибка сети, конец потока, команда RECONNECT от Twitch)
+    не останавливает источник: он переподключается с экспоненциальной паузой
+    от reconnect_delay до max_reconnect_delay секунд. Пауза сбрасывается, как
+    только по соединению пришло событие, поэтому к серверу, который принимает
+    соединение и сразу его закрывает (например, при неверном токене),
+    переподключения замедляются до max_reconnect_delay. Источник заканчивается
+    только после close().
+    """
+
+    def __init__(self, channel, nick, token, host=TWITCH_IRC_HOST, port=TWITCH_IRC_PORT,
+                 reconnect_delay=1.0, max_reconnect_delay=60.0):
+        self.channel = channel.lower().lstrip('#')
+        self.nick = nick
+        self.token = token
+        self.host = host
+        self.port = port
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connections = 0
+        self._writer = None
+        self._closed = False
+
+    async def _send(self, line):
+        self._writer.write(f'{line}\r\n'.encode())
+        await self._writer.drain()
+
+    async def _connect(self):
+        reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        await self._send('CAP REQ :twitch.tv/tags twitch.tv/commands')
+        await self._send(f'PASS oauth:{self.token.removeprefix("oauth:")}')
+        await self._send(f'NICK {self.nick}')
+        await self._send(f'JOIN #{self.channel}')
+        self.connections += 1
+        logger.info(f"Connected to Twitch chat #{self.channel}")
+        return reader
+
+    async def _read(self, reader):
+        """События одного соединения до его разрыва"""
+        while True:
+            raw = await reader.readline()
+            if not raw:
+                return
+            line = raw.decode(errors='replace').rstrip('\r\n')
+            if line.startswith('PING'):
+                await self._send(line.replace('PING', 'PONG', 1))
+                continue
+            if line.split(' ', 2)[1:2] == ['RECONNECT']:
+                # Twitch предупреждает о перезапуске сервера
+                return
+            event = parse_irc_line(line)
+            if event:
+                yield event
+
+    def _disconnect(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+    async def events(self):
+        delay = self.reconnect_delay
+        while not self._closed:
+            try:
+                reader = await self._connect()
+                async for event in self._read(reader):
+                    delay = self.reconnect_delay
+                    yield event
+                error = 'connection closed'
+            except OSError as e:
+                error = e
+            finally:
+                self._disconnect()
+            if self._closed:
+                break
+            logger.warning(f"Twitch chat #{self.channel} disconnected ({error}), reconnecting in {delay:.0f} s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def close(self):
+        self._closed = True
+        self._disconnect()
+
+
+class RewardAggregator:
+    """
+    Награды зрителей, накопленные между сбросами.
+    Награда за чат ограничена chat_limit сообщениями за интервал.
+    """
+
+    def __init__(self, rewards=None, chat_limit=None):
+        self.rewards = rewards if rewards is not None else settings.TWITCH_REWARDS
+        self.chat_limit = chat_limit if chat_limit is not None else settings.TWITCH_CHAT_REWARD_LIMIT
+        self._totals = defaultdict(lambda: [0, 0])
+        self._chat_counts = defaultdict(int)
+
+    def __len__(self):
+        return len(self._totals)
+
+    def add(self, event):
+        reward = self.rewards.get(event.kind)
+        if not reward:
+            return
+        if event.kind == 'chat':
+            self._chat_counts[event.twitch_id] += 1
+            if self._chat_counts[event.twitch_id] > self.chat_limit:
+                return
+        multiplier = event.amount // 100 if event.kind == 'cheer' else 1
+        if not multiplier:
+            return
+        totals = self._totals[event.twitch_id]
+        totals[0] += reward[0] * multiplier
+        totals[1] += reward[1] * multiplier
+
+    def drain(self):
+        """Забрать накопленное: список (twitch_id, опыт, золото)"""
+        rewards = [(twitch_id, experience, gold) for twitch_id, (experience, gold) in self._totals.items()]
+        self._totals = defaultdict(lambda: [0, 0])
+        self._chat_counts = defaultdict(int)
+        return rewards
+
+    def restore(self, rewards):
+        """Вернуть забранные награды, которые не удалось записать (к накопленным после drain)"""
+        for twitch_id, experience, gold in rewards:
+            totals = self._totals[twitch_id]
+            totals[0] += experience
+            totals[1] += gold
+
+
+class TwitchWorker:
+    """Читает события источника и сбрасывает награды в базу по таймеру"""
+
+    def __init__(self, source, flush_interval=None, aggregator=None, on_flush=None):
+        self.source = source
+        self.flush_interval = flush_interval if flush_interval is not None else settings.TWITCH_REWARD_FLUSH_INTERVAL
+        self.aggregator = aggregator if aggregator is not None else RewardAggregator()
+        self.on_flush = on_flush
+        self.stats = {'events': 0, 'flushes': 0, 'failed_flushes': 0, 'granted': 0, 'unknown': 0, 'level_ups': 0}
+        self._flush_lock = asyncio.Lock()
+
+    async def run(self):
+        """Работать, пока источник не закончится; в конце сбросить остаток"""
+        flusher = asyncio.create_task(self._flush_periodically())
+        started = time.perf_counter()
+        try:
+            async for event in self.source.events():
+                self.aggregator.add(event)
+                self.stats['events'] += 1
+        finally:
+            flusher.cancel()
+            await self.source.close()
+            await self.flush()
+            self.stats['elapsed'] = time.perf_counter() - started
+        return self.stats
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Награды пачки остались в агрегаторе и будут записаны следующим сбросом
+                logger.error(f"Twitch rewards flush failed: {e}")
+
+    async def flush(self):
+        """
+        Записать накопленные награды одной пачкой.
+        Если запись не удалась, награды возвращаются в агрегатор, а ошибка пробрасывается.
+        """
+        async with self._flush_lock:
+            rewards = self.aggregator.drain()
+            if not rewards:
+                return None
+            try:
+                report = await sync_to_async(RewardService.grant_bulk)(rewards, by='twitch_id')
+            except Exception:
+                self.aggregator.restore(rewards)
+                self.stats['failed_flushes'] += 1
+                raise
+
+        self.stats['flushes'] += 1
+        self.stats['granted'] += report['granted']
+        self.stats['unknown'] += len(report['unknown'])
+        self.stats['level_ups'] += len(report['level_ups'])
+        logger.info(
+            f"Twitch rewards flushed: {report['granted']} players, "
+            f"{len(report['unknown'])} unknown viewers, {len(report['level_ups'])} level-ups"
+        )
+        if self.on_flush:
+            self.on_flush(report)
+        return report